@@ -5,8 +5,15 @@ from ruta_auto import RutaAuto
 from usuario import Usuario
 from ruta import Ruta
 from gestor_rutas import GestorRutas
+from consulta_rutas import ConsultaRutas
+from tabla_rutas import MODOS
 import os
 import json
+import threading
+
+# Gestor compartido por todas las peticiones: en cada una solo se releen los JSON que han cambiado
+gestor = GestorRutas()
+_gestor_lock = threading.Lock()
 
 # Crear ruta manual
 @app.route("/api/ruta_manual", methods=["POST"])
@@ -64,7 +71,17 @@ def crear_auto():
         return jsonify({"error": "Credenciales inválidas"}), 403
     try:
         generador = RutaAuto()
-        resultado = generador.generar_rutas_desde_direcciones(data["direcciones"], int(data["cantidad"]))
+        if data.get("max_km") is not None or data.get("max_horas") is not None:
+            # Muchas direcciones: repartirlas en varias rutas que respeten el límite
+            resultado = generador.generar_rutas_particionadas(
+                data["direcciones"],
+                max_km=float(data["max_km"]) if data.get("max_km") is not None else None,
+                max_horas=float(data["max_horas"]) if data.get("max_horas") is not None else None
+            )
+        else:
+            resultado = generador.generar_rutas_desde_direcciones(
+                data["direcciones"], int(data["cantidad"]), optimizar=bool(data.get("optimizar", False))
+            )
         return jsonify({"mensaje": "Rutas automáticas generadas", "rutas": resultado})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -74,50 +91,49 @@ def obtener_rutas_filtradas():
     """
     Obtiene rutas filtradas según los parámetros proporcionados por el usuario.
 
-    Este endpoint recibe varios parámetros de filtro, como la dificultad, la distancia máxima,
-    la duración máxima y el modo de transporte. Retorna un JSON con las rutas que cumplen con los filtros,
-    o un mensaje de error si ocurre algún problema al aplicar los filtros.
+    Este endpoint recibe varios parámetros de filtro, como la dificultad, los rangos de distancia
+    y duración, el modo de transporte, el creador y las fechas de creación, y los combina en una
+    sola consulta. Retorna un JSON con las rutas que cumplen todos los filtros, o un mensaje de
+    error si algún parámetro no es válido.
 
     Parameters
     ----------
     dificultad : str, opcional
         La dificultad de las rutas a filtrar (bajo, medio, alto).
-    max_km : float, opcional
-        La distancia máxima de las rutas a filtrar.
-    max_horas : float, opcional
-        La duración máxima de las rutas a filtrar.
+    min_km, max_km : float, opcional
+        El rango de distancia de las rutas a filtrar.
+    min_horas, max_horas : float, opcional
+        El rango de duración de las rutas a filtrar.
     transporte : str, opcional
         El medio de transporte a filtrar (walk, bike, drive).
+    creador : str, opcional
+        El usuario que creó las rutas.
+    desde, hasta : str, opcional
+        El rango de fechas de creación (YYYY-MM-DD).
+    orden : str, opcional
+        Campo por el que ordenar (fecha, nombre, distancia_km, duracion_horas); con "-" delante,
+        en orden descendente. Por defecto, "-fecha".
+    limite : int, opcional
+        El número máximo de rutas a devolver.
 
     Returns
     -------
     Response
         Retorna un JSON con las rutas filtradas, o un mensaje de error si ocurre un problema.
     """
-    gestor = GestorRutas()
-    rutas_filtradas = gestor.rutas
-
-    # Aplicar filtros individualmente
-    dificultad = request.args.get("dificultad")
-    if dificultad:
-        rutas_filtradas = gestor.filtrar_por_dificultad(dificultad)
-
-    max_km = request.args.get("max_km")
-    if max_km:
-        rutas_filtradas = [r for r in rutas_filtradas if r in gestor.filtrar_por_distancia(float(max_km))]
-
-    max_horas = request.args.get("max_horas")
-    if max_horas:
-        rutas_filtradas = [r for r in rutas_filtradas if r in gestor.filtrar_por_duracion(float(max_horas))]
-
-    transporte = request.args.get("transporte")
-    if transporte:
-        try:
-            rutas_filtradas = [r for r in rutas_filtradas if r in gestor.filtrar_por_transporte(transporte)]
-        except ValueError:
-            return jsonify({"error": "Modo de transporte no válido"}), 400
-
-    return jsonify({"rutas": rutas_filtradas})
+    try:
+        consulta = ConsultaRutas.desde_parametros(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Un modo válido que ninguna ruta usa devuelve una lista vacía, no un error
+    if consulta.modo and consulta.modo not in MODOS:
+        return jsonify({"error": "Modo de transporte no válido"}), 400
+
+    with _gestor_lock:
+        gestor.rutas = gestor.cargar_rutas_desde_carpeta()
+        rutas = gestor.consultar(consulta)
+
+    return jsonify({"rutas": rutas})
 
 
 # Descargar PDF de ruta
@@ -0,0 +1,121 @@
+"""
+Compara la búsqueda de amigos (usuarios con rutas en común) consulta a consulta, con una
+autounión de usuario_rutas y con la lectura de la tabla materializada amistades que usa
+Usuario.obtener_amigos, sobre una base de datos sintética temporal.
+
+Uso:
+    python benchmark_amigos.py                          # 10.000 usuarios
+    python benchmark_amigos.py --usuarios 2000 --rutas 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def obtener_amigos_por_ruta(Usuario, UsuarioRuta, username):
+    """Versión anterior: una consulta por ruta y otra por cada usuario relacionado."""
+    usuario = Usuario.query.filter_by(username=username).first()
+    if not usuario:
+        return {}
+    amigos = {}
+    for ur in UsuarioRuta.query.filter_by(usuario_id=usuario.id).all():
+        for rel in UsuarioRuta.query.filter_by(nombre_ruta=ur.nombre_ruta).all():
+            if rel.usuario_id != usuario.id:
+                amigo = Usuario.query.get(rel.usuario_id)
+                if amigo:
+                    amigos.setdefault(amigo.username, {
+                        "nombre": amigo.nombre,
+                        "apellido": amigo.apellido,
+                        "rutas_comunes": []
+                    })["rutas_comunes"].append(ur.nombre_ruta)
+    return amigos
+
+
+def obtener_amigos_autounion(db, Usuario, UsuarioRuta, username):
+    """Versión anterior: una sola consulta con la autounión de usuario_rutas por nombre_ruta."""
+    from sqlalchemy.orm import aliased
+    yo, amigo = aliased(Usuario), aliased(Usuario)
+    mias, suyas = aliased(UsuarioRuta), aliased(UsuarioRuta)
+    filas = (db.session.query(amigo.username, amigo.nombre, amigo.apellido, suyas.nombre_ruta)
+             .select_from(yo)
+             .join(mias, mias.usuario_id == yo.id)
+             .join(suyas, (suyas.nombre_ruta == mias.nombre_ruta) & (suyas.usuario_id != yo.id))
+             .join(amigo, amigo.id == suyas.usuario_id)
+             .filter(yo.username == username)
+             .order_by(mias.id, suyas.id)
+             .all())
+    amigos = {}
+    for username_amigo, nombre, apellido, nombre_ruta in filas:
+        amigos.setdefault(username_amigo, {
+            "nombre": nombre,
+            "apellido": apellido,
+            "rutas_comunes": []
+        })["rutas_comunes"].append(nombre_ruta)
+    return amigos
+
+
+def normalizar(resultados):
+    """Los amigos y sus rutas comunes como conjuntos, para comparar sin depender del orden."""
+    return [{u: (a["nombre"], a["apellido"], frozenset(a["rutas_comunes"])) for u, a in amigos.items()}
+            for amigos in resultados]
+
+
+def medir(usuarios: int, rutas: int, max_rutas_usuario: int, consultas: int, semilla: int = 42) -> None:
+    ruta_db = os.path.join(tempfile.mkdtemp(), "usuarios.db")
+    os.environ["USUARIOS_DB_PATH"] = ruta_db
+    from miapp import app, db, Usuario, UsuarioRuta, Amistad
+
+    rng = random.Random(semilla)
+    with app.app_context():
+        db.session.execute(Usuario.__table__.insert(), [
+            {"nombre": f"Nombre{i}", "apellido": f"Apellido{i}", "email": f"u{i}@ejemplo.com",
+             "username": f"u{i}", "password_hash": "x"}
+            for i in range(usuarios)
+        ])
+        relaciones = []
+        for i in range(usuarios):
+            for ruta in rng.sample(range(rutas), rng.randint(1, max_rutas_usuario)):
+                relaciones.append({"usuario_id": i + 1, "nombre_ruta": f"Ruta_{ruta}",
+                                   "created_at": "2025-01-01 00:00:00"})
+        # Los triggers de usuario_rutas rellenan amistades con cada inserción
+        inicio = time.perf_counter()
+        db.session.execute(UsuarioRuta.__table__.insert(), relaciones)
+        db.session.commit()
+        t_carga = time.perf_counter() - inicio
+        pares = Amistad.query.count()
+
+        muestra = [f"u{rng.randrange(usuarios)}" for _ in range(consultas)]
+
+        inicio = time.perf_counter()
+        anteriores = [obtener_amigos_por_ruta(Usuario, UsuarioRuta, u) for u in muestra]
+        t_anterior = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        autounion = [obtener_amigos_autounion(db, Usuario, UsuarioRuta, u) for u in muestra]
+        t_autounion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        nuevos = [Usuario.obtener_amigos(u) for u in muestra]
+        t_nuevo = time.perf_counter() - inicio
+
+    print(f"📊 {usuarios} usuarios, {rutas} rutas, {len(relaciones)} relaciones, {consultas} consultas")
+    print(f"   Inserción de relaciones con amistades incremental: {t_carga:.2f} s ({pares} pares de amigos)")
+    print(f"   Una consulta por ruta y por amigo: {t_anterior / consultas * 1000:.2f} ms/consulta")
+    print(f"   Consulta única (autounión): {t_autounion / consultas * 1000:.2f} ms/consulta")
+    print(f"   Tabla amistades: {t_nuevo / consultas * 1000:.2f} ms/consulta")
+    print(f"   Aceleración: x{t_anterior / t_nuevo:.1f} (x{t_autounion / t_nuevo:.1f} frente a la autounión)")
+    iguales = normalizar(anteriores) == normalizar(autounion) == normalizar(nuevos)
+    print(f"   Resultados idénticos: {'sí' if iguales else 'NO'}")
+    print(f"   Amigos por usuario (media): {sum(len(a) for a in nuevos) / consultas:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=10000, help="número de usuarios sintéticos")
+    parser.add_argument("--rutas", type=int, default=2000, help="número de rutas distintas")
+    parser.add_argument("--max-rutas-usuario", type=int, default=8, help="rutas máximas por usuario")
+    parser.add_argument("--consultas", type=int, default=50, help="usuarios consultados")
+    argumentos = parser.parse_args()
+    medir(argumentos.usuarios, argumentos.rutas, argumentos.max_rutas_usuario, argumentos.consultas)
@@ -0,0 +1,92 @@
+"""
+Compara el motor CSR (MotorRutas) con networkx en consultas punto a punto.
+
+Uso:
+    python benchmark_motor_rutas.py                 # grafo sintético en rejilla
+    python benchmark_motor_rutas.py --real walk     # grafo de Alicante del registro
+"""
+import argparse
+import math
+import random
+import time
+
+import networkx as nx
+
+from cache_grafos import GrafoCompacto
+from motor_rutas import MotorRutas, RADIO_TIERRA_M, VELOCIDADES_KMH
+
+
+def grafo_sintetico(lado: int = 120, semilla: int = 42) -> nx.MultiDiGraph:
+    """Rejilla de lado x lado nodos sobre Alicante con longitudes realistas."""
+    rng = random.Random(semilla)
+    grafo = nx.MultiDiGraph(crs="epsg:4326")
+    paso = 0.0008
+    for i in range(lado):
+        for j in range(lado):
+            grafo.add_node(i * lado + j, y=38.30 + i * paso, x=-0.50 + j * paso)
+
+    def haversine(u, v):
+        lat1, lon1 = math.radians(grafo.nodes[u]["y"]), math.radians(grafo.nodes[u]["x"])
+        lat2, lon2 = math.radians(grafo.nodes[v]["y"]), math.radians(grafo.nodes[v]["x"])
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * RADIO_TIERRA_M * math.asin(math.sqrt(a))
+
+    for i in range(lado):
+        for j in range(lado):
+            u = i * lado + j
+            for v in ([u + 1] if j + 1 < lado else []) + ([u + lado] if i + 1 < lado else []):
+                longitud = haversine(u, v) * rng.uniform(1.0, 1.6)
+                grafo.add_edge(u, v, length=longitud)
+                grafo.add_edge(v, u, length=longitud)
+    return grafo
+
+
+def medir(grafo: nx.MultiDiGraph, velocidad_kmh: float, consultas: int) -> None:
+    """Ejecuta las mismas consultas con networkx y con el motor y muestra los tiempos."""
+    rng = random.Random(0)
+    nodos = list(grafo.nodes)
+    pares = [tuple(rng.sample(nodos, 2)) for _ in range(consultas)]
+
+    inicio = time.perf_counter()
+    motor = MotorRutas(GrafoCompacto.desde_networkx(grafo), velocidad_kmh)
+    t_construccion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados_nx = []
+    for o, d in pares:
+        try:
+            nx.shortest_path(grafo, o, d, weight="length")
+            resultados_nx.append(nx.shortest_path_length(grafo, o, d, weight="length"))
+        except nx.NetworkXNoPath:
+            resultados_nx.append(None)
+    t_nx = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados_motor = []
+    for o, d in pares:
+        try:
+            resultados_motor.append(motor.ruta_mas_corta(o, d)[1])
+        except nx.NetworkXNoPath:
+            resultados_motor.append(None)
+    t_motor = time.perf_counter() - inicio
+
+    diferencias = [abs(a - b) for a, b in zip(resultados_nx, resultados_motor) if a is not None and b is not None]
+    print(f"📊 Grafo: {grafo.number_of_nodes()} nodos, {grafo.number_of_edges()} aristas, {consultas} consultas")
+    print(f"   Construcción del motor CSR: {t_construccion * 1000:.1f} ms")
+    print(f"   networkx (shortest_path + shortest_path_length): {t_nx / consultas * 1000:.2f} ms/consulta")
+    print(f"   MotorRutas (A*, una pasada): {t_motor / consultas * 1000:.2f} ms/consulta")
+    print(f"   Aceleración: x{t_nx / t_motor:.1f}")
+    print(f"   Diferencia máxima de longitud: {max(diferencias, default=0):.6f} m")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--real", choices=list(VELOCIDADES_KMH), help="Usar el grafo de Alicante de este modo")
+    parser.add_argument("--consultas", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.real:
+        from registro_grafos import obtener_registro
+        medir(obtener_registro().obtener(args.real), VELOCIDADES_KMH[args.real], args.consultas)
+    else:
+        medir(grafo_sintetico(), VELOCIDADES_KMH["walk"], args.consultas)
@@ -0,0 +1,180 @@
+"""Caché persistente en SQLite de las coordenadas obtenidas por el geocodificador."""
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB_PATH = os.path.join(BASE_DIR, "cache", "geocodificacion.db")
+
+# Tiempo de vida de las direcciones encontradas y de las no encontradas (en segundos)
+TTL_ENCONTRADAS = 90 * 24 * 3600
+TTL_NO_ENCONTRADAS = 24 * 3600
+
+# Versión de `normalizar_direccion` con la que se calcularon las claves guardadas; al
+# cambiar la normalización, las entradas antiguas se descartan
+VERSION_CLAVES = 2
+
+# Abreviaturas habituales en direcciones españolas y su forma completa
+ABREVIATURAS = {
+    "c": "calle", "cl": "calle", "cll": "calle",
+    "av": "avenida", "avd": "avenida", "avda": "avenida",
+    "pl": "plaza", "pza": "plaza", "plz": "plaza",
+    "po": "paseo", "pso": "paseo",
+    "ctra": "carretera", "cra": "carretera",
+    "urb": "urbanizacion", "bda": "barriada",
+    "n": "numero", "num": "numero",
+}
+
+# Ciudad o país que se puede añadir tras una coma sin cambiar la dirección
+# ("Calle Mayor 5, Alicante, España"); sin coma pueden ser parte del nombre de la calle
+SUFIJOS_IGNORADOS = ("espana", "spain", "alicante", "alacant")
+
+
+def normalizar_direccion(direccion: str) -> str:
+    """
+    Normaliza una dirección para usarla como clave de la caché.
+
+    Pasa a minúsculas, elimina tildes y signos de puntuación, expande abreviaturas
+    ("C/" -> "calle", "Avda." -> "avenida"...), quita la ciudad y el país cuando van
+    al final separados por comas y colapsa los espacios.
+
+    Parameters
+    ----------
+    direccion : str
+        Dirección tal y como la introduce el usuario.
+
+    Returns
+    -------
+    str
+        Dirección normalizada.
+    """
+    # "nº" es la única forma de "no" que significa número ("no" puede ser parte del nombre)
+    texto = re.sub(r"\bn\.?\s*[º°]", " numero ", direccion.lower())
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = texto.replace("º", "o").replace("ª", "a")
+    partes = [re.sub(r"[^a-z0-9]+", " ", parte).split() for parte in texto.split(",")]
+    while len(partes) > 1 and all(p in SUFIJOS_IGNORADOS for p in partes[-1]):
+        partes.pop()
+    palabras = [ABREVIATURAS.get(p, p) for parte in partes for p in parte]
+    return " ".join(palabras)
+
+
+class CacheGeocodificacion:
+    """
+    Caché de geocodificación compartida entre procesos mediante un fichero SQLite.
+
+    Guarda también las direcciones que no se pudieron geocodificar (caché negativa)
+    para no repetir consultas que se sabe que fallan.
+
+    Parameters
+    ----------
+    ruta_db : str, optional
+        Fichero SQLite de la caché.
+    ttl : float, optional
+        Segundos que es válida una dirección encontrada.
+    ttl_negativo : float, optional
+        Segundos que es válida una dirección no encontrada.
+    """
+
+    def __init__(self, ruta_db: str = CACHE_DB_PATH, ttl: float = TTL_ENCONTRADAS,
+                 ttl_negativo: float = TTL_NO_ENCONTRADAS) -> None:
+        self.ruta_db = ruta_db
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        os.makedirs(os.path.dirname(self.ruta_db), exist_ok=True)
+        conn = self._conectar()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS geocodificaciones (
+                clave TEXT PRIMARY KEY,
+                direccion TEXT NOT NULL,
+                lat REAL,
+                lon REAL,
+                actualizado REAL NOT NULL
+            )
+        ''')
+        if conn.execute("PRAGMA user_version").fetchone()[0] < VERSION_CLAVES:
+            # Las claves antiguas quitaban "España"/"Alicante" aunque fueran parte del nombre
+            conn.execute("DELETE FROM geocodificaciones")
+            conn.execute(f"PRAGMA user_version = {VERSION_CLAVES}")
+        conn.commit()
+        conn.close()
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre una conexión a la base de datos de la caché."""
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def consultar(self, direccion: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """
+        Busca una dirección en la caché.
+
+        Parameters
+        ----------
+        direccion : str
+            Dirección a buscar (se normaliza antes).
+
+        Returns
+        -------
+        Tuple[bool, Optional[Tuple[float, float]]]
+            (True, coordenadas) si hay una entrada vigente, donde las coordenadas son
+            None si la dirección se guardó como no encontrada; (False, None) si no la hay.
+        """
+        clave = normalizar_direccion(direccion)
+        if not clave:
+            return False, None
+        conn = self._conectar()
+        fila = conn.execute(
+            'SELECT lat, lon, actualizado FROM geocodificaciones WHERE clave = ?',
+            (clave,)
+        ).fetchone()
+        conn.close()
+        if not fila:
+            return False, None
+
+        lat, lon, actualizado = fila
+        encontrada = lat is not None
+        ttl = self.ttl if encontrada else self.ttl_negativo
+        if time.time() - actualizado > ttl:
+            return False, None
+        return True, (lat, lon) if encontrada else None
+
+    def guardar(self, direccion: str, coordenadas: Optional[Tuple[float, float]]) -> None:
+        """
+        Guarda el resultado de geocodificar una dirección.
+
+        Parameters
+        ----------
+        direccion : str
+            Dirección consultada.
+        coordenadas : Optional[Tuple[float, float]]
+            (lat, lon) obtenidas, o None si la dirección no se encontró.
+        """
+        clave = normalizar_direccion(direccion)
+        if not clave:
+            # Una clave vacía mezclaría direcciones distintas
+            return
+        lat, lon = coordenadas if coordenadas else (None, None)
+        conn = self._conectar()
+        conn.execute('''
+            INSERT OR REPLACE INTO geocodificaciones (clave, direccion, lat, lon, actualizado)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (clave, direccion, lat, lon, time.time()))
+        conn.commit()
+        conn.close()
+
+    def eliminar_caducadas(self) -> int:
+        """Borra las entradas que han superado su TTL y devuelve cuántas se eliminaron."""
+        ahora = time.time()
+        conn = self._conectar()
+        cursor = conn.execute('''
+            DELETE FROM geocodificaciones
+            WHERE (lat IS NOT NULL AND actualizado < ?) OR (lat IS NULL AND actualizado < ?)
+        ''', (ahora - self.ttl, ahora - self.ttl_negativo))
+        conn.commit()
+        eliminadas = cursor.rowcount
+        conn.close()
+        return eliminadas
@@ -0,0 +1,309 @@
+"""Caché persistente en disco de grafos de calles descargados con OSMnx."""
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "cache", "grafos")
+
+# Tamaño de la tesela en grados y presupuesto máximo de disco para la caché
+TAMANO_TESELA = 0.05
+PRESUPUESTO_BYTES = 512 * 1024 * 1024
+
+METROS_POR_GRADO = 111320
+
+ARRAYS_GRAFO = ("nodos", "x", "y", "origenes", "destinos", "longitudes")
+
+
+@dataclass
+class GrafoCompacto:
+    """
+    Representación compacta de un grafo de calles mediante arrays de NumPy.
+
+    Attributes
+    ----------
+    nodos : np.ndarray
+        Identificadores OSM de los nodos (int64).
+    x : np.ndarray
+        Longitud de cada nodo.
+    y : np.ndarray
+        Latitud de cada nodo.
+    origenes : np.ndarray
+        Índice (posición en `nodos`) del nodo de salida de cada arista.
+    destinos : np.ndarray
+        Índice (posición en `nodos`) del nodo de llegada de cada arista.
+    longitudes : np.ndarray
+        Longitud de cada arista en metros.
+    """
+    nodos: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    origenes: np.ndarray
+    destinos: np.ndarray
+    longitudes: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes ocupados por los arrays del grafo."""
+        return sum(getattr(self, nombre).nbytes for nombre in ARRAYS_GRAFO)
+
+    def huella(self) -> str:
+        """Resumen SHA-1 de la topología y longitudes, para detectar datos derivados obsoletos."""
+        resumen = hashlib.sha1()
+        for nombre in ("nodos", "origenes", "destinos", "longitudes"):
+            resumen.update(np.ascontiguousarray(getattr(self, nombre)).tobytes())
+        return resumen.hexdigest()
+
+    @staticmethod
+    def desde_networkx(grafo: nx.MultiDiGraph) -> "GrafoCompacto":
+        """
+        Convierte un grafo de OSMnx en su representación compacta.
+
+        Parameters
+        ----------
+        grafo : nx.MultiDiGraph
+            Grafo con atributos 'x' e 'y' en los nodos y 'length' en las aristas.
+
+        Returns
+        -------
+        GrafoCompacto
+        """
+        nodos = np.fromiter(grafo.nodes, dtype=np.int64, count=grafo.number_of_nodes())
+        posiciones = {nodo: i for i, nodo in enumerate(nodos.tolist())}
+        x = np.array([grafo.nodes[n]["x"] for n in nodos.tolist()], dtype=np.float64)
+        y = np.array([grafo.nodes[n]["y"] for n in nodos.tolist()], dtype=np.float64)
+
+        aristas = list(grafo.edges(data="length", default=0.0))
+        origenes = np.array([posiciones[u] for u, _, _ in aristas], dtype=np.int32)
+        destinos = np.array([posiciones[v] for _, v, _ in aristas], dtype=np.int32)
+        longitudes = np.array([l for _, _, l in aristas], dtype=np.float64)
+        return GrafoCompacto(nodos, x, y, origenes, destinos, longitudes)
+
+    def a_networkx(self) -> nx.MultiDiGraph:
+        """
+        Reconstruye un grafo de networkx compatible con las funciones de OSMnx.
+
+        Returns
+        -------
+        nx.MultiDiGraph
+        """
+        grafo = nx.MultiDiGraph(crs="epsg:4326")
+        nodos = self.nodos.tolist()
+        grafo.add_nodes_from(
+            (nodo, {"x": x, "y": y}) for nodo, x, y in zip(nodos, self.x.tolist(), self.y.tolist())
+        )
+        grafo.add_edges_from(
+            (nodos[u], nodos[v], {"length": l})
+            for u, v, l in zip(self.origenes.tolist(), self.destinos.tolist(), self.longitudes.tolist())
+        )
+        return grafo
+
+    def guardar(self, directorio: str) -> None:
+        """Guarda cada array como un fichero .npy sin comprimir dentro de `directorio`."""
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in ARRAYS_GRAFO:
+            np.save(os.path.join(directorio, f"{nombre}.npy"), getattr(self, nombre))
+
+    @staticmethod
+    def cargar(directorio: str, mmap: bool = True) -> "GrafoCompacto":
+        """
+        Carga un grafo guardado con `guardar`.
+
+        Parameters
+        ----------
+        directorio : str
+            Directorio con los ficheros .npy.
+        mmap : bool, optional
+            Si es True, los arrays se proyectan en memoria en lugar de leerse completos.
+
+        Returns
+        -------
+        GrafoCompacto
+        """
+        modo = "r" if mmap else None
+        arrays = {
+            nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode=modo)
+            for nombre in ARRAYS_GRAFO
+        }
+        return GrafoCompacto(**arrays)
+
+
+class CacheGrafos:
+    """
+    Caché en disco de grafos de calles indexada por (bbox, network_type).
+
+    Los grafos se guardan en formato compacto (arrays .npy) y se cargan proyectados
+    en memoria. Cuando el tamaño total supera el presupuesto se eliminan las entradas
+    usadas hace más tiempo (LRU según la fecha de último acceso).
+
+    Parameters
+    ----------
+    directorio : str, optional
+        Carpeta donde se almacenan los grafos.
+    presupuesto_bytes : int, optional
+        Tamaño máximo de la caché en disco.
+    tamano_tesela : float, optional
+        Lado en grados de las teselas en que se divide el mapa.
+    """
+
+    def __init__(self, directorio: str = CACHE_DIR, presupuesto_bytes: int = PRESUPUESTO_BYTES,
+                 tamano_tesela: float = TAMANO_TESELA) -> None:
+        self.directorio = directorio
+        self.presupuesto_bytes = presupuesto_bytes
+        self.tamano_tesela = tamano_tesela
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def bbox_para_punto(self, punto: Tuple[float, float], dist: float) -> Tuple[float, float, float, float]:
+        """
+        Calcula la bbox (sur, norte, oeste, este) de la tesela que contiene `punto`,
+        ampliada `dist` metros por cada lado.
+
+        Así, rutas con orígenes cercanos comparten la misma entrada de la caché.
+        """
+        lat, lon = punto
+        sur = math.floor(lat / self.tamano_tesela) * self.tamano_tesela
+        oeste = math.floor(lon / self.tamano_tesela) * self.tamano_tesela
+        margen_lat = dist / METROS_POR_GRADO
+        margen_lon = dist / (METROS_POR_GRADO * math.cos(math.radians(lat)))
+        return (
+            round(sur - margen_lat, 4),
+            round(sur + self.tamano_tesela + margen_lat, 4),
+            round(oeste - margen_lon, 4),
+            round(oeste + self.tamano_tesela + margen_lon, 4),
+        )
+
+    @staticmethod
+    def clave(bbox: Tuple[float, float, float, float], network_type: str) -> str:
+        """Devuelve el nombre de la entrada de la caché para una bbox y tipo de red."""
+        sur, norte, oeste, este = bbox
+        return f"{network_type}_{sur:.4f}_{norte:.4f}_{oeste:.4f}_{este:.4f}"
+
+    def ruta_entrada(self, bbox: Tuple[float, float, float, float], network_type: str) -> str:
+        """Directorio en disco de la entrada correspondiente a (bbox, network_type)."""
+        return os.path.join(self.directorio, self.clave(bbox, network_type))
+
+    def obtener_compacto(self, bbox: Tuple[float, float, float, float], network_type: str) -> GrafoCompacto:
+        """
+        Devuelve el grafo compacto de la bbox, descargándolo solo si no está en la caché.
+
+        Parameters
+        ----------
+        bbox : tuple
+            (sur, norte, oeste, este) en grados.
+        network_type : str
+            Tipo de red de OSMnx ("walk", "bike" o "drive").
+
+        Returns
+        -------
+        GrafoCompacto
+        """
+        entrada = self.ruta_entrada(bbox, network_type)
+        if os.path.isdir(entrada):
+            os.utime(entrada)
+            return GrafoCompacto.cargar(entrada)
+
+        compacto = GrafoCompacto.desde_networkx(self._descargar(bbox, network_type))
+        self._guardar_entrada(entrada, compacto)
+        self._aplicar_presupuesto()
+        return GrafoCompacto.cargar(entrada)
+
+    def obtener_grafo(self, punto: Tuple[float, float], dist: float, network_type: str) -> nx.MultiDiGraph:
+        """
+        Devuelve un grafo de networkx que cubre al menos `dist` metros alrededor de `punto`.
+
+        Parameters
+        ----------
+        punto : tuple
+            Coordenadas (lat, lon).
+        dist : float
+            Distancia mínima cubierta alrededor del punto, en metros.
+        network_type : str
+            Tipo de red de OSMnx.
+
+        Returns
+        -------
+        nx.MultiDiGraph
+        """
+        return self.obtener_compacto(self.bbox_para_punto(punto, dist), network_type).a_networkx()
+
+    def tamano_total(self) -> int:
+        """Suma en bytes de todas las entradas de la caché."""
+        return sum(tamano for _, _, tamano in self._entradas())
+
+    def _entradas(self):
+        """Lista de (ruta, último acceso, bytes) de cada entrada de la caché."""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if not os.path.isdir(ruta) or nombre.startswith("."):
+                continue
+            try:
+                tamano = sum(os.path.getsize(os.path.join(ruta, f)) for f in os.listdir(ruta))
+                entradas.append((ruta, os.path.getmtime(ruta), tamano))
+            except OSError:
+                continue
+        return entradas
+
+    def _guardar_entrada(self, entrada: str, compacto: GrafoCompacto) -> None:
+        """Escribe la entrada en un directorio temporal y la renombra de forma atómica."""
+        temporal = os.path.join(self.directorio, f".tmp_{os.getpid()}_{threading.get_ident()}")
+        compacto.guardar(temporal)
+        with open(os.path.join(temporal, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"nodos": len(compacto.nodos), "aristas": len(compacto.origenes),
+                       "creado": time.time()}, f)
+        try:
+            os.replace(temporal, entrada)
+        except OSError:
+            # Otro proceso ha guardado la misma entrada mientras descargábamos
+            shutil.rmtree(temporal, ignore_errors=True)
+
+    def _aplicar_presupuesto(self) -> None:
+        """Elimina las entradas menos usadas hasta respetar el presupuesto de disco."""
+        with self._lock:
+            entradas = sorted(self._entradas(), key=lambda e: e[1])
+            total = sum(tamano for _, _, tamano in entradas)
+            # Nunca se elimina la entrada más reciente, aunque supere el presupuesto por sí sola
+            for ruta, _, tamano in entradas[:-1]:
+                if total <= self.presupuesto_bytes:
+                    break
+                shutil.rmtree(ruta, ignore_errors=True)
+                total -= tamano
+
+    @staticmethod
+    def _descargar(bbox: Tuple[float, float, float, float], network_type: str) -> nx.MultiDiGraph:
+        """Descarga de OpenStreetMap el grafo simplificado que cubre la bbox."""
+        sur, norte, oeste, este = bbox
+        centro = ((sur + norte) / 2, (oeste + este) / 2)
+        medio_alto = (norte - sur) / 2 * METROS_POR_GRADO
+        medio_ancho = (este - oeste) / 2 * METROS_POR_GRADO * math.cos(math.radians(centro[0]))
+        return ox.graph_from_point(centro, dist=max(medio_alto, medio_ancho),
+                                   network_type=network_type, simplify=True)
+
+
+_cache: Optional[CacheGrafos] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache() -> CacheGrafos:
+    """Devuelve la instancia compartida de la caché de grafos."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheGrafos()
+        return _cache
+
+
+def obtener_grafo(punto: Tuple[float, float], dist: float, network_type: str) -> nx.MultiDiGraph:
+    """Atajo para `obtener_cache().obtener_grafo(...)`."""
+    return obtener_cache().obtener_grafo(punto, dist, network_type)
@@ -0,0 +1,375 @@
+"""Catálogo de rutas en SQLite con índices para listar y filtrar sin leer los ficheros JSON."""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from consulta_rutas import ConsultaRutas
+from esquema_rutas import a_esquema
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOGO_DB_PATH = os.environ.get("CATALOGO_RUTAS_DB_PATH", os.path.join(BASE_DIR, "catalogo_rutas.db"))
+RUTAS_DIR = os.path.join(BASE_DIR, "rutas")
+
+
+def campos_indexados(datos: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extrae las columnas indexadas de una ruta ya convertida al esquema actual.
+
+    Parameters
+    ----------
+    datos : Dict[str, Any]
+        Ruta en el esquema de `esquema_rutas`.
+
+    Returns
+    -------
+    Dict[str, Any]
+        nombre, dificultad, modo, distancia_km, duracion_horas, creador y fecha.
+    """
+    return {
+        "nombre": datos["nombre"],
+        "dificultad": datos.get("dificultad") or None,
+        "modo": (datos.get("modo") or "").lower() or None,
+        "distancia_km": datos.get("distancia_km"),
+        "duracion_horas": datos.get("duracion_horas"),
+        "creador": datos.get("creador"),
+        "fecha": datos.get("fecha_creacion")
+    }
+
+
+class CatalogoRutas:
+    """
+    Registro principal de las rutas: el documento JSON completo de cada ruta más las
+    columnas por las que se filtra, con un índice en cada una.
+
+    Cada escritura anota en la columna `cambio` (o, si es un borrado, en la tabla
+    catalogo_eliminadas) la versión del catálogo que la produjo, de modo que otros
+    índices pueden ponerse al día leyendo solo los cambios (`cambios_desde`).
+
+    Parameters
+    ----------
+    ruta_db : str, optional
+        Fichero SQLite del catálogo.
+    """
+
+    def __init__(self, ruta_db: str = CATALOGO_DB_PATH) -> None:
+        self.ruta_db = ruta_db
+        os.makedirs(os.path.dirname(self.ruta_db), exist_ok=True)
+        conn = self._conectar()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalogo_rutas (
+                nombre TEXT PRIMARY KEY,
+                dificultad TEXT,
+                modo TEXT,
+                distancia_km REAL,
+                duracion_horas REAL,
+                creador TEXT,
+                fecha TEXT,
+                datos TEXT NOT NULL,
+                cambio INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(catalogo_rutas)")}
+        if "cambio" not in columnas:
+            conn.execute("ALTER TABLE catalogo_rutas ADD COLUMN cambio INTEGER NOT NULL DEFAULT 0")
+        for columna in ("dificultad", "modo", "distancia_km", "duracion_horas", "creador", "fecha", "cambio"):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_catalogo_{columna} ON catalogo_rutas ({columna})')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalogo_meta (
+                clave TEXT PRIMARY KEY,
+                valor TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalogo_eliminadas (
+                nombre TEXT PRIMARY KEY,
+                cambio INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre una conexión a la base de datos del catálogo."""
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    @staticmethod
+    def _incrementar_version(conn: sqlite3.Connection) -> int:
+        """Incrementa el contador de versión dentro de la transacción en curso y lo devuelve."""
+        conn.execute('''
+            INSERT INTO catalogo_meta (clave, valor) VALUES ('version', '1')
+            ON CONFLICT(clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+        ''')
+        return int(conn.execute("SELECT valor FROM catalogo_meta WHERE clave = 'version'").fetchone()[0])
+
+    def incrementar_version(self) -> int:
+        """
+        Marca el catálogo como modificado sin cambiar ninguna ruta (por ejemplo, al cambiar
+        las rutas asociadas a un usuario) y devuelve la nueva versión.
+        """
+        conn = self._conectar()
+        version = self._incrementar_version(conn)
+        conn.commit()
+        conn.close()
+        return version
+
+    def version(self) -> int:
+        """
+        Contador que aumenta con cada cambio del catálogo; sirve para saber, sin releer las
+        rutas, si un listado ha cambiado (por ejemplo, para calcular ETags).
+        """
+        conn = self._conectar()
+        fila = conn.execute("SELECT valor FROM catalogo_meta WHERE clave = 'version'").fetchone()
+        conn.close()
+        return int(fila[0]) if fila else 0
+
+    def guardar(self, datos: Dict[str, Any]) -> None:
+        """
+        Inserta o sustituye una ruta.
+
+        Parameters
+        ----------
+        datos : Dict[str, Any]
+            Ruta en cualquier versión del esquema; debe tener "nombre". Se guarda
+            convertida al esquema actual.
+        """
+        self.guardar_varias([datos])
+
+    def guardar_varias(self, rutas: Iterable[Dict[str, Any]]) -> int:
+        """Inserta o sustituye varias rutas en una sola transacción y devuelve cuántas."""
+        filas = []
+        for datos in rutas:
+            datos = a_esquema(datos)
+            campos = campos_indexados(datos)
+            filas.append((campos["nombre"], campos["dificultad"], campos["modo"], campos["distancia_km"],
+                          campos["duracion_horas"], campos["creador"], campos["fecha"],
+                          json.dumps(datos, ensure_ascii=False)))
+        conn = self._conectar()
+        if filas:
+            version = self._incrementar_version(conn)
+            conn.executemany('''
+                INSERT OR REPLACE INTO catalogo_rutas
+                    (nombre, dificultad, modo, distancia_km, duracion_horas, creador, fecha, datos, cambio)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [fila + (version,) for fila in filas])
+            conn.executemany('DELETE FROM catalogo_eliminadas WHERE nombre = ?', [(fila[0],) for fila in filas])
+        conn.commit()
+        conn.close()
+        return len(filas)
+
+    def eliminar(self, nombre: str) -> bool:
+        """Elimina una ruta del catálogo. Devuelve True si existía."""
+        conn = self._conectar()
+        cursor = conn.execute('DELETE FROM catalogo_rutas WHERE nombre = ?', (nombre,))
+        if cursor.rowcount:
+            version = self._incrementar_version(conn)
+            conn.execute('INSERT OR REPLACE INTO catalogo_eliminadas (nombre, cambio) VALUES (?, ?)',
+                         (nombre, version))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+
+    def cambios_desde(self, version: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[str], int]:
+        """
+        Rutas guardadas y nombres de las eliminadas después de una versión del catálogo.
+
+        Parameters
+        ----------
+        version : int, optional
+            Versión devuelta por la llamada anterior; si es None, se devuelven todas las rutas.
+
+        Returns
+        -------
+        Tuple[List[Dict[str, Any]], List[str], int]
+            Rutas nuevas o modificadas, nombres de las eliminadas y versión a la que
+            corresponden, que se pasa en la siguiente llamada.
+        """
+        conn = self._conectar()
+        # La versión se lee antes que los cambios: una escritura concurrente puede
+        # devolverse otra vez en la siguiente llamada, pero nunca perderse
+        fila = conn.execute("SELECT valor FROM catalogo_meta WHERE clave = 'version'").fetchone()
+        actual = int(fila[0]) if fila else 0
+        if version is None:
+            documentos = conn.execute('SELECT datos FROM catalogo_rutas').fetchall()
+            eliminadas = []
+        else:
+            documentos = conn.execute('SELECT datos FROM catalogo_rutas WHERE cambio > ?', (version,)).fetchall()
+            eliminadas = [nombre for nombre, in conn.execute(
+                'SELECT nombre FROM catalogo_eliminadas WHERE cambio > ?', (version,))]
+        conn.close()
+        return [json.loads(documento) for documento, in documentos], eliminadas, actual
+
+    def obtener(self, nombre: str) -> Optional[Dict[str, Any]]:
+        """Devuelve una ruta por su nombre o None si no está en el catálogo."""
+        conn = self._conectar()
+        fila = conn.execute('SELECT datos FROM catalogo_rutas WHERE nombre = ?', (nombre,)).fetchone()
+        conn.close()
+        return json.loads(fila[0]) if fila else None
+
+    def obtener_varias(self, nombres: List[str]) -> List[Dict[str, Any]]:
+        """Devuelve varias rutas por nombre, en el mismo orden; se omiten las que no están."""
+        if not nombres:
+            return []
+        conn = self._conectar()
+        filas = conn.execute(f'SELECT nombre, datos FROM catalogo_rutas WHERE nombre IN ({", ".join("?" * len(nombres))})',
+                             list(nombres)).fetchall()
+        conn.close()
+        datos = dict(filas)
+        return [json.loads(datos[nombre]) for nombre in nombres if nombre in datos]
+
+    def listar(self, dificultad: Optional[str] = None, modo: Optional[str] = None,
+               max_km: Optional[float] = None, max_horas: Optional[float] = None,
+               creador: Optional[str] = None, orden: str = "fecha", descendente: bool = True,
+               limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Lista las rutas que cumplen todos los filtros indicados con una consulta indexada.
+
+        Parameters
+        ----------
+        dificultad : str, optional
+            "bajo", "medio" o "alto".
+        modo : str, optional
+            "walk", "bike" o "drive".
+        max_km : float, optional
+            Distancia máxima en km.
+        max_horas : float, optional
+            Duración máxima en horas.
+        creador : str, optional
+            Usuario que creó la ruta.
+        orden : str, optional
+            Columna de `ORDENES` por la que ordenar.
+        descendente : bool, optional
+            Orden descendente (por defecto, las más recientes primero).
+        limite : int, optional
+            Número máximo de rutas a devolver.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Rutas en el esquema actual.
+        """
+        return self.consultar(ConsultaRutas(dificultad=dificultad, modo=modo, max_km=max_km, max_horas=max_horas,
+                                            creador=creador, orden=orden, descendente=descendente, limite=limite))
+
+    def consultar(self, consulta: ConsultaRutas) -> List[Dict[str, Any]]:
+        """
+        Ejecuta una consulta con todos sus filtros, orden y límite en una sola sentencia
+        SQL que aprovecha los índices del catálogo.
+
+        Parameters
+        ----------
+        consulta : ConsultaRutas
+            Filtros, orden y límite.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Rutas en el esquema actual.
+        """
+        return [json.loads(documento) for documento in self.iterar_documentos(consulta)]
+
+    def iterar_documentos(self, consulta: ConsultaRutas, lote: int = 500) -> Iterator[str]:
+        """
+        Recorre el resultado de una consulta leyendo las filas por lotes y devolviendo el
+        JSON de cada ruta tal y como está guardado, sin decodificarlo.
+
+        Parameters
+        ----------
+        consulta : ConsultaRutas
+            Filtros, orden y límite.
+        lote : int, optional
+            Filas leídas de la base de datos cada vez.
+
+        Yields
+        ------
+        str
+            Documento JSON de cada ruta.
+        """
+        clausulas, parametros = consulta.sql()
+        conn = self._conectar()
+        try:
+            cursor = conn.execute("SELECT datos FROM catalogo_rutas" + clausulas, parametros)
+            while True:
+                filas = cursor.fetchmany(lote)
+                if not filas:
+                    break
+                for fila in filas:
+                    yield fila[0]
+        finally:
+            conn.close()
+
+    def contar(self) -> int:
+        """Número de rutas del catálogo."""
+        conn = self._conectar()
+        total = conn.execute('SELECT COUNT(*) FROM catalogo_rutas').fetchone()[0]
+        conn.close()
+        return total
+
+    def importar_directorio(self, directorio: str = RUTAS_DIR) -> int:
+        """
+        Importa (o actualiza) en el catálogo todos los ficheros JSON de un directorio.
+
+        Returns
+        -------
+        int
+            Número de rutas importadas.
+        """
+        rutas = []
+        if os.path.isdir(directorio):
+            for archivo in sorted(os.listdir(directorio)):
+                if not archivo.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directorio, archivo), "r", encoding="utf-8") as f:
+                        datos = json.load(f)
+                    datos.setdefault("nombre", archivo[:-len(".json")])
+                    rutas.append(datos)
+                except Exception as e:
+                    print(f"❌ Error al importar {archivo}: {e}")
+        return self.guardar_varias(rutas)
+
+    def importar_una_vez(self, directorio: str = RUTAS_DIR) -> int:
+        """
+        Importa el directorio de rutas solo la primera vez que se usa el catálogo, de forma
+        que después el catálogo es el registro principal.
+
+        Returns
+        -------
+        int
+            Rutas importadas (0 si ya se había importado antes).
+        """
+        conn = self._conectar()
+        importado = conn.execute("SELECT valor FROM catalogo_meta WHERE clave = 'importado'").fetchone()
+        conn.close()
+        if importado:
+            return 0
+        total = self.importar_directorio(directorio)
+        conn = self._conectar()
+        conn.execute("INSERT OR REPLACE INTO catalogo_meta (clave, valor) VALUES ('importado', ?)",
+                     (os.path.abspath(directorio),))
+        conn.commit()
+        conn.close()
+        return total
+
+
+_catalogos: Dict[str, CatalogoRutas] = {}
+_catalogos_lock = threading.Lock()
+
+
+def obtener_catalogo(ruta_db: str = CATALOGO_DB_PATH) -> CatalogoRutas:
+    """Devuelve el catálogo compartido para ese fichero, creándolo si no existe."""
+    with _catalogos_lock:
+        if ruta_db not in _catalogos:
+            _catalogos[ruta_db] = CatalogoRutas(ruta_db)
+        return _catalogos[ruta_db]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "importar":
+        origen = sys.argv[2] if len(sys.argv) > 2 else RUTAS_DIR
+        print(f"✅ {obtener_catalogo().importar_directorio(origen)} rutas importadas desde {origen}")
+    else:
+        print("Uso: python catalogo_rutas.py importar [directorio]")
@@ -0,0 +1,359 @@
+"""Cola local de trabajos en segundo plano respaldada por SQLite, con procesos trabajadores."""
+import atexit
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COLA_DB_PATH = os.path.join(BASE_DIR, "cache", "trabajos.db")
+
+# Intentos máximos de un trabajo que falla por un error transitorio
+MAX_INTENTOS = 3
+
+# Espera antes del primer reintento (se duplica en cada intento), en segundos
+ESPERA_REINTENTO = 5.0
+
+# Pausa de los trabajadores cuando no hay trabajos pendientes, en segundos
+INTERVALO_SONDEO = 0.5
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+
+class ErrorTransitorio(Exception):
+    """Error que puede resolverse reintentando el trabajo más tarde."""
+
+
+def es_transitorio(error: BaseException) -> bool:
+    """
+    Indica si un error (o alguno de los que lo provocaron) es transitorio: un
+    `ErrorTransitorio`, un fallo temporal de Nominatim o un error de red.
+    """
+    try:
+        from geocodificador import ERRORES_TRANSITORIOS
+    except ImportError:
+        ERRORES_TRANSITORIOS = ()
+    tipos = (ErrorTransitorio, ConnectionError, TimeoutError) + tuple(ERRORES_TRANSITORIOS)
+
+    vistos = set()
+    while error is not None and id(error) not in vistos:
+        if isinstance(error, tipos):
+            return True
+        vistos.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+_manejadores: Dict[str, Callable[[dict], Any]] = {}
+
+
+def registrar_manejador(tipo: str) -> Callable:
+    """
+    Decorador que asocia una función a un tipo de trabajo.
+
+    La función recibe los parámetros del trabajo y devuelve un resultado serializable
+    a JSON. Debe registrarse al importar el módulo que arranca los trabajadores para
+    que los procesos hijos la hereden.
+    """
+    def decorador(funcion: Callable[[dict], Any]) -> Callable[[dict], Any]:
+        _manejadores[tipo] = funcion
+        return funcion
+    return decorador
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos persistente compartida por todos los procesos de la aplicación.
+
+    Parameters
+    ----------
+    ruta_db : str, optional
+        Fichero SQLite de la cola.
+    max_intentos : int, optional
+        Intentos máximos de cada trabajo ante errores transitorios.
+    espera_reintento : float, optional
+        Segundos de espera antes del primer reintento.
+    """
+
+    def __init__(self, ruta_db: str = COLA_DB_PATH, max_intentos: int = MAX_INTENTOS,
+                 espera_reintento: float = ESPERA_REINTENTO) -> None:
+        self.ruta_db = ruta_db
+        self.max_intentos = max_intentos
+        self.espera_reintento = espera_reintento
+        os.makedirs(os.path.dirname(self.ruta_db), exist_ok=True)
+        conn = self._conectar()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                parametros TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                resultado TEXT,
+                error TEXT,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                trabajador INTEGER,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL,
+                disponible_en REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, disponible_en)')
+        conn.close()
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre una conexión en modo autocommit para controlar las transacciones a mano."""
+        return sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+
+    def encolar(self, tipo: str, parametros: dict) -> str:
+        """
+        Añade un trabajo a la cola.
+
+        Parameters
+        ----------
+        tipo : str
+            Tipo de trabajo (debe tener un manejador registrado).
+        parametros : dict
+            Parámetros serializables a JSON que recibirá el manejador.
+
+        Returns
+        -------
+        str
+            Identificador del trabajo.
+        """
+        id_trabajo = uuid.uuid4().hex
+        ahora = time.time()
+        conn = self._conectar()
+        conn.execute('''
+            INSERT INTO trabajos (id, tipo, parametros, estado, creado, actualizado, disponible_en)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (id_trabajo, tipo, json.dumps(parametros, ensure_ascii=False), PENDIENTE, ahora, ahora, ahora))
+        conn.close()
+        return id_trabajo
+
+    def obtener(self, id_trabajo: str) -> Optional[dict]:
+        """Devuelve el estado y, si ha terminado, el resultado o el error de un trabajo."""
+        conn = self._conectar()
+        fila = conn.execute('''
+            SELECT id, tipo, estado, resultado, error, intentos, creado, actualizado
+            FROM trabajos WHERE id = ?
+        ''', (id_trabajo,)).fetchone()
+        conn.close()
+        if not fila:
+            return None
+        id_trabajo, tipo, estado, resultado, error, intentos, creado, actualizado = fila
+        return {
+            "id": id_trabajo,
+            "tipo": tipo,
+            "estado": estado,
+            "resultado": json.loads(resultado) if resultado is not None else None,
+            "error": error,
+            "intentos": intentos,
+            "creado": _fecha_iso(creado),
+            "actualizado": _fecha_iso(actualizado)
+        }
+
+    def tomar(self) -> Optional[dict]:
+        """
+        Reserva para el proceso actual el trabajo pendiente más antiguo que ya pueda ejecutarse.
+
+        Returns
+        -------
+        Optional[dict]
+            {"id", "tipo", "parametros", "intentos"} o None si no hay trabajos disponibles.
+        """
+        conn = self._conectar()
+        try:
+            # BEGIN IMMEDIATE evita que dos trabajadores reserven el mismo trabajo
+            conn.execute('BEGIN IMMEDIATE')
+            ahora = time.time()
+            fila = conn.execute('''
+                SELECT id, tipo, parametros, intentos FROM trabajos
+                WHERE estado = ? AND disponible_en <= ?
+                ORDER BY creado LIMIT 1
+            ''', (PENDIENTE, ahora)).fetchone()
+            if fila:
+                conn.execute('''
+                    UPDATE trabajos SET estado = ?, intentos = intentos + 1, trabajador = ?, actualizado = ?
+                    WHERE id = ?
+                ''', (EN_CURSO, os.getpid(), ahora, fila[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        if not fila:
+            return None
+        return {"id": fila[0], "tipo": fila[1], "parametros": json.loads(fila[2]), "intentos": fila[3] + 1}
+
+    def completar(self, id_trabajo: str, resultado: Any) -> None:
+        """Marca un trabajo como completado y guarda su resultado."""
+        conn = self._conectar()
+        conn.execute('UPDATE trabajos SET estado = ?, resultado = ?, error = NULL, actualizado = ? WHERE id = ?',
+                     (COMPLETADO, json.dumps(resultado, ensure_ascii=False, default=str), time.time(), id_trabajo))
+        conn.close()
+
+    def fallar(self, id_trabajo: str, error: str, intentos: int, reintentar: bool) -> None:
+        """
+        Registra el fallo de un trabajo y lo vuelve a dejar pendiente, con espera
+        exponencial, si el error es transitorio y quedan intentos.
+        """
+        ahora = time.time()
+        conn = self._conectar()
+        if reintentar and intentos < self.max_intentos:
+            conn.execute('''
+                UPDATE trabajos SET estado = ?, error = ?, trabajador = NULL, actualizado = ?, disponible_en = ?
+                WHERE id = ?
+            ''', (PENDIENTE, error, ahora, ahora + self.espera_reintento * 2 ** (intentos - 1), id_trabajo))
+        else:
+            conn.execute('UPDATE trabajos SET estado = ?, error = ?, actualizado = ? WHERE id = ?',
+                         (ERROR, error, ahora, id_trabajo))
+        conn.close()
+
+    def recuperar_huerfanos(self) -> int:
+        """
+        Devuelve a la cola los trabajos en curso cuyo proceso trabajador ya no existe
+        (por ejemplo, tras reiniciar la aplicación).
+
+        Returns
+        -------
+        int
+            Número de trabajos recuperados.
+        """
+        conn = self._conectar()
+        huerfanos = [
+            id_trabajo for id_trabajo, pid in
+            conn.execute('SELECT id, trabajador FROM trabajos WHERE estado = ?', (EN_CURSO,)).fetchall()
+            if not _proceso_vivo(pid)
+        ]
+        for id_trabajo in huerfanos:
+            conn.execute('UPDATE trabajos SET estado = ?, trabajador = NULL, actualizado = ? WHERE id = ? AND estado = ?',
+                         (PENDIENTE, time.time(), id_trabajo, EN_CURSO))
+        conn.close()
+        return len(huerfanos)
+
+    def ejecutar(self, trabajo: dict) -> None:
+        """Ejecuta un trabajo reservado con su manejador y guarda el resultado o el error."""
+        try:
+            manejador = _manejadores[trabajo["tipo"]]
+        except KeyError:
+            self.fallar(trabajo["id"], f"Tipo de trabajo desconocido: {trabajo['tipo']}", trabajo["intentos"], False)
+            return
+        try:
+            resultado = manejador(trabajo["parametros"])
+        except Exception as e:
+            transitorio = es_transitorio(e)
+            print(f"⚠️ Error en el trabajo {trabajo['id']} (intento {trabajo['intentos']}): {str(e)}")
+            if not transitorio:
+                traceback.print_exc()
+            self.fallar(trabajo["id"], str(e), trabajo["intentos"], transitorio)
+            return
+        self.completar(trabajo["id"], resultado)
+
+
+def _fecha_iso(marca: float) -> str:
+    """Convierte una marca de tiempo en texto ISO 8601."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(marca))
+
+
+def _proceso_vivo(pid: Optional[int]) -> bool:
+    """Indica si existe un proceso con ese PID en esta máquina."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def bucle_trabajador(cola: ColaTrabajos, parada, inicializador: Optional[Callable[[], None]] = None) -> None:
+    """
+    Bucle principal de un proceso trabajador: toma trabajos hasta que se activa `parada`.
+
+    Los errores transitorios de Nominatim se propagan en lugar de convertirse en
+    direcciones no encontradas, para que el trabajo se reintente.
+    """
+    try:
+        import geocodificador
+        geocodificador.PROPAGAR_ERRORES_TRANSITORIOS = True
+    except ImportError:
+        pass
+    if inicializador:
+        inicializador()
+
+    while not parada.is_set():
+        try:
+            trabajo = cola.tomar()
+        except sqlite3.Error as e:
+            print(f"⚠️ Error al leer la cola de trabajos: {str(e)}")
+            trabajo = None
+        if trabajo is None:
+            parada.wait(INTERVALO_SONDEO)
+            continue
+        cola.ejecutar(trabajo)
+
+
+class GrupoTrabajadores:
+    """
+    Procesos que consumen la cola de trabajos en segundo plano.
+
+    Parameters
+    ----------
+    cola : ColaTrabajos
+        Cola a consumir.
+    procesos : int, optional
+        Número de procesos trabajadores (concurrencia máxima).
+    inicializador : Callable[[], None], optional
+        Función que cada proceso ejecuta al arrancar (por ejemplo, para cerrar las
+        conexiones a bases de datos heredadas del proceso padre).
+    """
+
+    def __init__(self, cola: ColaTrabajos, procesos: int = 2,
+                 inicializador: Optional[Callable[[], None]] = None) -> None:
+        self.cola = cola
+        self.procesos = max(1, procesos)
+        self.inicializador = inicializador
+        self._parada = multiprocessing.Event()
+        self._procesos: List[multiprocessing.Process] = []
+
+    @property
+    def activo(self) -> bool:
+        return any(p.is_alive() for p in self._procesos)
+
+    def iniciar(self) -> None:
+        """Recupera los trabajos huérfanos y arranca los procesos trabajadores."""
+        if self.activo:
+            return
+        recuperados = self.cola.recuperar_huerfanos()
+        if recuperados:
+            print(f"🔁 {recuperados} trabajos interrumpidos devueltos a la cola")
+        self._parada.clear()
+        # No son daemon para que puedan usar a su vez pools de procesos (RutaAuto)
+        self._procesos = [
+            multiprocessing.Process(target=bucle_trabajador, name=f"trabajador-{i + 1}",
+                                    args=(self.cola, self._parada, self.inicializador))
+            for i in range(self.procesos)
+        ]
+        for proceso in self._procesos:
+            proceso.start()
+        atexit.register(self.detener)
+
+    def detener(self, timeout: float = 10.0) -> None:
+        """Pide a los trabajadores que terminen tras el trabajo en curso y los espera."""
+        self._parada.set()
+        for proceso in self._procesos:
+            proceso.join(timeout)
+            if proceso.is_alive():
+                proceso.terminate()
+        self._procesos = []
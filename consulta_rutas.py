@@ -0,0 +1,258 @@
+"""Consultas de rutas: todos los filtros, el orden y el límite de un listado en un solo objeto."""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Columnas por las que se puede ordenar un listado
+ORDENES = ("fecha", "nombre", "distancia_km", "duracion_horas")
+
+# Campo del esquema de rutas que corresponde a cada columna
+CAMPOS = {"fecha": "fecha_creacion", "nombre": "nombre",
+          "distancia_km": "distancia_km", "duracion_horas": "duracion_horas"}
+
+
+def _fecha(valor: str, fin_del_dia: bool = False) -> str:
+    """Normaliza una fecha "YYYY-MM-DD[ HH:MM:SS]" al formato con el que se guardan las rutas."""
+    fecha = datetime.fromisoformat(valor.strip().replace("T", " "))
+    if fin_del_dia and len(valor.strip()) == 10:
+        fecha = fecha.replace(hour=23, minute=59, second=59)
+    return fecha.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@dataclass
+class ConsultaRutas:
+    """
+    Filtros, orden y límite de un listado de rutas.
+
+    Una misma consulta se puede evaluar sobre una lista de rutas en memoria, en una sola
+    pasada (`filtrar`), o traducirse a SQL para el catálogo (`sql`).
+
+    Attributes
+    ----------
+    dificultad : str, optional
+        "bajo", "medio" o "alto".
+    modo : str, optional
+        "walk", "bike" o "drive".
+    min_km, max_km : float, optional
+        Rango de distancia en km.
+    min_horas, max_horas : float, optional
+        Rango de duración en horas.
+    creador : str, optional
+        Usuario que creó la ruta.
+    desde, hasta : str, optional
+        Rango de fechas de creación, "YYYY-MM-DD HH:MM:SS".
+    orden : str
+        Columna de `ORDENES` por la que ordenar.
+    descendente : bool
+        Orden descendente (por defecto, las más recientes primero).
+    limite : int, optional
+        Número máximo de rutas.
+    despues_de : Tuple[Any, str], optional
+        Valor de la columna de orden y nombre de la última ruta de la página anterior;
+        solo se devuelven las rutas que van detrás (paginación por cursor).
+    """
+
+    dificultad: Optional[str] = None
+    modo: Optional[str] = None
+    min_km: Optional[float] = None
+    max_km: Optional[float] = None
+    min_horas: Optional[float] = None
+    max_horas: Optional[float] = None
+    creador: Optional[str] = None
+    desde: Optional[str] = None
+    hasta: Optional[str] = None
+    orden: str = "fecha"
+    descendente: bool = True
+    limite: Optional[int] = None
+    despues_de: Optional[Tuple[Any, str]] = None
+
+    def __post_init__(self) -> None:
+        if self.orden not in ORDENES:
+            raise ValueError(f"Orden '{self.orden}' no válido. Órdenes disponibles: {', '.join(ORDENES)}")
+        if self.limite is not None and self.limite < 0:
+            raise ValueError("El límite no puede ser negativo")
+        self.dificultad = self.dificultad.lower() if self.dificultad else None
+        self.modo = self.modo.lower() if self.modo else None
+
+    @classmethod
+    def desde_parametros(cls, parametros: Mapping[str, str]) -> "ConsultaRutas":
+        """
+        Construye la consulta a partir de los parámetros de una petición.
+
+        Admite dificultad, modo (o modo_transporte / transporte), min_km, max_km, min_horas,
+        max_horas, creador, desde, hasta (fechas ISO; una fecha sin hora en `hasta` incluye
+        todo el día), orden (con "-" delante para orden descendente, p. ej. "-fecha"),
+        limite (o limit) y cursor (el devuelto por `cursor` para la página anterior).
+
+        Raises
+        ------
+        ValueError
+            Si algún parámetro no tiene un valor válido.
+        """
+        def numero(clave: str) -> Optional[float]:
+            valor = parametros.get(clave)
+            if valor in (None, ""):
+                return None
+            try:
+                return float(valor)
+            except ValueError:
+                raise ValueError(f"El parámetro '{clave}' debe ser un número") from None
+
+        def entero(clave: str) -> Optional[int]:
+            valor = parametros.get(clave)
+            if valor in (None, ""):
+                return None
+            try:
+                return int(valor)
+            except ValueError:
+                raise ValueError(f"El parámetro '{clave}' debe ser un número entero") from None
+
+        def fecha(clave: str, fin_del_dia: bool = False) -> Optional[str]:
+            valor = parametros.get(clave)
+            if not valor:
+                return None
+            try:
+                return _fecha(valor, fin_del_dia)
+            except ValueError:
+                raise ValueError(f"El parámetro '{clave}' debe ser una fecha YYYY-MM-DD") from None
+
+        orden = parametros.get("orden") or "-fecha"
+        limite = entero("limite") if parametros.get("limite") not in (None, "") else entero("limit")
+        cursor = parametros.get("cursor")
+        return cls(
+            dificultad=parametros.get("dificultad") or None,
+            modo=parametros.get("modo") or parametros.get("modo_transporte") or parametros.get("transporte") or None,
+            min_km=numero("min_km"),
+            max_km=numero("max_km"),
+            min_horas=numero("min_horas"),
+            max_horas=numero("max_horas"),
+            creador=parametros.get("creador") or None,
+            desde=fecha("desde"),
+            hasta=fecha("hasta", fin_del_dia=True),
+            orden=orden.lstrip("-"),
+            descendente=orden.startswith("-"),
+            limite=limite,
+            despues_de=cls.leer_cursor(cursor) if cursor else None
+        )
+
+    def cursor(self, ruta: Dict[str, Any]) -> str:
+        """
+        Cursor opaco que apunta a una ruta: pasado como parámetro "cursor" con la misma
+        consulta, devuelve las rutas que van detrás de ella.
+        """
+        valor = [ruta.get(CAMPOS[self.orden]), ruta.get("nombre")]
+        return base64.urlsafe_b64encode(json.dumps(valor).encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def leer_cursor(cursor: str) -> Tuple[Any, str]:
+        """
+        Decodifica un cursor de `cursor`.
+
+        Raises
+        ------
+        ValueError
+            Si el cursor no es válido.
+        """
+        try:
+            valor, nombre = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except Exception:
+            raise ValueError("Cursor no válido") from None
+        if not isinstance(nombre, str) or not (valor is None or isinstance(valor, (str, int, float))):
+            raise ValueError("Cursor no válido")
+        return valor, nombre
+
+    def va_despues(self, valor: Any, nombre: str) -> bool:
+        """
+        Indica si una ruta con ese valor en la columna de orden y ese nombre va detrás del
+        cursor `despues_de` (mismo orden que `filtrar` y `sql`: sin valor al final y, a
+        igual valor, por nombre).
+        """
+        valor_cursor, nombre_cursor = self.despues_de
+        if valor_cursor is None:
+            return valor is None and nombre > nombre_cursor
+        if valor is None:
+            return True
+        if valor != valor_cursor:
+            return valor < valor_cursor if self.descendente else valor > valor_cursor
+        return nombre > nombre_cursor
+
+    def _condiciones(self) -> List[Tuple[str, str, Any]]:
+        """Condiciones activas como (campo del esquema, operador, valor)."""
+        condiciones = [
+            ("dificultad", "=", self.dificultad),
+            ("modo", "=", self.modo),
+            ("distancia_km", ">=", self.min_km),
+            ("distancia_km", "<=", self.max_km),
+            ("duracion_horas", ">=", self.min_horas),
+            ("duracion_horas", "<=", self.max_horas),
+            ("creador", "=", self.creador),
+            ("fecha_creacion", ">=", self.desde),
+            ("fecha_creacion", "<=", self.hasta)
+        ]
+        return [(campo, operador, valor) for campo, operador, valor in condiciones if valor is not None]
+
+    def predicado(self) -> Callable[[Dict[str, Any]], bool]:
+        """
+        Compila todos los filtros en una única función que decide si una ruta (en el
+        esquema de `esquema_rutas`) cumple la consulta.
+        """
+        comprobaciones = []
+        for campo, operador, valor in self._condiciones():
+            if operador == "=":
+                comprobaciones.append(lambda r, c=campo, v=valor: r.get(c) == v)
+            elif operador == ">=":
+                comprobaciones.append(lambda r, c=campo, v=valor: r.get(c) is not None and r[c] >= v)
+            else:
+                comprobaciones.append(lambda r, c=campo, v=valor: r.get(c) is not None and r[c] <= v)
+        if self.despues_de is not None:
+            campo = CAMPOS[self.orden]
+            comprobaciones.append(lambda r: self.va_despues(r.get(campo), r.get("nombre") or ""))
+        return lambda ruta: all(comprobar(ruta) for comprobar in comprobaciones)
+
+    def filtrar(self, rutas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Aplica la consulta a una colección de rutas en memoria: una pasada para filtrar,
+        una ordenación y el límite.
+        """
+        cumple = self.predicado()
+        seleccion = sorted((r for r in rutas if cumple(r)), key=lambda r: r.get("nombre") or "")
+        campo = CAMPOS[self.orden]
+        # Igual que en SQL: las rutas sin valor al final y, a igual valor, por nombre
+        # (la ordenación es estable también con reverse=True)
+        con_valor = [r for r in seleccion if r.get(campo) is not None]
+        con_valor.sort(key=lambda r: r[campo], reverse=self.descendente)
+        seleccion = con_valor + [r for r in seleccion if r.get(campo) is None]
+        return seleccion if self.limite is None else seleccion[:self.limite]
+
+    def sql(self) -> Tuple[str, List[Any]]:
+        """
+        Cláusulas WHERE, ORDER BY y LIMIT equivalentes para la tabla del catálogo.
+
+        Returns
+        -------
+        Tuple[str, List[Any]]
+            Texto SQL a añadir tras "SELECT ... FROM catalogo_rutas" y sus parámetros.
+        """
+        columnas = {campo: columna for columna, campo in CAMPOS.items()}
+        condiciones, parametros = [], []
+        for campo, operador, valor in self._condiciones():
+            condiciones.append(f"{columnas.get(campo, campo)} {operador} ?")
+            parametros.append(valor)
+        if self.despues_de is not None:
+            valor, nombre = self.despues_de
+            if valor is None:
+                condiciones.append(f"({self.orden} IS NULL AND nombre > ?)")
+                parametros.append(nombre)
+            else:
+                comparacion = "<" if self.descendente else ">"
+                condiciones.append(f"({self.orden} IS NULL OR {self.orden} {comparacion} ? "
+                                   f"OR ({self.orden} = ? AND nombre > ?))")
+                parametros.extend([valor, valor, nombre])
+        consulta = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        consulta += f" ORDER BY {self.orden} IS NULL, {self.orden} {'DESC' if self.descendente else 'ASC'}, nombre"
+        if self.limite is not None:
+            consulta += " LIMIT ?"
+            parametros.append(self.limite)
+        return consulta, parametros
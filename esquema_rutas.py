@@ -0,0 +1,262 @@
+"""
+Esquema versionado de los ficheros JSON de rutas.
+
+Versión 2 (actual)::
+
+    {
+        "version": 2,
+        "nombre": "Ruta_1",
+        "ubicacion": [38.33, -0.48],
+        "origen": {"direccion": "Plaza de los Luceros", "lat": 38.3452, "lng": -0.4810},
+        "puntos_intermedios": [{"direccion": "Avenida Maisonnave"}],
+        "destino": {"direccion": "Playa del Postiguet", "lat": 38.3470, "lng": -0.4760},
+        "modo": "walk",
+        "distancia_km": 3.21,
+        "duracion_horas": 0.64,
+        "dificultad": "medio",
+        "fecha_creacion": "2025-03-27 13:38:03",
+        "creador": "usuario",
+        "distancia": "3.21 km",
+        "duracion": "38 min",
+        "modo_transporte": "walk"
+    }
+
+Los puntos llevan "lat" y "lng" cuando se conocen sus coordenadas (los índices
+espaciales solo usan esas). Los campos numéricos son los que se usan para filtrar; "distancia", "duracion" y
+"modo_transporte" son copias de solo lectura para los clientes antiguos. Los ficheros
+sin "version" (versión 1) usan textos como "3.21 km" o "1 h 5 min" y se convierten con
+`a_esquema`, o de forma permanente con:
+
+    python esquema_rutas.py migrar [directorio]
+"""
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+VERSION_ESQUEMA = 2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTAS_DIR = os.path.join(BASE_DIR, "rutas")
+
+# Claves del esquema antiguo que se sustituyen por las de la versión actual
+CLAVES_ANTIGUAS = ("fecha_registro",)
+
+
+def leer_km(valor: Any) -> Optional[float]:
+    """Primer número de un valor como 5.62, "5.62 km" o "5,62 km"."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        coincidencia = re.search(r"\d+(?:[.,]\d+)?", valor)
+        if coincidencia:
+            return float(coincidencia.group().replace(",", "."))
+    return None
+
+
+def leer_horas(valor: Any) -> Optional[float]:
+    """Duración en horas a partir de un número o de un texto como "1 h 7 min" o "19 min"."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if not isinstance(valor, str):
+        return None
+    texto = valor.lower()
+    horas = re.search(r"(\d+(?:[.,]\d+)?)\s*h", texto)
+    minutos = re.search(r"(\d+(?:[.,]\d+)?)\s*min", texto)
+    if not horas and not minutos:
+        return leer_km(texto)
+    total = float(horas.group(1).replace(",", ".")) if horas else 0.0
+    if minutos:
+        total += float(minutos.group(1).replace(",", ".")) / 60
+    return total
+
+
+def formatear_distancia(distancia_km: float) -> str:
+    """Texto de la distancia para mostrar, p. ej. "3.21 km"."""
+    return f"{distancia_km:.2f} km"
+
+
+def formatear_duracion(duracion_horas: float) -> str:
+    """Texto de la duración para mostrar, p. ej. "1 h 5 min" o "38 min"."""
+    horas = int(duracion_horas)
+    minutos = int((duracion_horas - horas) * 60)
+    return f"{horas} h {minutos} min" if horas > 0 else f"{minutos} min"
+
+
+def _punto(valor: Any) -> Any:
+    """Los puntos se guardan como diccionarios con, al menos, la clave "direccion"."""
+    return {"direccion": valor} if isinstance(valor, str) else valor
+
+
+def punto_geocodificado(direccion: Any, coordenadas: Optional[Tuple[float, float]]) -> Dict[str, Any]:
+    """
+    Punto del esquema con su dirección y, si se conocen, sus coordenadas en "lat" y "lng".
+
+    Parameters
+    ----------
+    direccion : str or dict
+        Dirección tal y como la escribió el usuario (o diccionario con "direccion").
+    coordenadas : Tuple[float, float], optional
+        (lat, lon) obtenidas al geocodificar la dirección.
+
+    Returns
+    -------
+    Dict[str, Any]
+    """
+    punto = dict(_punto(direccion))
+    if coordenadas:
+        punto["lat"], punto["lng"] = float(coordenadas[0]), float(coordenadas[1])
+    return punto
+
+
+def crear_ruta(nombre: str, origen: Any, destino: Any, puntos_intermedios: Optional[List[Any]],
+               modo: str, distancia_km: float, duracion_horas: float, dificultad: str,
+               ubicacion: Optional[Any] = None, creador: Optional[str] = None,
+               fecha_creacion: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Construye el diccionario de una ruta en el esquema actual.
+
+    Parameters
+    ----------
+    nombre : str
+        Nombre de la ruta.
+    origen, destino : str or dict
+        Dirección de inicio y de fin (texto o diccionario con "direccion" y, si se
+        conocen, "lat" y "lng"; ver `punto_geocodificado`).
+    puntos_intermedios : List[str or dict], optional
+        Direcciones intermedias.
+    modo : str
+        "walk", "bike" o "drive".
+    distancia_km : float
+        Distancia total en km.
+    duracion_horas : float
+        Duración total en horas.
+    dificultad : str
+        "bajo", "medio" o "alto".
+    ubicacion : tuple, optional
+        Coordenadas aproximadas de la ruta.
+    creador : str, optional
+        Usuario que creó la ruta.
+    fecha_creacion : str, optional
+        "YYYY-MM-DD HH:MM:SS"; por defecto, ahora.
+
+    Returns
+    -------
+    Dict[str, Any]
+    """
+    distancia_km = float(distancia_km)
+    duracion_horas = float(duracion_horas)
+    return {
+        "version": VERSION_ESQUEMA,
+        "nombre": nombre,
+        "ubicacion": list(ubicacion) if isinstance(ubicacion, tuple) else ubicacion,
+        "origen": _punto(origen),
+        "puntos_intermedios": [_punto(p) for p in (puntos_intermedios or [])],
+        "destino": _punto(destino),
+        "modo": modo,
+        "distancia_km": distancia_km,
+        "duracion_horas": duracion_horas,
+        "dificultad": (dificultad or "").lower(),
+        "fecha_creacion": fecha_creacion or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "creador": creador,
+        "distancia": formatear_distancia(distancia_km),
+        "duracion": formatear_duracion(duracion_horas),
+        "modo_transporte": modo
+    }
+
+
+def a_esquema(datos: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Devuelve la ruta en el esquema actual. Las rutas que ya lo están se devuelven tal cual;
+    las antiguas se convierten interpretando sus textos de distancia y duración.
+
+    Las claves desconocidas se conservan.
+    """
+    if datos.get("version") == VERSION_ESQUEMA:
+        return datos
+
+    distancia = datos.get("distancia_km")
+    if distancia is None:
+        distancia = datos.get("distancia")
+    duracion = datos.get("duracion_horas")
+    if duracion is None:
+        duracion = datos.get("duracion")
+    modo = datos.get("modo") or datos.get("modo_transporte") or "walk"
+
+    ruta = crear_ruta(
+        nombre=datos["nombre"],
+        origen=datos.get("origen"),
+        destino=datos.get("destino"),
+        puntos_intermedios=datos.get("puntos_intermedios"),
+        modo=modo.lower(),
+        distancia_km=leer_km(distancia) or 0.0,
+        duracion_horas=leer_horas(duracion) or 0.0,
+        dificultad=datos.get("dificultad"),
+        ubicacion=datos.get("ubicacion"),
+        creador=datos.get("creador"),
+        fecha_creacion=datos.get("fecha_creacion") or datos.get("fecha_registro")
+    )
+    extras = {k: v for k, v in datos.items() if k not in ruta and k not in CLAVES_ANTIGUAS}
+    ruta.update(extras)
+    return ruta
+
+
+def cargar_ruta(ruta_json: str) -> Dict[str, Any]:
+    """
+    Lee un fichero de ruta y lo devuelve en el esquema actual.
+
+    Las rutas ya migradas se devuelven sin ninguna conversión.
+    """
+    with open(ruta_json, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    if isinstance(datos, dict) and datos.get("version") == VERSION_ESQUEMA:
+        return datos
+    datos.setdefault("nombre", os.path.splitext(os.path.basename(ruta_json))[0])
+    return a_esquema(datos)
+
+
+def guardar_ruta(ruta_json: str, datos: Dict[str, Any]) -> None:
+    """Escribe una ruta de forma atómica (fichero temporal y renombrado)."""
+    temporal = f"{ruta_json}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, ruta_json)
+
+
+def migrar_directorio(directorio: str = RUTAS_DIR) -> Tuple[int, int, int]:
+    """
+    Reescribe en el esquema actual todas las rutas JSON de un directorio.
+
+    Returns
+    -------
+    Tuple[int, int, int]
+        (migradas, ya al día, con errores)
+    """
+    migradas = al_dia = errores = 0
+    for archivo in sorted(os.listdir(directorio)):
+        if not archivo.endswith(".json"):
+            continue
+        ruta_json = os.path.join(directorio, archivo)
+        try:
+            with open(ruta_json, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") == VERSION_ESQUEMA:
+                al_dia += 1
+                continue
+            guardar_ruta(ruta_json, cargar_ruta(ruta_json))
+            migradas += 1
+        except Exception as e:
+            print(f"❌ Error al migrar {archivo}: {e}")
+            errores += 1
+    return migradas, al_dia, errores
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrar":
+        destino = sys.argv[2] if len(sys.argv) > 2 else RUTAS_DIR
+        migradas, al_dia, errores = migrar_directorio(destino)
+        print(f"✅ {migradas} rutas migradas, {al_dia} ya al día, {errores} con errores")
+    else:
+        print("Uso: python esquema_rutas.py migrar [directorio]")
@@ -1,13 +1,35 @@
 """Clase para manejar la geocodificación de direcciones usando Nominatim de OpenStreetMap."""
-import time
-from typing import Optional, Tuple
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable
 from geopy.geocoders import Nominatim
 from geopy.location import Location
+from cache_geocodificacion import CacheGeocodificacion, normalizar_direccion
+from geocodificador_local import CALLEJERO_PATH, GeocodificadorLocal, obtener_geocodificador_local
+from limitador import LimitadorTokens, obtener_limitador
+
+# Límites (sur, norte, oeste, este) de la zona de servicio en Alicante
+LIMITES_ALICANTE: Tuple[float, float, float, float] = (38.22, 38.40, -0.51, -0.43)
+
+# Backend por defecto: "nominatim" o "local" (callejero sin conexión con Nominatim como respaldo)
+BACKEND = os.environ.get("GEOCODIFICADOR_BACKEND", "nominatim")
+CALLEJERO = os.environ.get("GEOCODIFICADOR_CALLEJERO", CALLEJERO_PATH)
+
+# Fallos de Nominatim que se resuelven reintentando más tarde
+ERRORES_TRANSITORIOS = (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited)
+
+# Si es True, los errores transitorios se propagan en lugar de devolver None
+# (los trabajadores de la cola de trabajos lo activan para reintentar el trabajo)
+PROPAGAR_ERRORES_TRANSITORIOS = os.environ.get("GEOCODIFICADOR_PROPAGAR_ERRORES") == "1"
 
 class Geocodificador:
     """Convierte direcciones en coordenadas geográficas (latitud y longitud)."""
 
-    def __init__(self, user_agent: str = "PII_UA", timeout: int = 10) -> None:
+    def __init__(self, user_agent: str = "PII_UA", timeout: int = 10,
+                 cache: Optional[CacheGeocodificacion] = None, usar_cache: bool = True,
+                 limitador: Optional[LimitadorTokens] = None, backend: Optional[str] = None,
+                 respaldo_nominatim: bool = True, propagar_errores: Optional[bool] = None) -> None:
         """
         Inicializa el geocodificador con un user agent y un tiempo de espera.
 
@@ -19,16 +41,55 @@ class Geocodificador:
         timeout : int
             Tiempo máximo de espera en segundos para una petición.
 
+        cache : Optional[CacheGeocodificacion]
+            Caché persistente a usar (por defecto, la compartida en cache/geocodificacion.db).
+
+        usar_cache : bool
+            Si es False, todas las consultas van directamente a Nominatim.
+
+        limitador : Optional[LimitadorTokens]
+            Limitador que regula las peticiones a Nominatim (por defecto, el compartido
+            por todos los hilos y procesos, a una petición por segundo).
+
+        backend : Optional[str]
+            "nominatim" o "local". Si no se indica se usa la variable de entorno
+            GEOCODIFICADOR_BACKEND (por defecto "nominatim").
+
+        respaldo_nominatim : bool
+            Con el backend local, si es True las direcciones que no estén en el
+            callejero se consultan en Nominatim.
+
+        propagar_errores : Optional[bool]
+            Si es True, los errores transitorios de Nominatim (ERRORES_TRANSITORIOS) se
+            lanzan en lugar de devolver None. Por defecto, PROPAGAR_ERRORES_TRANSITORIOS.
+
         Devuelve:
         ---------
         None
         """
         self.geolocator: Nominatim = Nominatim(user_agent=user_agent, timeout=timeout)
+        self.limitador: LimitadorTokens = limitador or obtener_limitador("nominatim")
+        self.respaldo_nominatim = respaldo_nominatim
+        self.propagar_errores = PROPAGAR_ERRORES_TRANSITORIOS if propagar_errores is None else propagar_errores
+        self.local: Optional[GeocodificadorLocal] = None
+        if (backend or BACKEND) == "local":
+            try:
+                self.local = obtener_geocodificador_local(CALLEJERO)
+            except Exception as e:
+                print(f"⚠️ Callejero local no disponible, se usará Nominatim: {e}")
+        self.cache: Optional[CacheGeocodificacion] = None
+        if usar_cache:
+            try:
+                self.cache = cache or CacheGeocodificacion()
+            except Exception as e:
+                print(f"⚠️ Caché de geocodificación no disponible: {e}")
 
     def obtener_coordenadas(self, direccion: str) -> Optional[Tuple[float, float]]:
         """
         Devuelve una tupla (lat, lon) para una dirección dada en Alicante, España.
 
+        - Con el backend local, busca primero en el callejero sin conexión.
+        - Consulta después la caché persistente (incluidas las direcciones no encontradas).
         - Filtra resultados fuera del rango de coordenadas esperadas para Alicante.
         - Devuelve None en caso de error o si la dirección no se encuentra.
 
@@ -42,19 +103,101 @@ class Geocodificador:
         Optional[Tuple[float, float]]
             Tupla con (latitud, longitud) si se encuentra, o None si falla.
         """
+        if self.local:
+            coordenadas = self._buscar_local(direccion)
+            if coordenadas or not self.respaldo_nominatim:
+                return coordenadas
+        if self.cache:
+            encontrada, coordenadas = self.cache.consultar(direccion)
+            if encontrada:
+                return coordenadas
+        return self._geocodificar(direccion)
+
+    def obtener_coordenadas_lote(self, direcciones: List[str],
+                                 max_hilos: int = 4) -> List[Optional[Tuple[float, float]]]:
+        """
+        Geocodifica una lista de direcciones y devuelve los resultados en el mismo orden.
+
+        - Las direcciones equivalentes (misma forma normalizada) se consultan una sola vez.
+        - Los aciertos de la caché se resuelven sin esperar a Nominatim.
+        - El resto se consulta en paralelo, respetando el limitador compartido.
+
+        Parámetros:
+        -----------
+        direcciones : List[str]
+            Direcciones textuales que se desean geocodificar.
+
+        max_hilos : int
+            Número máximo de consultas simultáneas a Nominatim.
+
+        Devuelve:
+        ---------
+        List[Optional[Tuple[float, float]]]
+            Coordenadas (lat, lon) de cada dirección, o None si no se pudo geocodificar.
+        """
+        # Las direcciones sin clave normalizada (solo signos) no se agrupan con otras
+        claves = [normalizar_direccion(d) or d for d in direcciones]
+        resultados: Dict[str, Optional[Tuple[float, float]]] = {}
+        pendientes: Dict[str, str] = {}
+
+        for direccion, clave in zip(direcciones, claves):
+            if clave in resultados or clave in pendientes:
+                continue
+            if self.local:
+                coordenadas = self._buscar_local(direccion)
+                if coordenadas or not self.respaldo_nominatim:
+                    resultados[clave] = coordenadas
+                    continue
+            if self.cache:
+                encontrada, coordenadas = self.cache.consultar(direccion)
+                if encontrada:
+                    resultados[clave] = coordenadas
+                    continue
+            pendientes[clave] = direccion
+
+        if pendientes:
+            with ThreadPoolExecutor(max_workers=min(max_hilos, len(pendientes))) as executor:
+                for clave, coordenadas in zip(pendientes, executor.map(self._geocodificar, pendientes.values())):
+                    resultados[clave] = coordenadas
+
+        return [resultados[clave] for clave in claves]
+
+    def _buscar_local(self, direccion: str) -> Optional[Tuple[float, float]]:
+        """Busca la dirección en el callejero local, descartando puntos fuera de Alicante."""
+        coordenadas = self.local.buscar(direccion)
+        return coordenadas if coordenadas and dentro_de_alicante(coordenadas) else None
+
+    def _geocodificar(self, direccion: str) -> Optional[Tuple[float, float]]:
+        """Consulta Nominatim (sin pasar por la caché) y guarda el resultado en ella."""
         query: str = f"{direccion}, Alicante, Spain"
         try:
+            # Solo las peticiones reales a Nominatim consumen cuota del limitador
+            self.limitador.adquirir()
             ubicacion: Optional[Location] = self.geolocator.geocode(query)
-            time.sleep(1)  # Evita bloqueos por exceso de peticiones
 
+            coordenadas = None
             if ubicacion:
                 lat: float = ubicacion.latitude
                 lon: float = ubicacion.longitude
 
-                if 38.22 <= lat <= 38.40 and -0.51 <= lon <= -0.43:
-                    return (lat, lon)
+                if dentro_de_alicante((lat, lon)):
+                    coordenadas = (lat, lon)
+
+            # Los errores de red no se guardan; las direcciones no encontradas sí
+            if self.cache:
+                self.cache.guardar(direccion, coordenadas)
+            return coordenadas
 
         except Exception as e:
+            if self.propagar_errores and isinstance(e, ERRORES_TRANSITORIOS):
+                raise
             print(f"Error en la geocodificación de '{direccion}': {e}")
 
         return None
+
+
+def dentro_de_alicante(punto: Tuple[float, float]) -> bool:
+    """Indica si unas coordenadas (lat, lon) caen dentro de LIMITES_ALICANTE."""
+    sur, norte, oeste, este = LIMITES_ALICANTE
+    lat, lon = punto
+    return sur <= lat <= norte and oeste <= lon <= este
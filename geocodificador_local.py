@@ -0,0 +1,214 @@
+"""
+Geocodificador sin conexión basado en un callejero local de Alicante.
+
+El callejero es un CSV con las columnas `nombre,lat,lon` (y opcionalmente `tipo`).
+Puede generarse a partir de OpenStreetMap con:
+
+    python geocodificador_local.py construir datos/callejero_alicante.csv
+"""
+import csv
+import os
+import sys
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from cache_geocodificacion import normalizar_direccion
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CALLEJERO_PATH = os.path.join(BASE_DIR, "datos", "callejero_alicante.csv")
+
+# Similitud mínima (coeficiente de Dice sobre trigramas) para aceptar una coincidencia aproximada
+SIMILITUD_MINIMA = 0.6
+
+# Caracteres mínimos de una consulta para buscarla como prefijo ("cal" no identifica ninguna calle)
+LONGITUD_MINIMA_PREFIJO = 8
+
+# Entradas que empiezan por la consulta que se comparan como máximo al buscar por prefijo
+MAXIMO_CANDIDATOS_PREFIJO = 500
+
+
+def trigramas(texto: str) -> Set[str]:
+    """Trigramas de caracteres de un texto normalizado, con relleno en los extremos."""
+    texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class GeocodificadorLocal:
+    """
+    Busca direcciones en un callejero cargado en memoria.
+
+    La búsqueda prueba, por este orden: coincidencia exacta del nombre normalizado,
+    prefijo (por ejemplo "plaza de los luc", con al menos `LONGITUD_MINIMA_PREFIJO`
+    caracteres; de las entradas que empiezan así se elige la más parecida) y similitud
+    de trigramas para tolerar erratas. Si no encuentra nada, repite la búsqueda
+    quitando los números de portal.
+
+    Parameters
+    ----------
+    ruta_csv : str, optional
+        Ruta del CSV del callejero.
+    similitud_minima : float, optional
+        Umbral de similitud para las coincidencias aproximadas.
+    """
+
+    def __init__(self, ruta_csv: str = CALLEJERO_PATH, similitud_minima: float = SIMILITUD_MINIMA) -> None:
+        self.ruta_csv = ruta_csv
+        self.similitud_minima = similitud_minima
+        self.nombres: List[str] = []
+        self.coordenadas: List[Tuple[float, float]] = []
+        self._exactos: Dict[str, int] = {}
+        self._ordenados: List[Tuple[str, int]] = []
+        self._trigramas: Dict[str, List[int]] = defaultdict(list)
+        self._num_trigramas: List[int] = []
+        self._cargar()
+
+    def _cargar(self) -> None:
+        """Lee el CSV y construye los índices exacto, de prefijos y de trigramas."""
+        with open(self.ruta_csv, "r", encoding="utf-8") as f:
+            for fila in csv.DictReader(f):
+                try:
+                    nombre = normalizar_direccion(fila["nombre"])
+                    coordenadas = (float(fila["lat"]), float(fila["lon"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not nombre or nombre in self._exactos:
+                    continue
+                indice = len(self.nombres)
+                self.nombres.append(nombre)
+                self.coordenadas.append(coordenadas)
+                self._exactos[nombre] = indice
+                tris = trigramas(nombre)
+                self._num_trigramas.append(len(tris))
+                for tri in tris:
+                    self._trigramas[tri].append(indice)
+        self._ordenados = sorted((nombre, i) for i, nombre in enumerate(self.nombres))
+
+    def __len__(self) -> int:
+        return len(self.nombres)
+
+    def buscar(self, direccion: str) -> Optional[Tuple[float, float]]:
+        """
+        Devuelve las coordenadas (lat, lon) de la dirección o None si no está en el callejero.
+
+        Parameters
+        ----------
+        direccion : str
+            Dirección textual, en cualquier formato admitido por `normalizar_direccion`.
+
+        Returns
+        -------
+        Optional[Tuple[float, float]]
+        """
+        consulta = normalizar_direccion(direccion)
+        if not consulta:
+            return None
+        indice = self._buscar_normalizada(consulta)
+        if indice is None:
+            sin_numeros = " ".join(p for p in consulta.split() if not p.isdigit() and p != "numero")
+            if sin_numeros and sin_numeros != consulta:
+                indice = self._buscar_normalizada(sin_numeros)
+        return self.coordenadas[indice] if indice is not None else None
+
+    def _buscar_normalizada(self, consulta: str) -> Optional[int]:
+        """Búsqueda exacta, por prefijo y por trigramas de una consulta ya normalizada."""
+        if consulta in self._exactos:
+            return self._exactos[consulta]
+
+        tris = trigramas(consulta)
+        if len(consulta) >= LONGITUD_MINIMA_PREFIJO:
+            candidatos = []
+            posicion = bisect_left(self._ordenados, (consulta, -1))
+            for nombre, indice in self._ordenados[posicion:posicion + MAXIMO_CANDIDATOS_PREFIJO]:
+                if not nombre.startswith(consulta):
+                    break
+                candidatos.append(indice)
+            if candidatos:
+                # La más parecida a la consulta; a igual parecido, la de nombre más corto
+                return max(candidatos, key=lambda i: (self._similitud(tris, i), -len(self.nombres[i])))
+
+        comunes: Dict[int, int] = defaultdict(int)
+        for tri in tris:
+            for indice in self._trigramas.get(tri, ()):
+                comunes[indice] += 1
+        mejor, mejor_similitud = None, self.similitud_minima
+        for indice, n in comunes.items():
+            similitud = 2 * n / (len(tris) + self._num_trigramas[indice])
+            if similitud >= mejor_similitud:
+                mejor, mejor_similitud = indice, similitud
+        return mejor
+
+    def _similitud(self, tris: Set[str], indice: int) -> float:
+        """Coeficiente de Dice entre los trigramas de una consulta y los de una entrada."""
+        return 2 * len(tris & trigramas(self.nombres[indice])) / (len(tris) + self._num_trigramas[indice])
+
+
+_callejeros: Dict[str, GeocodificadorLocal] = {}
+_callejeros_lock = threading.Lock()
+
+
+def obtener_geocodificador_local(ruta_csv: str = CALLEJERO_PATH) -> GeocodificadorLocal:
+    """Devuelve el callejero cargado una sola vez por proceso para ese fichero."""
+    with _callejeros_lock:
+        if ruta_csv not in _callejeros:
+            _callejeros[ruta_csv] = GeocodificadorLocal(ruta_csv)
+        return _callejeros[ruta_csv]
+
+
+def construir_callejero(ruta_csv: str) -> int:
+    """
+    Descarga de OpenStreetMap las calles y lugares con nombre de la zona de servicio
+    y los guarda como callejero CSV.
+
+    Returns
+    -------
+    int
+        Número de entradas escritas.
+    """
+    import osmnx as ox
+    from cache_grafos import METROS_POR_GRADO
+    from geocodificador import LIMITES_ALICANTE
+
+    sur, norte, oeste, este = LIMITES_ALICANTE
+    centro = ((sur + norte) / 2, (oeste + este) / 2)
+    dist = (norte - sur) / 2 * METROS_POR_GRADO
+
+    entradas: Dict[str, Tuple[float, float, str]] = {}
+    grafo = ox.graph_from_point(centro, dist=dist, network_type="all")
+    puntos_calle: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+    for u, v, datos in grafo.edges(data=True):
+        nombres = datos.get("name")
+        for nombre in nombres if isinstance(nombres, list) else [nombres]:
+            if nombre:
+                for nodo in (u, v):
+                    puntos_calle[nombre].append((grafo.nodes[nodo]["y"], grafo.nodes[nodo]["x"]))
+    for nombre, puntos in puntos_calle.items():
+        # Punto real de la calle más cercano a su centroide
+        lat_m = sum(p[0] for p in puntos) / len(puntos)
+        lon_m = sum(p[1] for p in puntos) / len(puntos)
+        lat, lon = min(puntos, key=lambda p: (p[0] - lat_m) ** 2 + (p[1] - lon_m) ** 2)
+        entradas[nombre] = (lat, lon, "calle")
+
+    etiquetas = {"amenity": True, "tourism": True, "shop": True, "leisure": True, "historic": True}
+    lugares = ox.features_from_point(centro, tags=etiquetas, dist=dist)
+    if "name" in lugares.columns:
+        for _, lugar in lugares[lugares["name"].notna()].iterrows():
+            punto = lugar.geometry.representative_point()
+            entradas.setdefault(lugar["name"], (punto.y, punto.x, "lugar"))
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_csv)), exist_ok=True)
+    with open(ruta_csv, "w", encoding="utf-8", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["nombre", "lat", "lon", "tipo"])
+        for nombre, (lat, lon, tipo) in sorted(entradas.items()):
+            escritor.writerow([nombre, f"{lat:.7f}", f"{lon:.7f}", tipo])
+    return len(entradas)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "construir":
+        destino = sys.argv[2] if len(sys.argv) > 2 else CALLEJERO_PATH
+        print(f"✅ Callejero con {construir_callejero(destino)} entradas guardado en {destino}")
+    else:
+        print("Uso: python geocodificador_local.py construir [salida.csv]")
@@ -1,6 +1,89 @@
 import os
-import json
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Tuple
+
+from consulta_rutas import ConsultaRutas
+from esquema_rutas import cargar_ruta
+from tabla_rutas import TablaRutas
+
+class IndiceRutas:
+    """
+    Índice en memoria de las rutas JSON de un directorio que se actualiza de forma incremental.
+
+    En cada acceso se recorre el directorio con `os.scandir` y solo se vuelven a leer los
+    ficheros nuevos o cuyo tamaño o fecha de modificación han cambiado; los ficheros
+    borrados se eliminan del índice. Las rutas se guardan convertidas al esquema actual
+    de `esquema_rutas`.
+
+    Parameters
+    ----------
+    directorio : str
+        Directorio con los archivos JSON de las rutas.
+
+    Attributes
+    ----------
+    directorio : str
+        Directorio indexado.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._entradas: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def refrescar(self) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Sincroniza el índice con el directorio.
+
+        Returns
+        -------
+        Tuple[List[Dict[str, Any]], List[str]]
+            Rutas nuevas o modificadas desde el último refresco y nombres de los
+            archivos eliminados.
+        """
+        cambiadas, vistos = [], set()
+        with self._lock:
+            if os.path.isdir(self.directorio):
+                with os.scandir(self.directorio) as entradas:
+                    for entrada in entradas:
+                        if not entrada.name.endswith(".json") or not entrada.is_file():
+                            continue
+                        vistos.add(entrada.name)
+                        estado = entrada.stat()
+                        firma = (estado.st_mtime_ns, estado.st_size)
+                        anterior = self._entradas.get(entrada.name)
+                        if anterior and anterior[:2] == firma:
+                            continue
+                        try:
+                            ruta = cargar_ruta(entrada.path)
+                        except Exception as e:
+                            print(f"❌ Error al leer {entrada.name}: {e}")
+                            # Se trata como eliminado hasta que se pueda volver a leer
+                            vistos.discard(entrada.name)
+                            continue
+                        self._entradas[entrada.name] = firma + (ruta,)
+                        cambiadas.append(ruta)
+            eliminados = [archivo for archivo in self._entradas if archivo not in vistos]
+            for archivo in eliminados:
+                del self._entradas[archivo]
+        return cambiadas, eliminados
+
+    def rutas(self, refrescar: bool = True) -> List[Dict[str, Any]]:
+        """
+        Devuelve las rutas del directorio, releyendo solo los archivos que han cambiado.
+
+        Los diccionarios se comparten entre llamadas y no deben modificarse.
+
+        Parameters
+        ----------
+        refrescar : bool, optional
+            Si es False, se devuelven las rutas del último refresco sin mirar el directorio.
+        """
+        if refrescar:
+            self.refrescar()
+        with self._lock:
+            return [self._entradas[archivo][2] for archivo in sorted(self._entradas)]
+
 
 class GestorRutas:
     """
@@ -17,39 +100,53 @@ class GestorRutas:
         Ruta del directorio de rutas.
     rutas : List[Dict[str, Any]]
         Lista de rutas cargadas desde archivos JSON.
+    tabla : TablaRutas
+        Las mismas rutas en columnas de NumPy, para filtros y agregados vectorizados.
     """
 
     def __init__(self, directorio: str = "rutas"):
         """Inicializa el gestor de rutas cargando todas las rutas desde el directorio indicado."""
         self.directorio = directorio
+        self.indice = IndiceRutas(directorio)
+        self.tabla = TablaRutas()
         self.rutas = self.cargar_rutas_desde_carpeta()
 
     def cargar_rutas_desde_carpeta(self) -> List[Dict[str, Any]]:
         """
         Carga todas las rutas desde archivos JSON en el directorio indicado.
 
+        Solo se leen los archivos nuevos o modificados desde la última carga, y solo sus
+        filas se actualizan en `tabla`.
+
         Returns
         -------
         List[Dict[str, Any]]
             Lista de rutas representadas como diccionarios.
         """
-        rutas = []
-
         if not os.path.exists(self.directorio):
             print(f"⚠️ La carpeta '{self.directorio}' no existe. Creándola...")
             os.makedirs(self.directorio)
-            return rutas
-
-        archivos = [f for f in os.listdir(self.directorio) if f.endswith(".json")]
-        for archivo in archivos:
-            ruta_path = os.path.join(self.directorio, archivo)
-            try:
-                with open(ruta_path, "r") as f:
-                    ruta = json.load(f)
-                    rutas.append(ruta)
-            except Exception as e:
-                print(f"❌ Error al leer {archivo}: {e}")
-        return rutas
+            return []
+
+        cambiadas, eliminados = self.indice.refrescar()
+        self.tabla.actualizar(cambiadas, [archivo[:-len(".json")] for archivo in eliminados])
+        return self.indice.rutas(refrescar=False)
+
+    def consultar(self, consulta: ConsultaRutas) -> List[Dict[str, Any]]:
+        """
+        Devuelve las rutas que cumplen todos los filtros de la consulta, ordenadas y
+        limitadas, evaluando los filtros como máscaras sobre `tabla`.
+
+        Parameters
+        ----------
+        consulta : ConsultaRutas
+            Filtros, orden y límite.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+        """
+        return self.tabla.filtrar(consulta)
 
     def filtrar_por_dificultad(self, dificultad: str) -> List[Dict[str, Any]]:
         """
@@ -79,15 +176,7 @@ class GestorRutas:
         -------
         List[Dict[str, Any]]
         """
-        filtradas = []
-        for r in self.rutas:
-            try:
-                distancia = float(r["distancia"].replace(",", ".").split()[0])
-                if distancia <= max_km:
-                    filtradas.append(r)
-            except:
-                continue
-        return filtradas
+        return [r for r in self.rutas if r["distancia_km"] <= max_km]
 
     def filtrar_por_duracion(self, max_horas: float) -> List[Dict[str, Any]]:
         """
@@ -102,25 +191,7 @@ class GestorRutas:
         -------
         List[Dict[str, Any]]
         """
-        filtradas = []
-        for r in self.rutas:
-            try:
-                duracion = r["duracion"].lower()
-                h, m = 0, 0
-                if "h" in duracion:
-                    partes = duracion.replace("min", "").replace("h", "").split()
-                    if len(partes) == 2:
-                        h, m = int(partes[0]), int(partes[1])
-                    elif len(partes) == 1:
-                        h = int(partes[0])
-                elif "min" in duracion:
-                    m = int(duracion.replace("min", "").strip())
-                total_h = h + m / 60
-                if total_h <= max_horas:
-                    filtradas.append(r)
-            except:
-                continue
-        return filtradas
+        return [r for r in self.rutas if r["duracion_horas"] <= max_horas]
 
     def filtrar_por_transporte(self, modo_transporte: str) -> List[Dict[str, Any]]:
         """
@@ -137,9 +208,9 @@ class GestorRutas:
             Lista de rutas que coinciden con ese modo de transporte.
         """
         modo_transporte = modo_transporte.lower()
-        modos_disponibles = {ruta.get("modo_transporte", "").lower() for ruta in self.rutas}
+        modos_disponibles = {ruta["modo"] for ruta in self.rutas}
         
         if modo_transporte not in modos_disponibles:
             raise ValueError(f"Modo de transporte '{modo_transporte}' no válido. Modos disponibles: {', '.join(modos_disponibles)}")
         
-        return [ruta for ruta in self.rutas if ruta.get("modo_transporte", "").lower() == modo_transporte]
+        return [ruta for ruta in self.rutas if ruta["modo"] == modo_transporte]
@@ -0,0 +1,91 @@
+"""Índice espacial persistente para ajustar coordenadas al nodo más cercano del grafo."""
+import os
+import pickle
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from cache_grafos import GrafoCompacto
+from motor_rutas import RADIO_TIERRA_M
+
+NOMBRE_FICHERO = "indice_nodos.pkl"
+
+
+class IndiceNodos:
+    """
+    BallTree con métrica haversine sobre las coordenadas de los nodos de un grafo.
+
+    Parameters
+    ----------
+    compacto : GrafoCompacto
+        Grafo cuyos nodos se indexan.
+    arbol : BallTree, optional
+        Árbol ya construido (por ejemplo, cargado de disco). Si no se indica, se construye.
+    """
+
+    def __init__(self, compacto: GrafoCompacto, arbol: Optional[BallTree] = None) -> None:
+        self.nodos = np.asarray(compacto.nodos)
+        self.huella = compacto.huella()
+        if arbol is None:
+            coordenadas = np.radians(np.column_stack([compacto.y, compacto.x]))
+            arbol = BallTree(coordenadas, metric="haversine")
+        self.arbol = arbol
+
+    def nodos_cercanos(self, puntos: Iterable[Tuple[float, float]],
+                       devolver_distancias: bool = False):
+        """
+        Ajusta todos los puntos a su nodo más cercano con una única consulta vectorizada.
+
+        Parameters
+        ----------
+        puntos : Iterable[Tuple[float, float]]
+            Coordenadas (lat, lon) a ajustar.
+        devolver_distancias : bool, optional
+            Si es True, devuelve también la distancia en metros de cada punto a su nodo.
+
+        Returns
+        -------
+        np.ndarray or Tuple[np.ndarray, np.ndarray]
+            Identificadores OSM de los nodos (y distancias si se piden).
+        """
+        coordenadas = np.radians(np.asarray(list(puntos), dtype=np.float64).reshape(-1, 2))
+        if len(coordenadas) == 0:
+            vacio = np.empty(0, dtype=np.int64)
+            return (vacio, np.empty(0)) if devolver_distancias else vacio
+        distancias, indices = self.arbol.query(coordenadas, k=1)
+        nodos = self.nodos[indices[:, 0]]
+        if devolver_distancias:
+            return nodos, distancias[:, 0] * RADIO_TIERRA_M
+        return nodos
+
+    def guardar(self, directorio: str) -> None:
+        """Guarda el árbol y la huella del grafo en `directorio` de forma atómica."""
+        ruta = os.path.join(directorio, NOMBRE_FICHERO)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            pickle.dump({"huella": self.huella, "arbol": self.arbol}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)
+
+    @staticmethod
+    def cargar_o_construir(compacto: GrafoCompacto, directorio: str) -> "IndiceNodos":
+        """
+        Carga el índice guardado junto al grafo o lo construye y lo guarda si no existe
+        o corresponde a otra versión del grafo.
+        """
+        ruta = os.path.join(directorio, NOMBRE_FICHERO)
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, "rb") as f:
+                    datos = pickle.load(f)
+                if datos["huella"] == compacto.huella():
+                    return IndiceNodos(compacto, datos["arbol"])
+            except Exception as e:
+                print(f"⚠️ Error al cargar el índice espacial: {str(e)}")
+
+        indice = IndiceNodos(compacto)
+        try:
+            indice.guardar(directorio)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice espacial: {str(e)}")
+        return indice
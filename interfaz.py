@@ -55,6 +55,9 @@ class Interfaz:
         self.usuario = None
         self.datos_usuario = None
 
+        # Respuestas GET con ETag: (url, parámetros) -> (etag, respuesta JSON)
+        self.cache_peticiones = {}
+
         self.pantalla_login()
     
     def configurar_estilos(self):
@@ -141,6 +144,9 @@ class Interfaz:
     def hacer_peticion(self, endpoint, metodo="GET", datos=None, params=None):
         """
         Realiza una petición a la API.
+
+        Las respuestas GET que traen ETag se guardan y la siguiente petición igual se hace
+        condicional (If-None-Match); si el servidor responde 304, se reutiliza la guardada.
         
         Parameters
         ----------
@@ -163,7 +169,13 @@ class Interfaz:
         
         try:
             if metodo == "GET":
+                clave = (url, tuple(sorted((params or {}).items())))
+                guardada = self.cache_peticiones.get(clave)
+                if guardada:
+                    headers['If-None-Match'] = guardada[0]
                 respuesta = requests.get(url, params=params, headers=headers, timeout=10)
+                if respuesta.status_code == 304 and guardada:
+                    return guardada[1]
             elif metodo == "POST":
                 respuesta = requests.post(url, json=datos, headers=headers, timeout=10)
             else:
@@ -173,7 +185,10 @@ class Interfaz:
                 error_msg = respuesta.json().get("message", "Error desconocido")
                 raise Exception(f"Error en la API (código {respuesta.status_code}): {error_msg}")
                 
-            return respuesta.json()
+            resultado = respuesta.json()
+            if metodo == "GET" and respuesta.headers.get('ETag'):
+                self.cache_peticiones[clave] = (respuesta.headers['ETag'], resultado)
+            return resultado
         except requests.RequestException as e:
             raise Exception(f"Error de conexión: {str(e)}")
         except json.JSONDecodeError:
@@ -786,7 +801,15 @@ class Interfaz:
             frame = self.crear_frame_con_borde(self.scroll_frame, padding=10)
             frame.pack(padx=10, pady=5, fill="x")
 
-            texto = f"📍 {r.get('nombre', 'Sin nombre')} | {r.get('distancia', 'N/A')} | {r.get('duracion', 'N/A')} | Dificultad: {r.get('dificultad', 'N/A')}\n{r.get('origen', 'N/A')} → {r.get('destino', 'N/A')} ({r.get('modo_transporte', 'N/A')})"
+            # Origen y destino son diccionarios en el esquema v2
+            origen = r.get('origen', 'N/A')
+            if isinstance(origen, dict):
+                origen = origen.get('direccion', 'N/A')
+            destino = r.get('destino', 'N/A')
+            if isinstance(destino, dict):
+                destino = destino.get('direccion', 'N/A')
+
+            texto = f"📍 {r.get('nombre', 'Sin nombre')} | {r.get('distancia', 'N/A')} | {r.get('duracion', 'N/A')} | Dificultad: {r.get('dificultad', 'N/A')}\n{origen} → {destino} ({r.get('modo_transporte', 'N/A')})"
             self.crear_etiqueta_estilizada(frame, texto, "pequeña").pack(anchor="w")
 
             # Botones de exportación
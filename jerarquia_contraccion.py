@@ -0,0 +1,308 @@
+"""
+Jerarquías de contracción (Contraction Hierarchies) para consultas punto a punto.
+
+El preprocesado es opcional y se ejecuta aparte:
+
+    python jerarquia_contraccion.py walk bike drive
+
+La jerarquía se guarda junto al grafo en la caché en disco y se descarta (se usa
+el motor CSR normal) si el grafo ha cambiado desde que se construyó.
+"""
+import math
+import os
+import sys
+from heapq import heapify, heappop, heappush
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from motor_rutas import MotorRutas
+
+NOMBRE_FICHERO = "jerarquia.npz"
+
+# Nodos que puede asentar cada búsqueda de caminos testigo durante la contracción
+LIMITE_TESTIGOS = 60
+
+
+class JerarquiaContraccion:
+    """
+    Grafo aumentado con atajos y orden de contracción de los nodos.
+
+    Las aristas se guardan en dos estructuras CSR: `subida` contiene las aristas u->w
+    con rango[w] > rango[u] (búsqueda hacia delante desde el origen) y `bajada`, para
+    cada w, los nodos u con arista u->w y rango[u] > rango[w] (búsqueda hacia atrás
+    desde el destino). `medios` indica el nodo contraído que sustituye cada atajo
+    (-1 si la arista es original).
+
+    Parameters
+    ----------
+    rango : np.ndarray
+        Posición de cada nodo en el orden de contracción.
+    huella : str
+        Huella del grafo a partir del que se construyó (ver GrafoCompacto.huella).
+    subida, bajada : tuple
+        (offsets, destinos, pesos, medios) de cada estructura CSR.
+    """
+
+    def __init__(self, rango: np.ndarray, huella: str, subida: tuple, bajada: tuple) -> None:
+        self.rango = rango
+        self.huella = huella
+        self.subida = subida
+        self.bajada = bajada
+        self._subida = tuple(a.tolist() for a in subida[:3])
+        self._bajada = tuple(a.tolist() for a in bajada[:3])
+        self._medios: Optional[Dict[Tuple[int, int], int]] = None
+
+    def vigente(self, huella: str) -> bool:
+        """Indica si la jerarquía corresponde al grafo con la huella dada."""
+        return self.huella == huella
+
+    @staticmethod
+    def construir(motor: MotorRutas, huella: str, limite_testigos: int = LIMITE_TESTIGOS) -> "JerarquiaContraccion":
+        """
+        Contrae todos los nodos del grafo del motor, ordenados por diferencia de aristas.
+
+        Parameters
+        ----------
+        motor : MotorRutas
+            Motor con el grafo en formato CSR (se usa la longitud como peso).
+        huella : str
+            Huella del grafo, que se guarda para detectar jerarquías obsoletas.
+        limite_testigos : int, optional
+            Máximo de nodos asentados por cada búsqueda de caminos testigo.
+
+        Returns
+        -------
+        JerarquiaContraccion
+        """
+        n = len(motor.nodos)
+        offsets, destinos, longitudes = motor.offsets.tolist(), motor.destinos.tolist(), motor.longitudes.tolist()
+        salientes: List[Dict[int, float]] = [{} for _ in range(n)]
+        entrantes: List[Dict[int, float]] = [{} for _ in range(n)]
+        for u in range(n):
+            for k in range(offsets[u], offsets[u + 1]):
+                v, peso = destinos[k], longitudes[k]
+                if u != v and peso < salientes[u].get(v, math.inf):
+                    salientes[u][v] = peso
+                    entrantes[v][u] = peso
+        aristas = {(u, v): (peso, -1) for u in range(n) for v, peso in salientes[u].items()}
+
+        def atajos_necesarios(v: int) -> List[Tuple[int, int, float]]:
+            atajos = []
+            if not salientes[v]:
+                return atajos
+            max_salida = max(salientes[v].values())
+            for u, peso_u in entrantes[v].items():
+                limite = peso_u + max_salida
+                testigos = _busqueda_testigos(salientes, u, v, limite, limite_testigos)
+                for w, peso_w in salientes[v].items():
+                    if w != u and testigos.get(w, math.inf) > peso_u + peso_w:
+                        atajos.append((u, w, peso_u + peso_w))
+            return atajos
+
+        vecinos_contraidos = [0] * n
+
+        def prioridad(v: int) -> int:
+            return len(atajos_necesarios(v)) - len(entrantes[v]) - len(salientes[v]) + vecinos_contraidos[v]
+
+        cola = [(prioridad(v), v) for v in range(n)]
+        heapify(cola)
+        rango = np.zeros(n, dtype=np.int32)
+        siguiente = 0
+        while cola:
+            _, v = heappop(cola)
+            # Actualización perezosa: si la prioridad ha empeorado, se vuelve a encolar
+            actual = prioridad(v)
+            if cola and actual > cola[0][0]:
+                heappush(cola, (actual, v))
+                continue
+
+            for u, w, peso in atajos_necesarios(v):
+                if peso < salientes[u].get(w, math.inf):
+                    salientes[u][w] = peso
+                    entrantes[w][u] = peso
+                    aristas[(u, w)] = (peso, v)
+            for u in entrantes[v]:
+                del salientes[u][v]
+                vecinos_contraidos[u] += 1
+            for w in salientes[v]:
+                del entrantes[w][v]
+                vecinos_contraidos[w] += 1
+            entrantes[v], salientes[v] = {}, {}
+            rango[v] = siguiente
+            siguiente += 1
+
+        subida = [(u, w, p, m) for (u, w), (p, m) in aristas.items() if rango[w] > rango[u]]
+        bajada = [(w, u, p, m) for (u, w), (p, m) in aristas.items() if rango[u] > rango[w]]
+        return JerarquiaContraccion(rango, huella, _a_csr(subida, n), _a_csr(bajada, n))
+
+    def guardar(self, directorio: str) -> None:
+        """Guarda la jerarquía en `directorio` de forma atómica."""
+        ruta = os.path.join(directorio, NOMBRE_FICHERO)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez(f, rango=self.rango, huella=np.array(self.huella),
+                     subida_offsets=self.subida[0], subida_destinos=self.subida[1],
+                     subida_pesos=self.subida[2], subida_medios=self.subida[3],
+                     bajada_offsets=self.bajada[0], bajada_destinos=self.bajada[1],
+                     bajada_pesos=self.bajada[2], bajada_medios=self.bajada[3])
+        os.replace(temporal, ruta)
+
+    @staticmethod
+    def cargar(directorio: str) -> Optional["JerarquiaContraccion"]:
+        """Carga la jerarquía guardada en `directorio`, o None si no existe."""
+        ruta = os.path.join(directorio, NOMBRE_FICHERO)
+        if not os.path.exists(ruta):
+            return None
+        with np.load(ruta) as datos:
+            partes = ("offsets", "destinos", "pesos", "medios")
+            return JerarquiaContraccion(
+                datos["rango"], str(datos["huella"]),
+                tuple(datos[f"subida_{p}"] for p in partes),
+                tuple(datos[f"bajada_{p}"] for p in partes),
+            )
+
+    def ruta_mas_corta(self, s: int, t: int) -> Tuple[List[int], float]:
+        """
+        Búsqueda bidireccional sobre la jerarquía entre dos índices de nodo.
+
+        Parameters
+        ----------
+        s, t : int
+            Índices internos (posición en el motor) de origen y destino.
+
+        Returns
+        -------
+        Tuple[List[int], float]
+            Índices de los nodos del camino ya desempaquetado y longitud en metros.
+
+        Raises
+        ------
+        ValueError
+            Si no existe camino entre los nodos.
+        """
+        if s == t:
+            return [s], 0.0
+        distancias = ({s: 0.0}, {t: 0.0})
+        previos = ({s: -1}, {t: -1})
+        colas = ([(0.0, s)], [(0.0, t)])
+        estructuras = (self._subida, self._bajada)
+        mejor, encuentro = math.inf, -1
+
+        while any(cola and cola[0][0] < mejor for cola in colas):
+            for lado in (0, 1):
+                cola = colas[lado]
+                if not cola or cola[0][0] >= mejor:
+                    continue
+                d, u = heappop(cola)
+                dist, otra = distancias[lado], distancias[1 - lado]
+                if d > dist[u]:
+                    continue
+                if u in otra and d + otra[u] < mejor:
+                    mejor, encuentro = d + otra[u], u
+                offsets, destinos, pesos = estructuras[lado]
+                for k in range(offsets[u], offsets[u + 1]):
+                    v = destinos[k]
+                    nd = d + pesos[k]
+                    if nd < dist.get(v, math.inf):
+                        dist[v] = nd
+                        previos[lado][v] = u
+                        heappush(cola, (nd, v))
+
+        if encuentro == -1:
+            raise ValueError(f"No hay camino entre los nodos {s} y {t}")
+
+        ida = []
+        u = encuentro
+        while u != -1:
+            ida.append(u)
+            u = previos[0][u]
+        ida.reverse()
+        u = previos[1][encuentro]
+        while u != -1:
+            ida.append(u)
+            u = previos[1][u]
+
+        camino = [ida[0]]
+        for u, w in zip(ida, ida[1:]):
+            camino.extend(self._desempaquetar(u, w)[1:])
+        return camino, mejor
+
+    def _desempaquetar(self, u: int, w: int) -> List[int]:
+        """Sustituye recursivamente el atajo u->w por los nodos originales que representa."""
+        if self._medios is None:
+            medios = {}
+            for (offsets, destinos, _, medios_csr), hacia_delante in ((self.subida, True), (self.bajada, False)):
+                offsets, destinos, medios_csr = offsets.tolist(), destinos.tolist(), medios_csr.tolist()
+                for a in range(len(offsets) - 1):
+                    for k in range(offsets[a], offsets[a + 1]):
+                        clave = (a, destinos[k]) if hacia_delante else (destinos[k], a)
+                        medios[clave] = medios_csr[k]
+            self._medios = medios
+
+        camino = [u]
+        pila = [(u, w)]
+        while pila:
+            a, b = pila.pop()
+            medio = self._medios[(a, b)]
+            if medio == -1:
+                camino.append(b)
+            else:
+                pila.append((medio, b))
+                pila.append((a, medio))
+        return camino
+
+
+def _busqueda_testigos(salientes: List[Dict[int, float]], origen: int, excluido: int,
+                       limite: float, max_asentados: int) -> Dict[int, float]:
+    """Dijkstra acotado desde `origen` que ignora el nodo `excluido`."""
+    distancias = {origen: 0.0}
+    cola = [(0.0, origen)]
+    asentados = 0
+    while cola and asentados < max_asentados:
+        d, u = heappop(cola)
+        if d > distancias[u]:
+            continue
+        if d > limite:
+            break
+        asentados += 1
+        for v, peso in salientes[u].items():
+            if v == excluido:
+                continue
+            nd = d + peso
+            if nd < distancias.get(v, math.inf):
+                distancias[v] = nd
+                heappush(cola, (nd, v))
+    return distancias
+
+
+def _a_csr(aristas: List[Tuple[int, int, float, int]], n: int) -> tuple:
+    """Convierte una lista de (desde, hasta, peso, medio) en arrays CSR ordenados por `desde`."""
+    aristas.sort(key=lambda a: a[0])
+    desde = np.array([a[0] for a in aristas], dtype=np.int64)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(desde, minlength=n), out=offsets[1:])
+    return (
+        offsets,
+        np.array([a[1] for a in aristas], dtype=np.int32),
+        np.array([a[2] for a in aristas], dtype=np.float64),
+        np.array([a[3] for a in aristas], dtype=np.int32),
+    )
+
+
+def preprocesar(tipos: List[str]) -> None:
+    """Construye y guarda la jerarquía de cada tipo de red del registro compartido."""
+    from registro_grafos import obtener_registro
+
+    registro = obtener_registro()
+    for network_type in tipos:
+        entrada = registro.entrada(network_type)
+        print(f"⏳ Construyendo jerarquía de contracción para '{network_type}'...")
+        jerarquia = JerarquiaContraccion.construir(entrada.motor, entrada.compacto.huella())
+        jerarquia.guardar(entrada.directorio)
+        entrada.jerarquia = jerarquia
+        print(f"✅ Jerarquía de '{network_type}' guardada en {entrada.directorio}")
+
+
+if __name__ == "__main__":
+    preprocesar(sys.argv[1:] or ["walk", "bike", "drive"])
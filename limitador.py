@@ -0,0 +1,131 @@
+"""Limitador de peticiones por cubeta de fichas (token bucket) compartido entre procesos."""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LIMITADOR_DB_PATH = os.path.join(BASE_DIR, "cache", "limitador.db")
+
+# Política de uso de Nominatim: como máximo una petición por segundo
+TASA_NOMINATIM = 1.0
+RAFAGA_NOMINATIM = 1
+
+
+class LimitadorTokens:
+    """
+    Cubeta de fichas cuyo estado se guarda en SQLite para compartir la cuota entre
+    hilos y procesos (por ejemplo, varios workers de la aplicación web).
+
+    Cada petición consume una ficha; las fichas se reponen a razón de `tasa` por
+    segundo hasta un máximo de `rafaga`.
+
+    Parameters
+    ----------
+    nombre : str
+        Identificador de la cuota (permite varios limitadores en la misma base de datos).
+    tasa : float, optional
+        Fichas repuestas por segundo.
+    rafaga : int, optional
+        Capacidad máxima de la cubeta.
+    ruta_db : str, optional
+        Fichero SQLite donde se guarda el estado.
+    """
+
+    def __init__(self, nombre: str, tasa: float = TASA_NOMINATIM, rafaga: int = RAFAGA_NOMINATIM,
+                 ruta_db: str = LIMITADOR_DB_PATH) -> None:
+        if tasa <= 0 or rafaga < 1:
+            raise ValueError("La tasa debe ser positiva y la ráfaga al menos 1")
+        self.nombre = nombre
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.ruta_db = ruta_db
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.ruta_db), exist_ok=True)
+        conn = self._conectar()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cubetas (
+                nombre TEXT PRIMARY KEY,
+                fichas REAL NOT NULL,
+                actualizado REAL NOT NULL
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO cubetas (nombre, fichas, actualizado) VALUES (?, ?, ?)',
+                     (self.nombre, float(self.rafaga), time.time()))
+        conn.commit()
+        conn.close()
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre una conexión en modo autocommit para controlar las transacciones a mano."""
+        return sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+
+    def _intentar(self) -> float:
+        """
+        Intenta consumir una ficha.
+
+        Returns
+        -------
+        float
+            0 si se ha consumido la ficha; si no, segundos que faltan para la siguiente.
+        """
+        conn = self._conectar()
+        try:
+            # BEGIN IMMEDIATE bloquea la escritura para que otros procesos esperen su turno
+            conn.execute('BEGIN IMMEDIATE')
+            fichas, actualizado = conn.execute(
+                'SELECT fichas, actualizado FROM cubetas WHERE nombre = ?', (self.nombre,)
+            ).fetchone()
+            ahora = time.time()
+            fichas = min(float(self.rafaga), fichas + max(0.0, ahora - actualizado) * self.tasa)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / self.tasa
+            conn.execute('UPDATE cubetas SET fichas = ?, actualizado = ? WHERE nombre = ?',
+                         (fichas, ahora, self.nombre))
+            conn.execute('COMMIT')
+            return espera
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def adquirir(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera hasta obtener una ficha.
+
+        Parameters
+        ----------
+        timeout : Optional[float]
+            Segundos máximos de espera; None para esperar indefinidamente.
+
+        Returns
+        -------
+        bool
+            True si se obtuvo la ficha, False si se agotó el tiempo de espera.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                espera = self._intentar()
+            if espera == 0:
+                return True
+            if limite is not None and time.monotonic() + espera > limite:
+                return False
+            time.sleep(espera)
+
+
+_limitadores = {}
+_limitadores_lock = threading.Lock()
+
+
+def obtener_limitador(nombre: str = "nominatim", tasa: float = TASA_NOMINATIM,
+                      rafaga: int = RAFAGA_NOMINATIM) -> LimitadorTokens:
+    """Devuelve el limitador compartido con ese nombre, creándolo si no existe."""
+    with _limitadores_lock:
+        if nombre not in _limitadores:
+            _limitadores[nombre] = LimitadorTokens(nombre, tasa, rafaga)
+        return _limitadores[nombre]
@@ -0,0 +1,126 @@
+"""Matrices de distancias y tiempos entre todos los pares de un conjunto de puntos."""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from motor_rutas import VELOCIDADES_KMH
+from registro_grafos import EntradaRegistro, entrada_para_puntos
+
+# Número máximo de matrices guardadas en memoria
+TAMANO_CACHE = 128
+
+
+@dataclass
+class MatrizDistancias:
+    """
+    Distancias y tiempos entre todos los pares de puntos de una lista.
+
+    Attributes
+    ----------
+    nodos : List[int]
+        Nodo OSM al que se ajustó cada punto.
+    km : np.ndarray
+        Matriz n x n de distancias en km; `inf` si no hay camino.
+    horas : np.ndarray
+        Matriz n x n de duraciones en horas; `inf` si no hay camino.
+    caminos : Dict[Tuple[int, int], List[int]]
+        Nodos del camino de cada par (i, j) alcanzable.
+    """
+    nodos: List[int]
+    km: np.ndarray
+    horas: np.ndarray
+    caminos: Dict[Tuple[int, int], List[int]]
+
+    def __len__(self) -> int:
+        return len(self.nodos)
+
+    def alcanzable(self, i: int, j: int) -> bool:
+        """Indica si existe camino del punto `i` al punto `j`."""
+        return bool(np.isfinite(self.km[i, j]))
+
+    def camino(self, i: int, j: int) -> List[int]:
+        """Nodos del camino del punto `i` al punto `j`."""
+        if i == j:
+            return [self.nodos[i]]
+        return self.caminos[(i, j)]
+
+
+def calcular_matriz(entrada: EntradaRegistro, nodos: List[int], modo: str) -> MatrizDistancias:
+    """
+    Calcula la matriz lanzando un Dijkstra por nodo de salida que termina en cuanto
+    alcanza todos los demás, en lugar de una búsqueda por cada par.
+
+    Parameters
+    ----------
+    entrada : EntradaRegistro
+        Grafo que cubre todos los nodos.
+    nodos : List[int]
+        Nodos OSM de los puntos.
+    modo : str
+        "walk", "bike" o "drive".
+
+    Returns
+    -------
+    MatrizDistancias
+    """
+    n = len(nodos)
+    metros = np.full((n, n), np.inf)
+    np.fill_diagonal(metros, 0.0)
+    caminos = {}
+    destinos = set(nodos)
+    for i, origen in enumerate(nodos):
+        alcanzados = entrada.caminos_desde(origen, destinos)
+        for j, destino in enumerate(nodos):
+            if i != j and destino in alcanzados:
+                caminos[(i, j)], metros[i, j] = alcanzados[destino]
+    km = metros / 1000
+    return MatrizDistancias(list(nodos), km, km / VELOCIDADES_KMH[modo], caminos)
+
+
+_cache: "OrderedDict[tuple, MatrizDistancias]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def matriz_distancias(puntos: Iterable[Tuple[float, float]], modo: str = "walk",
+                      entrada: Optional[EntradaRegistro] = None) -> MatrizDistancias:
+    """
+    Devuelve la matriz de distancias (km) y tiempos (horas) entre todos los puntos.
+
+    El resultado se guarda en una caché LRU en memoria cuya clave es el grafo usado y
+    la tupla de nodos ajustados, de modo que dos listas de direcciones que caen en los
+    mismos nodos comparten matriz.
+
+    Parameters
+    ----------
+    puntos : Iterable[Tuple[float, float]]
+        Coordenadas (lat, lon) de los puntos.
+    modo : str, optional
+        "walk", "bike" o "drive".
+    entrada : EntradaRegistro, optional
+        Grafo a usar; por defecto el que devuelve `entrada_para_puntos`.
+
+    Returns
+    -------
+    MatrizDistancias
+    """
+    puntos = list(puntos)
+    if entrada is None:
+        entrada = entrada_para_puntos(modo, puntos, dist=5000)
+    nodos = entrada.nodos_cercanos(puntos)
+    clave = (entrada.directorio, modo, tuple(nodos))
+
+    with _cache_lock:
+        matriz = _cache.get(clave)
+        if matriz is not None:
+            _cache.move_to_end(clave)
+            return matriz
+
+    matriz = calcular_matriz(entrada, nodos, modo)
+    with _cache_lock:
+        _cache[clave] = matriz
+        while len(_cache) > TAMANO_CACHE:
+            _cache.popitem(last=False)
+    return matriz
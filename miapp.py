@@ -5,22 +5,47 @@ Este módulo implementa una API RESTful para gestionar rutas geográficas,
 usuarios y servicios relacionados como el clima. Adaptado para despliegue en PythonAnywhere.
 """
 
-from flask import Flask, jsonify, request, send_from_directory, render_template
+from flask import Flask, Response, g, has_request_context, jsonify, request, send_from_directory, render_template
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import aliased
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
+import sys
+import threading
+import time
 import json
+import dataclasses
+import zlib
+from functools import wraps
 from datetime import datetime
 import sqlite3
 import requests
 from flask_cors import CORS
+from catalogo_rutas import obtener_catalogo
+from cola_trabajos import ColaTrabajos, GrupoTrabajadores, registrar_manejador
+from gestor_rutas import IndiceRutas
+from esquema_rutas import cargar_ruta, crear_ruta as crear_datos_ruta
+from consulta_rutas import ConsultaRutas
+from rejilla_rutas import RejillaRutas
+from tabla_rutas import TablaRutas
 
 # Configuración de rutas 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'usuarios.db')
+DB_PATH = os.environ.get('USUARIOS_DB_PATH', os.path.join(BASE_DIR, 'usuarios.db'))
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 RUTAS_DIR = os.path.join(BASE_DIR, 'rutas')
 
+# Cargar los grafos de calles al arrancar (requiere osmnx en el servidor)
+PRECARGAR_GRAFOS = os.environ.get('PRECARGAR_GRAFOS') == '1'
+
+# Crear las rutas en segundo plano (las peticiones pueden pedirlo con "asincrono").
+# Los trabajadores se arrancan aparte con `python miapp.py trabajadores`.
+TRABAJOS_ASINCRONOS = os.environ.get('TRABAJOS_ASINCRONOS') == '1'
+TRABAJADORES_COLA = int(os.environ.get('TRABAJADORES_COLA', '2'))
+
+# Máximo de rutas por página en los listados paginados
+LIMITE_MAXIMO_RUTAS = 1000
+
 # Crear directorios necesarios si no existen
 for directory in [STATIC_DIR, RUTAS_DIR]:
     if not os.path.exists(directory):
@@ -102,18 +127,7 @@ class Usuario(db.Model):
             ruta_path = os.path.join(RUTAS_DIR, f"{nombre_ruta}.json")
             if os.path.exists(ruta_path):
                 try:
-                    with open(ruta_path, 'r', encoding='utf-8') as f:
-                        datos_ruta = json.load(f)
-                        # Adaptar origen y destino si son string
-                        if isinstance(datos_ruta.get('origen'), str):
-                            datos_ruta['origen'] = {"direccion": datos_ruta['origen']}
-                        if isinstance(datos_ruta.get('destino'), str):
-                            datos_ruta['destino'] = {"direccion": datos_ruta['destino']}
-                        # Adaptar puntos_intermedios si es lista de strings
-                        if 'puntos_intermedios' in datos_ruta and isinstance(datos_ruta['puntos_intermedios'], list):
-                            if datos_ruta['puntos_intermedios'] and isinstance(datos_ruta['puntos_intermedios'][0], str):
-                                datos_ruta['puntos_intermedios'] = [{"direccion": p} for p in datos_ruta['puntos_intermedios']]
-                        resultado.append(datos_ruta)
+                    resultado.append(cargar_ruta(ruta_path))
                 except Exception as e:
                     print(f"Error al cargar la ruta {nombre_ruta}: {str(e)}")
 
@@ -145,29 +159,27 @@ class Usuario(db.Model):
 
     @staticmethod
     def obtener_amigos(username):
-        usuario = Usuario.query.filter_by(username=username).first()
-        if not usuario:
-            return {}
-
-        rutas_usuario = UsuarioRuta.query.filter_by(usuario_id=usuario.id).all()
-        nombres_rutas = [ur.nombre_ruta for ur in rutas_usuario]
-
-        amigos = {}
-        for nombre_ruta in nombres_rutas:
-            relaciones = UsuarioRuta.query.filter_by(nombre_ruta=nombre_ruta).all()
-            for rel in relaciones:
-                if rel.usuario_id != usuario.id:
-                    amigo = Usuario.query.get(rel.usuario_id)
-                    if amigo:
-                        if amigo.username not in amigos:
-                            amigos[amigo.username] = {
-                                "nombre": amigo.nombre,
-                                "apellido": amigo.apellido,
-                                "rutas_comunes": []
-                            }
-                        amigos[amigo.username]["rutas_comunes"].append(nombre_ruta)
-
-        return amigos
+        """
+        Usuarios que comparten alguna ruta con el indicado y las rutas que comparten, leídos
+        de la tabla materializada amistades (una sola lectura por su clave primaria).
+        """
+        yo, amigo = aliased(Usuario), aliased(Usuario)
+        filas = (db.session.query(amigo.username, amigo.nombre, amigo.apellido, Amistad.rutas_comunes)
+                 .select_from(yo)
+                 .join(Amistad, Amistad.user_a == yo.id)
+                 .join(amigo, amigo.id == Amistad.user_b)
+                 .filter(yo.username == username)
+                 .order_by(Amistad.user_b)
+                 .all())
+
+        return {
+            username_amigo: {
+                "nombre": nombre,
+                "apellido": apellido,
+                "rutas_comunes": json.loads(rutas_comunes)
+            }
+            for username_amigo, nombre, apellido, rutas_comunes in filas
+        }
 
 class UsuarioRuta(db.Model):
     __tablename__ = 'usuario_rutas'
@@ -177,41 +189,197 @@ class UsuarioRuta(db.Model):
     nombre_ruta = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.String(20), nullable=False)
 
+    __table_args__ = (
+        db.Index('idx_usuario_rutas_nombre_ruta', 'nombre_ruta'),
+        db.Index('idx_usuario_rutas_usuario_id', 'usuario_id'),
+    )
+
     def __repr__(self):
         return f'<UsuarioRuta {self.usuario_id}:{self.nombre_ruta}>'
 
+class Amistad(db.Model):
+    """
+    Pares de usuarios que comparten rutas, en los dos sentidos (user_a, user_b) y
+    (user_b, user_a), con la lista JSON de las rutas comunes.
+
+    La mantienen los triggers de TRIGGERS_AMISTADES con cada alta o baja en usuario_rutas,
+    también cuando la hacen otros módulos directamente con sqlite3.
+    """
+    __tablename__ = 'amistades'
+
+    user_a = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    user_b = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    rutas_comunes = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_amistades_user_b', 'user_b'),
+    )
+
+    def __repr__(self):
+        return f'<Amistad {self.user_a}:{self.user_b}>'
+
+# Al vincular un usuario a una ruta, la ruta pasa a ser común con cada otro usuario que ya
+# la tenía; al desvincularlo (si no le queda otro vínculo igual), se quita de sus pares y
+# se borran los pares que se quedan sin rutas.
+TRIGGERS_AMISTADES = [
+    """
+    CREATE TRIGGER IF NOT EXISTS amistades_al_vincular AFTER INSERT ON usuario_rutas
+    BEGIN
+        INSERT INTO amistades (user_a, user_b, rutas_comunes)
+            SELECT NEW.usuario_id, otra.usuario_id, json_array(NEW.nombre_ruta)
+            FROM usuario_rutas AS otra
+            WHERE otra.nombre_ruta = NEW.nombre_ruta AND otra.usuario_id != NEW.usuario_id
+        ON CONFLICT (user_a, user_b) DO UPDATE
+            SET rutas_comunes = json_insert(rutas_comunes, '$[#]', NEW.nombre_ruta)
+            WHERE NOT EXISTS (SELECT 1 FROM json_each(amistades.rutas_comunes) WHERE value = NEW.nombre_ruta);
+        INSERT INTO amistades (user_a, user_b, rutas_comunes)
+            SELECT otra.usuario_id, NEW.usuario_id, json_array(NEW.nombre_ruta)
+            FROM usuario_rutas AS otra
+            WHERE otra.nombre_ruta = NEW.nombre_ruta AND otra.usuario_id != NEW.usuario_id
+        ON CONFLICT (user_a, user_b) DO UPDATE
+            SET rutas_comunes = json_insert(rutas_comunes, '$[#]', NEW.nombre_ruta)
+            WHERE NOT EXISTS (SELECT 1 FROM json_each(amistades.rutas_comunes) WHERE value = NEW.nombre_ruta);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS amistades_al_desvincular AFTER DELETE ON usuario_rutas
+    WHEN NOT EXISTS (SELECT 1 FROM usuario_rutas
+                     WHERE usuario_id = OLD.usuario_id AND nombre_ruta = OLD.nombre_ruta)
+    BEGIN
+        UPDATE amistades
+            SET rutas_comunes = (SELECT json_group_array(value) FROM json_each(amistades.rutas_comunes)
+                                 WHERE value != OLD.nombre_ruta)
+            WHERE (user_a = OLD.usuario_id OR user_b = OLD.usuario_id)
+              AND EXISTS (SELECT 1 FROM json_each(amistades.rutas_comunes) WHERE value = OLD.nombre_ruta);
+        DELETE FROM amistades
+            WHERE (user_a = OLD.usuario_id OR user_b = OLD.usuario_id) AND rutas_comunes = '[]';
+    END
+    """
+]
+
+class MetaUsuarios(db.Model):
+    """Contadores de la base de datos de usuarios (p. ej. 'version_rutas', que mantienen los triggers)."""
+    __tablename__ = 'usuarios_meta'
+
+    clave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False)
+
+# Cualquier cambio en usuario_rutas, también los hechos con sqlite3 desde ruta_auto o
+# ruta_manual, incrementa 'version_rutas', que forma parte de los ETag de los listados
+TRIGGERS_VERSION_RUTAS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS version_rutas_al_{nombre} AFTER {evento} ON usuario_rutas
+    BEGIN
+        INSERT INTO usuarios_meta (clave, valor) VALUES ('version_rutas', 1)
+        ON CONFLICT (clave) DO UPDATE SET valor = valor + 1;
+    END
+    """
+    for nombre, evento in (('vincular', 'INSERT'), ('desvincular', 'DELETE'), ('modificar', 'UPDATE'))
+]
+
+def version_rutas_usuarios():
+    """Contador que aumenta con cada alta, baja o cambio en usuario_rutas."""
+    with db.engine.connect() as conexion:
+        valor = conexion.exec_driver_sql(
+            "SELECT valor FROM usuarios_meta WHERE clave = 'version_rutas'").scalar()
+    return valor or 0
+
+def reconstruir_amistades(conexion):
+    """Recalcula la tabla amistades desde cero a partir de usuario_rutas."""
+    conexion.exec_driver_sql("DELETE FROM amistades")
+    conexion.exec_driver_sql("""
+        INSERT INTO amistades (user_a, user_b, rutas_comunes)
+        SELECT user_a, user_b, json_group_array(nombre_ruta) FROM (
+            SELECT mia.usuario_id AS user_a, otra.usuario_id AS user_b, mia.nombre_ruta AS nombre_ruta
+            FROM usuario_rutas AS mia
+            JOIN usuario_rutas AS otra
+              ON otra.nombre_ruta = mia.nombre_ruta AND otra.usuario_id != mia.usuario_id
+            GROUP BY mia.usuario_id, otra.usuario_id, mia.nombre_ruta
+            ORDER BY MIN(mia.id)
+        )
+        GROUP BY user_a, user_b
+    """)
+
 class GestorRutas:
     def __init__(self):
         self.rutas = []
         self.rutas_dir = RUTAS_DIR
+        self.catalogo = obtener_catalogo()
+        self.indice = IndiceRutas(RUTAS_DIR)
+        self.espacial = RejillaRutas()
+        self.tabla = TablaRutas()
+        self._version_indices = None
+        self._indices_lock = threading.Lock()
+
+    def sincronizar_catalogo(self):
+        """
+        Lleva al catálogo los JSON de la carpeta de rutas nuevos o modificados desde la última
+        comprobación y pone al día el índice espacial y la tabla columnar con los cambios del
+        catálogo, de modo que también recogen las rutas guardadas o eliminadas sin pasar por
+        la carpeta. Dentro de una petición solo se sincroniza la primera vez.
+        """
+        if has_request_context() and g.get('catalogo_sincronizado'):
+            return
+        cambiadas, _ = self.indice.refrescar()
+        cambiadas = [ruta for ruta in cambiadas if isinstance(ruta, dict) and ruta.get('nombre')]
+        if cambiadas:
+            self.catalogo.guardar_varias(cambiadas)
+        with self._indices_lock:
+            rutas, eliminadas, self._version_indices = self.catalogo.cambios_desde(self._version_indices)
+            self.espacial.actualizar(rutas, eliminadas)
+            self.tabla.actualizar(rutas, eliminadas)
+        if has_request_context():
+            g.catalogo_sincronizado = True
+
+    def cerca(self, lat, lon, radio_km, limite=None):
+        """Rutas que pasan a menos de radio_km del punto, de la más cercana a la más lejana."""
+        self.sincronizar_catalogo()
+        nombres = [nombre for nombre, _ in self.espacial.cerca(lat, lon, radio_km, limite)]
+        return self.catalogo.obtener_varias(nombres)
+
+    def en_caja(self, lat_min, lon_min, lat_max, lon_max):
+        """Rutas con algún punto dentro de la caja."""
+        self.sincronizar_catalogo()
+        return self.catalogo.obtener_varias(self.espacial.en_caja(lat_min, lon_min, lat_max, lon_max))
+
+    def consultar(self, consulta):
+        """Rutas del catálogo que cumplen la consulta, con una única sentencia indexada."""
+        self.sincronizar_catalogo()
+        self.rutas = self.catalogo.consultar(consulta)
+        return self.rutas
+
+    def conteo(self, columna, consulta=None):
+        """Número de rutas por "modo" o "dificultad", solo entre las que cumplen la consulta si se da."""
+        self.sincronizar_catalogo()
+        with self._indices_lock:
+            return self.tabla.conteo(columna, consulta)
+
+    def histograma(self, columna='distancia_km', intervalos=10, consulta=None):
+        """Rutas en cada intervalo de una columna numérica y bordes de los intervalos."""
+        self.sincronizar_catalogo()
+        with self._indices_lock:
+            return self.tabla.histograma(columna, intervalos, consulta)
+
+    def listar(self, dificultad=None, max_km=None, max_horas=None, modo=None):
+        """Rutas del catálogo que cumplen todos los filtros indicados."""
+        return self.consultar(ConsultaRutas(dificultad=dificultad, max_km=max_km, max_horas=max_horas, modo=modo))
 
     def cargar_rutas_desde_carpeta(self):
-        rutas = []
-        if os.path.exists(self.rutas_dir):
-            for archivo in os.listdir(self.rutas_dir):
-                if archivo.endswith('.json'):
-                    ruta_path = os.path.join(self.rutas_dir, archivo)
-                    try:
-                        with open(ruta_path, 'r', encoding='utf-8') as f:
-                            datos_ruta = json.load(f)
-                            rutas.append(datos_ruta)
-                    except Exception as e:
-                        print(f"Error al cargar la ruta {archivo}: {str(e)}")
-
-        self.rutas = rutas
-        return rutas
+        # Solo se vuelven a leer los archivos nuevos o modificados
+        self.rutas = self.indice.rutas()
+        return self.rutas
 
     def filtrar_por_dificultad(self, dificultad):
-        return [ruta for ruta in self.rutas if ruta.get('dificultad', '').lower() == dificultad.lower()]
+        return self.listar(dificultad=dificultad)
 
     def filtrar_por_distancia(self, max_km):
-        return [ruta for ruta in self.rutas if float(ruta.get('distancia_km', 0)) <= max_km]
+        return self.listar(max_km=max_km)
 
     def filtrar_por_duracion(self, max_horas):
-        return [ruta for ruta in self.rutas if float(ruta.get('duracion_horas', 0)) <= max_horas]
+        return self.listar(max_horas=max_horas)
 
     def filtrar_por_transporte(self, modo):
-        return [ruta for ruta in self.rutas if ruta.get('modo', '').lower() == modo.lower()]
+        return self.listar(modo=modo)
 
 class RutaManual:
     @staticmethod
@@ -234,22 +402,22 @@ class RutaManual:
         else:
             dificultad = 'alto'
 
-        ruta = {
-            'nombre': nombre,
-            'origen': origen,
-            'destino': destino,
-            'puntos_intermedios': puntos_intermedios,
-            'modo': modo,
-            'distancia_km': distancia_km,
-            'duracion_horas': duracion_horas,
-            'dificultad': dificultad,
-            'fecha_creacion': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'creador': username
-        }
+        ruta = crear_datos_ruta(
+            nombre=nombre,
+            origen=origen,
+            destino=destino,
+            puntos_intermedios=puntos_intermedios,
+            modo=modo,
+            distancia_km=distancia_km,
+            duracion_horas=duracion_horas,
+            dificultad=dificultad,
+            creador=username
+        )
 
         ruta_path = os.path.join(RUTAS_DIR, f"{nombre}.json")
         with open(ruta_path, 'w', encoding='utf-8') as f:
             json.dump(ruta, f, ensure_ascii=False, indent=4)
+        obtener_catalogo().guardar(ruta)
 
         return ruta
 
@@ -289,6 +457,28 @@ def after_request(response):
 # Instancia del gestor de rutas
 gestor = GestorRutas()
 
+def con_etag(vista):
+    """
+    Añade a un listado un ETag fuerte formado por la versión del catálogo, la de los vínculos
+    entre usuarios y rutas y la URL pedida, y responde 304 sin generar el listado si el
+    cliente envía ese mismo ETag en If-None-Match.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        gestor.sincronizar_catalogo()
+        huella = zlib.crc32(f"{request.full_path}|{request.headers.get('Accept', '')}".encode('utf-8'))
+        etag = f"{gestor.catalogo.version()}.{version_rutas_usuarios()}-{huella:08x}"
+        if request.if_none_match.contains(etag):
+            respuesta = Response(status=304)
+        else:
+            respuesta = app.make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+        respuesta.set_etag(etag)
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta
+    return envoltura
+
 # Ruta principal
 @app.route('/')
 def home():
@@ -404,6 +594,7 @@ def eliminar_usuario(username):
             ruta_path = os.path.join(RUTAS_DIR, f"{ruta.nombre_ruta}.json")
             if os.path.exists(ruta_path):
                 os.remove(ruta_path)
+            obtener_catalogo().eliminar(ruta.nombre_ruta)
             db.session.delete(ruta)
         # Eliminar el usuario
         db.session.delete(usuario)
@@ -503,6 +694,7 @@ def eliminar_ruta_usuario(username, nombre_ruta):
         ruta_path = os.path.join(RUTAS_DIR, f"{nombre_ruta}.json")
         if os.path.exists(ruta_path):
             os.remove(ruta_path)
+        obtener_catalogo().eliminar(nombre_ruta)
             
         # Eliminar archivos PDF y HTML si existen
         pdf_path = os.path.join(STATIC_DIR, f"{nombre_ruta}.pdf")
@@ -529,6 +721,7 @@ def eliminar_ruta_usuario(username, nombre_ruta):
         }), 500
 
 @app.route('/api/usuarios/<username>/rutas', methods=['GET'])
+@con_etag
 def obtener_rutas_usuario(username):
     try:
         rutas = []
@@ -539,40 +732,7 @@ def obtener_rutas_usuario(username):
                 ruta_path = os.path.join(RUTAS_DIR, f"{rel.nombre_ruta}.json")
                 if os.path.exists(ruta_path):
                     try:
-                        with open(ruta_path, 'r', encoding='utf-8') as f:
-                            datos_ruta = json.load(f)
-                            if isinstance(datos_ruta, dict):
-                                # Adaptar origen y destino si son string
-                                if isinstance(datos_ruta.get('origen'), str):
-                                    datos_ruta['origen'] = {"direccion": datos_ruta['origen']}
-                                if isinstance(datos_ruta.get('destino'), str):
-                                    datos_ruta['destino'] = {"direccion": datos_ruta['destino']}
-                                # Adaptar puntos_intermedios si es lista de strings
-                                if 'puntos_intermedios' in datos_ruta and isinstance(datos_ruta['puntos_intermedios'], list):
-                                    if datos_ruta['puntos_intermedios'] and isinstance(datos_ruta['puntos_intermedios'][0], str):
-                                        datos_ruta['puntos_intermedios'] = [{"direccion": p} for p in datos_ruta['puntos_intermedios']]
-                                # Adaptar distancia y duración
-                                if 'distancia' in datos_ruta and 'distancia_km' not in datos_ruta:
-                                    try:
-                                        datos_ruta['distancia_km'] = float(str(datos_ruta['distancia']).replace('km','').strip())
-                                    except:
-                                        datos_ruta['distancia_km'] = 0
-                                if 'duracion' in datos_ruta and 'duracion_horas' not in datos_ruta:
-                                    try:
-                                        minutos = 0
-                                        if 'h' in datos_ruta['duracion']:
-                                            partes = datos_ruta['duracion'].split('h')
-                                            horas = int(partes[0].strip())
-                                            minutos = int(partes[1].replace('min','').strip()) if 'min' in partes[1] else 0
-                                            datos_ruta['duracion_horas'] = horas + minutos/60
-                                        else:
-                                            datos_ruta['duracion_horas'] = float(str(datos_ruta['duracion']).replace('min','').strip())/60
-                                    except:
-                                        datos_ruta['duracion_horas'] = 0
-                                # Adaptar modo
-                                if 'modo_transporte' in datos_ruta and 'modo' not in datos_ruta:
-                                    datos_ruta['modo'] = datos_ruta['modo_transporte']
-                                rutas.append(datos_ruta)
+                        rutas.append(cargar_ruta(ruta_path))
                     except Exception as e:
                         print(f"Error al cargar la ruta {rel.nombre_ruta}: {str(e)}")
         return jsonify({"status": "success", "data": rutas})
@@ -600,39 +760,78 @@ def obtener_amigos():
         }), 500
 
 # Endpoints de Rutas
+def proyectar_documentos(documentos, campos):
+    """Reduce cada documento JSON de ruta a los campos pedidos (si no se pide ninguno, lo deja igual)."""
+    for documento in documentos:
+        if campos:
+            datos = json.loads(documento)
+            documento = json.dumps({campo: datos[campo] for campo in campos if campo in datos}, ensure_ascii=False)
+        yield documento
+
+def respuesta_json_por_partes(documentos, cursor_siguiente):
+    """Genera el JSON {"status", "data", "cursor_siguiente"} ruta a ruta, sin construirlo entero en memoria."""
+    yield '{"status": "success", "data": ['
+    for i, documento in enumerate(documentos):
+        yield (', ' if i else '') + documento
+    yield f'], "cursor_siguiente": {json.dumps(cursor_siguiente)}}}'
+
 @app.route('/api/rutas', methods=['GET'])
+@con_etag
 def obtener_rutas():
+    """
+    Lista las rutas del catálogo.
+
+    Además de los filtros de ConsultaRutas, admite paginación por cursor (limit y cursor; la
+    respuesta trae "cursor_siguiente" y la cabecera X-Cursor-Siguiente mientras queden rutas),
+    proyección de campos (fields=nombre,distancia_km) y, con formato=ndjson o
+    Accept: application/x-ndjson, una ruta JSON por línea. La respuesta se envía por partes.
+    """
     try:
-        rutas = gestor.cargar_rutas_desde_carpeta()
+        consulta = ConsultaRutas.desde_parametros(request.args)
+        if consulta.limite is not None and not 1 <= consulta.limite <= LIMITE_MAXIMO_RUTAS:
+            raise ValueError(f"El límite debe estar entre 1 y {LIMITE_MAXIMO_RUTAS}")
+        campos = [campo.strip() for campo in (request.args.get('fields') or request.args.get('campos') or '').split(',')
+                  if campo.strip()]
+        ndjson = (request.args.get('formato') == 'ndjson'
+                  or request.accept_mimetypes.best == 'application/x-ndjson')
+
+        # con_etag ya ha sincronizado el catálogo
+        cursor_siguiente = None
+        if consulta.limite is not None:
+            # Se pide una ruta de más para saber si queda otra página
+            documentos = list(gestor.catalogo.iterar_documentos(
+                dataclasses.replace(consulta, limite=consulta.limite + 1)))
+            if len(documentos) > consulta.limite:
+                documentos = documentos[:consulta.limite]
+                cursor_siguiente = consulta.cursor(json.loads(documentos[-1]))
+        else:
+            documentos = gestor.catalogo.iterar_documentos(consulta)
+        documentos = proyectar_documentos(documentos, campos)
+    except ValueError as ve:
         return jsonify({
-            "status": "success",
-            "data": rutas
-        })
+            "status": "error",
+            "message": str(ve)
+        }), 400
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": f"Error al obtener rutas: {str(e)}"
         }), 500
 
+    cabeceras = {'X-Cursor-Siguiente': cursor_siguiente} if cursor_siguiente else {}
+    if ndjson:
+        return Response((documento + '\n' for documento in documentos),
+                        mimetype='application/x-ndjson', headers=cabeceras)
+    return Response(respuesta_json_por_partes(documentos, cursor_siguiente),
+                    mimetype='application/json', headers=cabeceras)
+
 @app.route('/api/rutas/filtrar', methods=['GET'])
+@con_etag
 def filtrar_rutas():
     try:
-        dificultad = request.args.get('dificultad')
-        max_km = request.args.get('max_km', type=float)
-        max_horas = request.args.get('max_horas', type=float)
-        modo_transporte = request.args.get('modo_transporte')
-        
-        gestor.rutas = gestor.cargar_rutas_desde_carpeta()
-        rutas = gestor.rutas
-        
-        if dificultad:
-            rutas = gestor.filtrar_por_dificultad(dificultad)
-        if max_km:
-            rutas = gestor.filtrar_por_distancia(max_km)
-        if max_horas:
-            rutas = gestor.filtrar_por_duracion(max_horas)
-        if modo_transporte:
-            rutas = gestor.filtrar_por_transporte(modo_transporte)
+        # Todos los filtros, el orden y el límite se combinan en una sola consulta al catálogo
+        consulta = ConsultaRutas.desde_parametros(request.args)
+        rutas = gestor.consultar(consulta)
             
         return jsonify({
             "status": "success",
@@ -649,21 +848,178 @@ def filtrar_rutas():
             "message": f"Error al filtrar rutas: {str(e)}"
         }), 500
 
+@app.route('/api/rutas/estadisticas', methods=['GET'])
+@con_etag
+def estadisticas_rutas():
+    """
+    Rutas por modo y por dificultad e histograma de una columna numérica (?columna=, distancia_km
+    por defecto, e ?intervalos=, 10 por defecto), sobre las rutas que cumplen los filtros de ConsultaRutas.
+    """
+    try:
+        consulta = ConsultaRutas.desde_parametros(request.args)
+        columna = request.args.get('columna', 'distancia_km')
+        if columna not in ('distancia_km', 'duracion_horas', 'fecha'):
+            raise ValueError("La columna debe ser distancia_km, duracion_horas o fecha")
+        intervalos = request.args.get('intervalos', '10')
+        if not intervalos.isdigit() or not 1 <= int(intervalos) <= 100:
+            raise ValueError("Los intervalos deben ser un entero entre 1 y 100")
+        totales, bordes = gestor.histograma(columna, int(intervalos), consulta)
+        return jsonify({
+            "status": "success",
+            "data": {
+                "modo": gestor.conteo('modo', consulta),
+                "dificultad": gestor.conteo('dificultad', consulta),
+                columna: {"totales": totales.tolist(), "bordes": bordes.tolist()}
+            }
+        })
+    except ValueError as ve:
+        return jsonify({
+            "status": "error",
+            "message": str(ve)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error al calcular estadísticas de rutas: {str(e)}"
+        }), 500
+
+@app.route('/api/rutas/cerca', methods=['GET'])
+def rutas_cercanas():
+    """Rutas cerca de un punto (?lat=&lon=&radio= en km, 1 por defecto) o dentro de una caja (?bbox=lat_min,lon_min,lat_max,lon_max)."""
+    try:
+        bbox = request.args.get('bbox')
+        if bbox:
+            try:
+                lat_min, lon_min, lat_max, lon_max = (float(valor) for valor in bbox.split(','))
+            except ValueError:
+                raise ValueError("bbox debe ser lat_min,lon_min,lat_max,lon_max")
+            rutas = gestor.en_caja(lat_min, lon_min, lat_max, lon_max)
+        else:
+            lat = request.args.get('lat', type=float)
+            lon = request.args.get('lon', type=float)
+            radio = request.args.get('radio', 1.0, type=float)
+            limite = request.args.get('limite', type=int)
+            if lat is None or lon is None:
+                raise ValueError("Se requieren los parámetros lat y lon, o bbox")
+            if radio <= 0:
+                raise ValueError("El radio debe ser positivo")
+            rutas = gestor.cerca(lat, lon, radio, limite)
+        return jsonify({
+            "status": "success",
+            "data": rutas
+        })
+    except ValueError as ve:
+        return jsonify({
+            "status": "error",
+            "message": str(ve)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error al buscar rutas cercanas: {str(e)}"
+        }), 500
+
+def construir_ruta(datos):
+    """Crea una ruta manual a partir de los datos de la petición y la asocia al usuario."""
+    ruta = RutaManual.crear_ruta_desde_datos(
+        origen=datos['origen'],
+        puntos_intermedios=datos.get('puntos_intermedios', []),
+        destino=datos['destino'],
+        modo=datos.get('modo', 'walk'),
+        nombre=datos.get('nombre'),
+        username=datos.get('username')
+    )
+    
+    if ruta and datos.get('username'):
+        Usuario.agregar_ruta(datos['username'], ruta['nombre'])
+    return ruta
+
+def construir_rutas_automaticas(datos):
+    """Genera las rutas automáticas de la petición y las asocia al usuario."""
+    ruta_auto = RutaAuto()
+    rutas = ruta_auto.generar_rutas_desde_direcciones(
+        direcciones=datos['direcciones'],
+        cantidad=datos.get('cantidad', 5)
+    )
+    
+    if rutas and datos.get('username'):
+        for ruta in rutas:
+            if isinstance(ruta, str) and "creada" in ruta:
+                nombre_ruta = ruta.split("'")[1]
+                Usuario.agregar_ruta(datos['username'], nombre_ruta)
+    return rutas
+
+# Cola de trabajos en segundo plano.
+# Los manejadores usan los generadores de este módulo (RutaManual y RutaAuto de arriba),
+# que no geocodifican: nunca lanzan errores transitorios de Nominatim, así que los
+# reintentos de la cola no llegan a aplicarse a estos trabajos.
+@registrar_manejador('crear_ruta')
+def trabajo_crear_ruta(datos):
+    with app.app_context():
+        return construir_ruta(datos)
+
+@registrar_manejador('crear_rutas_auto')
+def trabajo_crear_rutas_automaticas(datos):
+    with app.app_context():
+        return construir_rutas_automaticas(datos)
+
+cola_trabajos = None
+grupo_trabajadores = None
+
+def obtener_cola():
+    """Devuelve la cola de trabajos compartida, creándola si no existe."""
+    global cola_trabajos
+    if cola_trabajos is None:
+        cola_trabajos = ColaTrabajos()
+    return cola_trabajos
+
+def inicializar_trabajador_cola():
+    """Descarta en cada proceso trabajador las conexiones heredadas de la aplicación."""
+    db.engine.dispose()
+
+def iniciar_trabajadores():
+    """Arranca, si no lo están ya, los procesos que ejecutan la cola de trabajos."""
+    global grupo_trabajadores
+    if grupo_trabajadores is None:
+        grupo_trabajadores = GrupoTrabajadores(obtener_cola(), TRABAJADORES_COLA, inicializar_trabajador_cola)
+    grupo_trabajadores.iniciar()
+
+def ejecutar_trabajadores():
+    """Ejecuta los trabajadores de la cola en primer plano hasta que se interrumpe el proceso."""
+    iniciar_trabajadores()
+    print(f"✅ {TRABAJADORES_COLA} trabajadores consumiendo la cola (Ctrl+C para salir)")
+    try:
+        while grupo_trabajadores.activo:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        grupo_trabajadores.detener()
+
+def respuesta_trabajo(tipo, datos):
+    """
+    Encola un trabajo y responde con su identificador (202 Accepted).
+
+    Los trabajos quedan pendientes hasta que los recoge el proceso de trabajadores
+    (`python miapp.py trabajadores`), que se arranca aparte de la aplicación web.
+    """
+    id_trabajo = obtener_cola().encolar(tipo, datos)
+    return jsonify({
+        "status": "success",
+        "data": {
+            "job_id": id_trabajo,
+            "estado": "pendiente",
+            "url": f"/api/jobs/{id_trabajo}"
+        }
+    }), 202
+
 @app.route('/api/rutas', methods=['POST'])
 def crear_ruta():
     try:
         datos = request.get_json(force=True)
-        ruta = RutaManual.crear_ruta_desde_datos(
-            origen=datos['origen'],
-            puntos_intermedios=datos.get('puntos_intermedios', []),
-            destino=datos['destino'],
-            modo=datos.get('modo', 'walk'),
-            nombre=datos.get('nombre'),
-            username=datos.get('username')
-        )
-        
-        if ruta and datos.get('username'):
-            Usuario.agregar_ruta(datos['username'], ruta['nombre'])
+        if datos.get('asincrono', TRABAJOS_ASINCRONOS):
+            return respuesta_trabajo('crear_ruta', datos)
+        ruta = construir_ruta(datos)
             
         return jsonify({
             "status": "success",
@@ -679,17 +1035,9 @@ def crear_ruta():
 def crear_rutas_automaticas():
     try:
         datos = request.get_json(force=True)
-        ruta_auto = RutaAuto()
-        rutas = ruta_auto.generar_rutas_desde_direcciones(
-            direcciones=datos['direcciones'],
-            cantidad=datos.get('cantidad', 5)
-        )
-        
-        if rutas and datos.get('username'):
-            for ruta in rutas:
-                if isinstance(ruta, str) and "creada" in ruta:
-                    nombre_ruta = ruta.split("'")[1]
-                    Usuario.agregar_ruta(datos['username'], nombre_ruta)
+        if datos.get('asincrono', TRABAJOS_ASINCRONOS):
+            return respuesta_trabajo('crear_rutas_auto', datos)
+        rutas = construir_rutas_automaticas(datos)
                     
         return jsonify({
             "status": "success",
@@ -701,6 +1049,26 @@ def crear_rutas_automaticas():
             "message": f"Error al crear rutas automáticas: {str(e)}"
         }), 500
 
+# Estado de un trabajo en segundo plano
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def consultar_trabajo(job_id):
+    try:
+        trabajo = obtener_cola().obtener(job_id)
+        if not trabajo:
+            return jsonify({
+                "status": "error",
+                "message": "Trabajo no encontrado"
+            }), 404
+        return jsonify({
+            "status": "success",
+            "data": trabajo
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error al consultar el trabajo: {str(e)}"
+        }), 500
+
 # Endpoint de Clima
 @app.route('/api/clima', methods=['GET'])
 def consultar_clima():
@@ -732,6 +1100,21 @@ def consultar_clima():
             "message": f"Error al consultar clima: {str(e)}"
         }), 500
 
+# Estadísticas del registro de grafos de calles
+@app.route('/api/grafos/estadisticas', methods=['GET'])
+def estadisticas_grafos():
+    try:
+        from registro_grafos import obtener_registro
+        return jsonify({
+            "status": "success",
+            "data": obtener_registro().estadisticas()
+        })
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error al obtener estadísticas de grafos: {str(e)}"
+        }), 500
+
 # Endpoint para comprobar la base de datos
 @app.route('/api/test_db', methods=['GET'])
 def test_db():
@@ -785,7 +1168,17 @@ def inicializar_db():
                 print("📝 Creando nueva base de datos...")
             
             # Crear las tablas
+            habia_amistades = db.inspect(db.engine).has_table('amistades')
             db.create_all()
+            # create_all no añade índices nuevos a tablas que ya existían
+            for indice in UsuarioRuta.__table__.indexes:
+                indice.create(bind=db.engine, checkfirst=True)
+            with db.engine.begin() as conexion:
+                for trigger in TRIGGERS_AMISTADES + TRIGGERS_VERSION_RUTAS:
+                    conexion.exec_driver_sql(trigger)
+                if not habia_amistades:
+                    # Bases de datos anteriores a la tabla materializada
+                    reconstruir_amistades(conexion)
             print("✅ Base de datos inicializada correctamente")
             
             # Verificar las tablas creadas
@@ -797,10 +1190,41 @@ def inicializar_db():
             print(f"❌ Error al inicializar la base de datos: {str(e)}")
             raise
 
+def inicializar_catalogo():
+    """Importa en el catálogo, solo la primera vez, las rutas JSON existentes."""
+    try:
+        importadas = obtener_catalogo().importar_una_vez(RUTAS_DIR)
+        if importadas:
+            print(f"✅ {importadas} rutas importadas al catálogo")
+    except Exception as e:
+        print(f"⚠️ No se pudieron importar las rutas al catálogo: {str(e)}")
+
+def precargar_grafos():
+    """Carga en el registro compartido los grafos de calles de Alicante de cada modo de transporte."""
+    try:
+        from registro_grafos import obtener_registro
+        obtener_registro().precargar()
+        print("✅ Grafos de calles precargados")
+    except Exception as e:
+        print(f"⚠️ No se pudieron precargar los grafos: {str(e)}")
+
 
 if __name__ == '__main__':
     inicializar_db()
+    inicializar_catalogo()
+    if len(sys.argv) >= 2 and sys.argv[1] == 'trabajadores':
+        ejecutar_trabajadores()
+        sys.exit(0)
+    if PRECARGAR_GRAFOS:
+        precargar_grafos()
+    if TRABAJOS_ASINCRONOS:
+        iniciar_trabajadores()
     #Ejecución local (descomentar)
     #app.run(debug=True, port=5000)
 else:
-    inicializar_db()
\ No newline at end of file
+    # Cada proceso de la aplicación web importa este módulo: los trabajadores de la
+    # cola no se arrancan aquí, sino una sola vez con `python miapp.py trabajadores`
+    inicializar_db()
+    inicializar_catalogo()
+    if PRECARGAR_GRAFOS:
+        precargar_grafos()
\ No newline at end of file
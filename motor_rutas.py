@@ -0,0 +1,198 @@
+"""Motor de cálculo de caminos mínimos sobre grafos de calles en formato CSR."""
+import math
+from heapq import heappop, heappush
+from typing import Dict, Iterable, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+from cache_grafos import GrafoCompacto
+
+# Velocidades medias en km/h de cada modo de transporte
+VELOCIDADES_KMH = {'walk': 5, 'bike': 15, 'drive': 60}
+
+RADIO_TIERRA_M = 6371009
+
+
+class MotorRutas:
+    """
+    Calcula caminos mínimos sobre un grafo almacenado en arrays CSR de NumPy.
+
+    Las aristas se ordenan por nodo de salida, de forma que las aristas que salen del
+    nodo `i` ocupan las posiciones `offsets[i]:offsets[i + 1]` de `destinos`,
+    `longitudes` y `tiempos`.
+
+    Parameters
+    ----------
+    compacto : GrafoCompacto
+        Grafo de calles en formato compacto.
+    velocidad_kmh : float
+        Velocidad usada para calcular el tiempo de recorrido de cada arista.
+
+    Attributes
+    ----------
+    offsets : np.ndarray
+        Posición de inicio de las aristas de cada nodo (longitud n + 1).
+    destinos : np.ndarray
+        Índice del nodo de llegada de cada arista.
+    longitudes : np.ndarray
+        Longitud de cada arista en metros.
+    tiempos : np.ndarray
+        Tiempo de recorrido de cada arista en segundos.
+    """
+
+    def __init__(self, compacto: GrafoCompacto, velocidad_kmh: float) -> None:
+        self.nodos = np.asarray(compacto.nodos)
+        self.velocidad_ms = velocidad_kmh / 3.6
+        n = len(self.nodos)
+
+        orden = np.argsort(compacto.origenes, kind="stable")
+        self.destinos = np.asarray(compacto.destinos)[orden].astype(np.int32)
+        self.longitudes = np.asarray(compacto.longitudes)[orden].astype(np.float64)
+        self.tiempos = self.longitudes / self.velocidad_ms
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(compacto.origenes, minlength=n), out=self.offsets[1:])
+
+        self._posiciones = {nodo: i for i, nodo in enumerate(self.nodos.tolist())}
+        self._lat = np.radians(np.asarray(compacto.y)).tolist()
+        self._lon = np.radians(np.asarray(compacto.x)).tolist()
+        # Las listas de Python se indexan mucho más rápido que los arrays en el bucle de búsqueda
+        self._offsets = self.offsets.tolist()
+        self._destinos = self.destinos.tolist()
+        self._pesos = {"longitud": self.longitudes.tolist(), "tiempo": self.tiempos.tolist()}
+
+    @staticmethod
+    def desde_networkx(grafo: nx.MultiDiGraph, velocidad_kmh: float) -> "MotorRutas":
+        """Construye el motor a partir de un grafo de OSMnx."""
+        return MotorRutas(GrafoCompacto.desde_networkx(grafo), velocidad_kmh)
+
+    def indice(self, nodo: int) -> int:
+        """
+        Devuelve la posición interna de un nodo OSM.
+
+        Raises
+        ------
+        nx.NodeNotFound
+            Si el nodo no pertenece al grafo.
+        """
+        try:
+            return self._posiciones[nodo]
+        except KeyError:
+            raise nx.NodeNotFound(f"El nodo {nodo} no está en el grafo")
+
+    def ruta_mas_corta(self, origen: int, destino: int, peso: str = "longitud") -> Tuple[List[int], float]:
+        """
+        Calcula con A* el camino mínimo entre dos nodos y su coste en una sola pasada.
+
+        Parameters
+        ----------
+        origen : int
+            Nodo OSM de salida.
+        destino : int
+            Nodo OSM de llegada.
+        peso : str, optional
+            "longitud" (metros) o "tiempo" (segundos).
+
+        Returns
+        -------
+        Tuple[List[int], float]
+            Lista de nodos OSM del camino y coste total.
+
+        Raises
+        ------
+        nx.NetworkXNoPath
+            Si no existe camino entre los nodos.
+        """
+        s, t = self.indice(origen), self.indice(destino)
+        previos, coste = self._buscar(s, t, peso)
+        return [self.nodos[i].item() for i in self._reconstruir(previos, t)], coste
+
+    def caminos_desde(self, origen: int, destinos: Iterable[int],
+                      peso: str = "longitud") -> Dict[int, Tuple[List[int], float]]:
+        """
+        Calcula con un único Dijkstra los caminos mínimos desde `origen` a varios destinos.
+
+        La búsqueda se detiene en cuanto se han alcanzado todos los destinos.
+
+        Parameters
+        ----------
+        origen : int
+            Nodo OSM de salida.
+        destinos : Iterable[int]
+            Nodos OSM de llegada.
+        peso : str, optional
+            "longitud" (metros) o "tiempo" (segundos).
+
+        Returns
+        -------
+        Dict[int, Tuple[List[int], float]]
+            Camino y coste para cada destino alcanzable; los inalcanzables no aparecen.
+        """
+        s = self.indice(origen)
+        objetivos = {self.indice(d): d for d in destinos}
+        offsets, destinos_csr, pesos = self._offsets, self._destinos, self._pesos[peso]
+
+        distancias = {s: 0.0}
+        previos = {s: -1}
+        cerrados = set()
+        pendientes = set(objetivos)
+        cola = [(0.0, s)]
+        while cola and pendientes:
+            d, u = heappop(cola)
+            if u in cerrados:
+                continue
+            cerrados.add(u)
+            pendientes.discard(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = destinos_csr[k]
+                nd = d + pesos[k]
+                if nd < distancias.get(v, math.inf):
+                    distancias[v] = nd
+                    previos[v] = u
+                    heappush(cola, (nd, v))
+
+        return {
+            nodo: ([self.nodos[i].item() for i in self._reconstruir(previos, t)], distancias[t])
+            for t, nodo in objetivos.items() if t in cerrados
+        }
+
+    def _buscar(self, s: int, t: int, peso: str):
+        """A* con la distancia haversine al destino como heurística (admisible)."""
+        offsets, destinos, pesos = self._offsets, self._destinos, self._pesos[peso]
+        lat, lon = self._lat, self._lon
+        lat_t, lon_t, cos_t = lat[t], lon[t], math.cos(lat[t])
+        escala = RADIO_TIERRA_M * 2 if peso == "longitud" else RADIO_TIERRA_M * 2 / self.velocidad_ms
+
+        def heuristica(v: int) -> float:
+            a = math.sin((lat[v] - lat_t) / 2) ** 2 + math.cos(lat[v]) * cos_t * math.sin((lon[v] - lon_t) / 2) ** 2
+            return escala * math.asin(min(1.0, math.sqrt(a)))
+
+        distancias = {s: 0.0}
+        previos = {s: -1}
+        cerrados = set()
+        cola = [(heuristica(s), 0.0, s)]
+        while cola:
+            _, d, u = heappop(cola)
+            if u == t:
+                return previos, d
+            if u in cerrados:
+                continue
+            cerrados.add(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = destinos[k]
+                nd = d + pesos[k]
+                if nd < distancias.get(v, math.inf):
+                    distancias[v] = nd
+                    previos[v] = u
+                    heappush(cola, (nd + heuristica(v), nd, v))
+        raise nx.NetworkXNoPath(f"No hay camino entre {self.nodos[s]} y {self.nodos[t]}")
+
+    @staticmethod
+    def _reconstruir(previos: dict, t: int) -> List[int]:
+        """Recorre los predecesores desde `t` hasta el origen."""
+        camino = []
+        while t != -1:
+            camino.append(t)
+            t = previos[t]
+        camino.reverse()
+        return camino
@@ -0,0 +1,277 @@
+"""Optimización del orden de visita de varios puntos (problema del viajante, recorrido abierto)."""
+import itertools
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Tiempo máximo por defecto dedicado a la búsqueda, en segundos
+TIEMPO_MAXIMO = 2.0
+
+# Longitud máxima de los segmentos que mueve Or-opt
+LONGITUD_OR_OPT = 3
+
+# Hasta este número de puntos se prueban todas las permutaciones
+MAXIMO_EXACTO = 8
+
+# Coste que sustituye a los pares sin camino para que la búsqueda los evite
+PENALIZACION = 1e9
+
+
+def coste_recorrido(costes: np.ndarray, orden: List[int]) -> float:
+    """Suma de los costes de los tramos consecutivos de un recorrido abierto."""
+    if len(orden) < 2:
+        return 0.0
+    return float(costes[orden[:-1], orden[1:]].sum())
+
+
+def vecino_mas_cercano(costes: np.ndarray, inicio: int) -> List[int]:
+    """
+    Construye un recorrido yendo siempre al punto no visitado más barato.
+
+    Parameters
+    ----------
+    costes : np.ndarray
+        Matriz n x n de costes (puede ser asimétrica).
+    inicio : int
+        Punto de salida.
+
+    Returns
+    -------
+    List[int]
+    """
+    n = len(costes)
+    visitados = np.zeros(n, dtype=bool)
+    visitados[inicio] = True
+    orden = [inicio]
+    for _ in range(n - 1):
+        fila = np.where(visitados, np.inf, costes[orden[-1]])
+        siguiente = int(np.argmin(fila))
+        visitados[siguiente] = True
+        orden.append(siguiente)
+    return orden
+
+
+def dos_opt(costes: np.ndarray, orden: List[int], fijar_inicio: bool = False,
+            limite: Optional[float] = None) -> Tuple[List[int], float]:
+    """
+    Invierte tramos del recorrido mientras alguna inversión lo acorte.
+
+    El ahorro de todas las inversiones que empiezan en una posición se calcula a la vez
+    con sumas acumuladas de los costes en ambos sentidos, por lo que también vale para
+    matrices asimétricas (calles de sentido único).
+
+    Parameters
+    ----------
+    costes : np.ndarray
+        Matriz de costes.
+    orden : List[int]
+        Recorrido inicial.
+    fijar_inicio : bool, optional
+        Si es True, el primer punto no se mueve.
+    limite : float, optional
+        Instante (`time.monotonic()`) a partir del cual se deja de buscar.
+
+    Returns
+    -------
+    Tuple[List[int], float]
+        Recorrido mejorado y su coste.
+    """
+    orden = np.asarray(orden)
+    n = len(orden)
+    primero = 1 if fijar_inicio else 0
+    mejorado = True
+    while mejorado and (limite is None or time.monotonic() < limite):
+        mejorado = False
+        ida = np.concatenate(([0.0], np.cumsum(costes[orden[:-1], orden[1:]])))
+        vuelta = np.concatenate(([0.0], np.cumsum(costes[orden[1:], orden[:-1]])))
+        for i in range(primero, n - 1):
+            j = np.arange(i + 1, n)
+            ahorro = (vuelta[j] - vuelta[i]) - (ida[j] - ida[i])
+            if i > 0:
+                ahorro += costes[orden[i - 1], orden[j]] - costes[orden[i - 1], orden[i]]
+            interiores = j[j < n - 1]
+            ahorro[:len(interiores)] += (costes[orden[i], orden[interiores + 1]]
+                                         - costes[orden[interiores], orden[interiores + 1]])
+            mejor = int(np.argmin(ahorro))
+            if ahorro[mejor] < -1e-9:
+                orden[i:j[mejor] + 1] = orden[i:j[mejor] + 1][::-1].copy()
+                mejorado = True
+                break
+    orden = orden.tolist()
+    return orden, coste_recorrido(costes, orden)
+
+
+def or_opt(costes: np.ndarray, orden: List[int], fijar_inicio: bool = False,
+           limite: Optional[float] = None) -> Tuple[List[int], float]:
+    """
+    Cambia de posición segmentos de 1 a `LONGITUD_OR_OPT` puntos mientras mejore el recorrido.
+
+    Parameters
+    ----------
+    costes : np.ndarray
+        Matriz de costes.
+    orden : List[int]
+        Recorrido inicial.
+    fijar_inicio : bool, optional
+        Si es True, el primer punto no se mueve.
+    limite : float, optional
+        Instante (`time.monotonic()`) a partir del cual se deja de buscar.
+
+    Returns
+    -------
+    Tuple[List[int], float]
+        Recorrido mejorado y su coste.
+    """
+    orden = list(orden)
+    n = len(orden)
+    primero = 1 if fijar_inicio else 0
+    mejorado = True
+    while mejorado and (limite is None or time.monotonic() < limite):
+        mejorado = False
+        for longitud in range(1, min(LONGITUD_OR_OPT, n - 1) + 1):
+            for i in range(primero, n - longitud + 1):
+                segmento = orden[i:i + longitud]
+                resto = np.asarray(orden[:i] + orden[i + longitud:])
+                a, b = segmento[0], segmento[-1]
+                # Coste que se ahorra al sacar el segmento
+                quitar = costes[orden[i - 1], a] if i > 0 else 0.0
+                if i + longitud < n:
+                    quitar += costes[b, orden[i + longitud]]
+                    if i > 0:
+                        quitar -= costes[orden[i - 1], orden[i + longitud]]
+                # Coste de insertarlo antes de cada posición k del resto
+                k = np.arange(primero, len(resto) + 1)
+                poner = np.zeros(len(k))
+                con_anterior = k > 0
+                poner[con_anterior] += costes[resto[k[con_anterior] - 1], a]
+                con_siguiente = k < len(resto)
+                poner[con_siguiente] += costes[b, resto[k[con_siguiente]]]
+                ambos = con_anterior & con_siguiente
+                poner[ambos] -= costes[resto[k[ambos] - 1], resto[k[ambos]]]
+                poner[k == i] = np.inf
+                mejor = int(np.argmin(poner))
+                if poner[mejor] - quitar < -1e-9:
+                    resto = resto.tolist()
+                    orden = resto[:k[mejor]] + segmento + resto[k[mejor]:]
+                    mejorado = True
+                    break
+            if mejorado:
+                break
+    return orden, coste_recorrido(costes, orden)
+
+
+def optimizar_recorrido(costes: np.ndarray, orden: List[int], fijar_inicio: bool = False,
+                        limite: Optional[float] = None) -> Tuple[List[int], float]:
+    """Alterna 2-opt y Or-opt hasta que ninguno de los dos mejora el recorrido."""
+    orden, coste = dos_opt(costes, orden, fijar_inicio, limite)
+    while True:
+        orden, nuevo_coste = or_opt(costes, orden, fijar_inicio, limite)
+        if nuevo_coste >= coste - 1e-9:
+            return orden, min(coste, nuevo_coste)
+        orden, coste = dos_opt(costes, orden, fijar_inicio, limite)
+
+
+def es_simetrica(costes: np.ndarray) -> bool:
+    """Indica si ir de i a j cuesta lo mismo que de j a i (por ejemplo, en redes a pie)."""
+    return bool(np.allclose(costes, costes.T))
+
+
+def _recorridos_exactos(costes: np.ndarray, k: int, inicio: Optional[int]) -> List[Tuple[List[int], float]]:
+    """Evalúa todas las permutaciones de una vez (solo para pocos puntos)."""
+    n = len(costes)
+    libres = [i for i in range(n) if i != inicio]
+    permutaciones = np.array(list(itertools.permutations(libres)), dtype=np.int64)
+    if inicio is not None:
+        permutaciones = np.hstack([np.full((len(permutaciones), 1), inicio), permutaciones])
+    elif es_simetrica(costes):
+        # Un recorrido y su inverso cuestan lo mismo: solo se conserva uno de los dos
+        permutaciones = permutaciones[permutaciones[:, 0] <= permutaciones[:, -1]]
+    totales = costes[permutaciones[:, :-1], permutaciones[:, 1:]].sum(axis=1)
+    mejores = np.argsort(totales, kind="stable")[:k]
+    return [(permutaciones[m].tolist(), float(totales[m])) for m in mejores]
+
+
+def _perturbar(orden: List[int], fijar_inicio: bool, aleatorio: random.Random) -> List[int]:
+    """Perturbación "double bridge": corta el recorrido en cuatro trozos y los reordena."""
+    primero = 1 if fijar_inicio else 0
+    n = len(orden)
+    if n - primero < 4:
+        resto = orden[primero:]
+        aleatorio.shuffle(resto)
+        return orden[:primero] + resto
+    a, b, c = sorted(aleatorio.sample(range(primero + 1, n), 3))
+    return orden[:a] + orden[c:] + orden[b:c] + orden[a:b]
+
+
+def mejores_recorridos(costes: np.ndarray, k: int = 5, inicio: Optional[int] = None,
+                       tiempo_maximo: float = TIEMPO_MAXIMO, semilla: Optional[int] = None) -> List[Tuple[List[int], float]]:
+    """
+    Busca los `k` mejores recorridos abiertos distintos que visitan todos los puntos.
+
+    Si la matriz es simétrica y no se fija el punto de salida, un recorrido y su inverso
+    se consideran el mismo y solo se devuelve uno de los dos.
+
+    Con pocos puntos se prueban todas las permutaciones. Si no, se parte del vecino
+    más cercano desde cada punto de salida posible, se mejora cada solución con 2-opt
+    y Or-opt y, mientras quede tiempo, se perturban las mejores soluciones para
+    explorar otras nuevas.
+
+    Parameters
+    ----------
+    costes : np.ndarray
+        Matriz n x n de costes (km u horas); los pares sin camino valen `inf`.
+    k : int, optional
+        Número de recorridos a devolver.
+    inicio : int, optional
+        Punto de salida obligatorio; si es None, se elige el mejor.
+    tiempo_maximo : float, optional
+        Segundos disponibles para la búsqueda.
+    semilla : int, optional
+        Semilla del generador aleatorio, para obtener resultados reproducibles.
+
+    Returns
+    -------
+    List[Tuple[List[int], float]]
+        Recorridos ordenados de menor a mayor coste junto a su coste. Puede haber menos
+        de `k` si la búsqueda no encuentra más recorridos distintos.
+    """
+    costes = np.where(np.isfinite(costes), costes, PENALIZACION)
+    n = len(costes)
+    if n == 0:
+        return []
+    if n <= MAXIMO_EXACTO:
+        return _recorridos_exactos(costes, k, inicio)
+
+    limite = time.monotonic() + tiempo_maximo
+    aleatorio = random.Random(semilla)
+    fijar_inicio = inicio is not None
+    encontrados: Dict[Tuple[int, ...], float] = {}
+    sin_sentido = not fijar_inicio and es_simetrica(costes)
+
+    def clave(orden: List[int]) -> Tuple[int, ...]:
+        return min(tuple(orden), tuple(reversed(orden))) if sin_sentido else tuple(orden)
+
+    def registrar(orden: List[int], coste: float) -> None:
+        encontrados[clave(orden)] = coste
+
+    salidas = [inicio] if fijar_inicio else list(range(n))
+    for salida in salidas:
+        registrar(*optimizar_recorrido(costes, vecino_mas_cercano(costes, salida), fijar_inicio, limite))
+        if time.monotonic() > limite:
+            break
+
+    intentos_sin_novedad = 0
+    while time.monotonic() < limite and intentos_sin_novedad < 50 * max(k, 1):
+        base = aleatorio.choice(sorted(encontrados, key=encontrados.get)[:max(k, 1)])
+        orden, coste = optimizar_recorrido(costes, _perturbar(list(base), fijar_inicio, aleatorio),
+                                           fijar_inicio, limite)
+        if clave(orden) in encontrados:
+            intentos_sin_novedad += 1
+        else:
+            intentos_sin_novedad = 0
+            registrar(orden, coste)
+
+    mejores = sorted(encontrados.items(), key=lambda item: item[1])[:k]
+    return [(list(orden), coste) for orden, coste in mejores]
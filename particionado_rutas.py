@@ -0,0 +1,132 @@
+"""Reparto de muchas direcciones en varias rutas equilibradas con límite de distancia o duración."""
+import time
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from matriz_distancias import MatrizDistancias
+from optimizador_recorridos import coste_recorrido, mejores_recorridos
+
+# Tiempo máximo por defecto para repartir y optimizar todas las rutas, en segundos
+TIEMPO_MAXIMO_PARTICION = 20.0
+
+# Tiempo máximo de optimización de cada grupo en una ronda, en segundos
+TIEMPO_MAXIMO_GRUPO = 2.0
+
+
+@dataclass
+class GrupoParticion:
+    """Ruta resultante del reparto: orden de visita, distancia, duración y si supera el límite."""
+    orden: List[int]
+    km: float
+    horas: float
+    excede_limite: bool = False
+
+
+class EjecutorEnProceso(Executor):
+    """Ejecutor que hace cada tarea en el propio proceso en el momento de enviarla."""
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        futuro = Future()
+        try:
+            futuro.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            futuro.set_exception(e)
+        return futuro
+
+
+def _optimizar_grupo(costes: np.ndarray, tiempo_maximo: float) -> Tuple[List[int], float]:
+    """Mejor recorrido de un grupo (se ejecuta en el ejecutor, normalmente un pool de procesos)."""
+    return mejores_recorridos(costes, k=1, tiempo_maximo=tiempo_maximo)[0]
+
+
+def dividir_grupo(grupo: List[int], coordenadas: List[Tuple[float, float]]) -> List[List[int]]:
+    """
+    Divide un grupo en dos mitades del mismo tamaño por la mediana de su eje principal,
+    de modo que cada mitad queda geográficamente compacta.
+
+    Parameters
+    ----------
+    grupo : List[int]
+        Índices de los puntos del grupo.
+    coordenadas : List[Tuple[float, float]]
+        Coordenadas (lat, lon) de todos los puntos.
+
+    Returns
+    -------
+    List[List[int]]
+    """
+    puntos = np.asarray([coordenadas[i] for i in grupo], dtype=np.float64)
+    # Pasar a un plano local para que un grado de longitud no pese como uno de latitud
+    puntos[:, 1] *= np.cos(np.radians(puntos[:, 0].mean()))
+    centrados = puntos - puntos.mean(axis=0)
+    _, _, ejes = np.linalg.svd(centrados, full_matrices=False)
+    proyeccion = centrados @ ejes[0]
+    orden = np.argsort(proyeccion, kind="stable")
+    mitad = len(grupo) // 2
+    return [[grupo[i] for i in orden[:mitad]], [grupo[i] for i in orden[mitad:]]]
+
+
+def particionar(matriz: MatrizDistancias, coordenadas: List[Tuple[float, float]],
+                max_km: Optional[float] = None, max_horas: Optional[float] = None,
+                tiempo_maximo: float = TIEMPO_MAXIMO_PARTICION,
+                ejecutor: Optional[Executor] = None) -> List[GrupoParticion]:
+    """
+    Reparte los puntos en rutas que no superan `max_km` ni `max_horas`.
+
+    Parte de un único grupo con todos los puntos y, en cada ronda, optimiza (en paralelo
+    si se pasa un pool) el recorrido de los grupos pendientes; los que superan el límite se dividen en dos
+    y pasan a la ronda siguiente. Cuando se agota `tiempo_maximo` se aceptan los grupos
+    tal y como estén, marcando con `excede_limite` los que no cumplen el límite.
+
+    Parameters
+    ----------
+    matriz : MatrizDistancias
+        Distancias y tiempos entre todos los puntos.
+    coordenadas : List[Tuple[float, float]]
+        Coordenadas (lat, lon) de los puntos, en el mismo orden que la matriz.
+    max_km : float, optional
+        Distancia máxima de cada ruta en km.
+    max_horas : float, optional
+        Duración máxima de cada ruta en horas.
+    tiempo_maximo : float, optional
+        Segundos máximos de cálculo.
+    ejecutor : Executor, optional
+        Pool en el que se optimizan los grupos, que el llamador reutiliza entre llamadas;
+        por defecto, los grupos se optimizan uno tras otro en el propio proceso.
+
+    Returns
+    -------
+    List[GrupoParticion]
+        Orden de visita (índices de los puntos), distancia y duración de cada ruta.
+
+    Raises
+    ------
+    ValueError
+        Si no se indica ningún límite.
+    """
+    if max_km is None and max_horas is None:
+        raise ValueError("Hay que indicar una distancia o una duración máxima por ruta")
+
+    limite = time.monotonic() + tiempo_maximo
+    pendientes = [list(range(len(matriz)))]
+    rutas = []
+    ejecutor = ejecutor or EjecutorEnProceso()
+    while pendientes:
+        presupuesto = min(TIEMPO_MAXIMO_GRUPO, max(0.0, limite - time.monotonic()) / 2)
+        futuros = [ejecutor.submit(_optimizar_grupo, matriz.km[np.ix_(grupo, grupo)], presupuesto)
+                   for grupo in pendientes]
+        resultados = [futuro.result() for futuro in futuros]
+        siguientes = []
+        for grupo, (orden_local, km) in zip(pendientes, resultados):
+            orden = [grupo[i] for i in orden_local]
+            horas = coste_recorrido(matriz.horas, orden)
+            excede = (max_km is not None and km > max_km) or (max_horas is not None and horas > max_horas)
+            if excede and len(grupo) > 1 and time.monotonic() < limite:
+                siguientes.extend(dividir_grupo(grupo, coordenadas))
+            else:
+                rutas.append(GrupoParticion(orden, km, horas, excede))
+        pendientes = siguientes
+    return rutas
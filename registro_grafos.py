@@ -0,0 +1,279 @@
+"""Registro en memoria, compartido por todo el proceso, de los grafos de calles de Alicante."""
+import math
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import networkx as nx
+
+from cache_grafos import CacheGrafos, GrafoCompacto, METROS_POR_GRADO, obtener_cache
+from geocodificador import LIMITES_ALICANTE
+from indice_espacial import IndiceNodos
+from jerarquia_contraccion import JerarquiaContraccion
+from motor_rutas import MotorRutas, VELOCIDADES_KMH
+
+MODOS_TRANSPORTE = ("walk", "bike", "drive")
+
+# Margen en metros alrededor de la zona de servicio para no cortar calles del borde
+MARGEN_METROS = 1000
+
+# Entradas de fuera de la zona de servicio que se guardan (las menos usadas se descartan)
+MAXIMO_ENTRADAS_EXTERNAS = 4
+
+
+class EntradaRegistro:
+    """
+    Grafo de un tipo de red cargado en el registro.
+
+    Attributes
+    ----------
+    compacto : GrafoCompacto
+        Arrays proyectados en memoria desde la caché en disco.
+    grafo : nx.MultiDiGraph
+        Grafo de networkx reconstruido a partir de `compacto`.
+    bytes_grafo : int
+        Estimación de la memoria ocupada por `grafo`.
+    jerarquia : JerarquiaContraccion or None
+        Jerarquía de contracción vigente guardada junto al grafo, si se ha preprocesado.
+    """
+
+    def __init__(self, compacto: GrafoCompacto, network_type: str, directorio: str) -> None:
+        self.compacto = compacto
+        self.network_type = network_type
+        self.directorio = directorio
+        self.grafo = compacto.a_networkx()
+        self.bytes_grafo = _estimar_bytes(self.grafo)
+        self._motor: Optional[MotorRutas] = None
+        self._indice: Optional[IndiceNodos] = None
+        self.jerarquia = self._cargar_jerarquia()
+
+    @property
+    def motor(self) -> MotorRutas:
+        """Motor de caminos mínimos CSR del grafo, construido la primera vez que se usa."""
+        if self._motor is None:
+            self._motor = MotorRutas(self.compacto, VELOCIDADES_KMH[self.network_type])
+        return self._motor
+
+    @property
+    def indice(self) -> IndiceNodos:
+        """Índice espacial de los nodos, cargado de disco o construido la primera vez que se usa."""
+        if self._indice is None:
+            self._indice = IndiceNodos.cargar_o_construir(self.compacto, self.directorio)
+        return self._indice
+
+    def nodos_cercanos(self, puntos: Iterable[Tuple[float, float]]) -> List[int]:
+        """Nodos OSM más cercanos a cada punto (lat, lon), calculados en una sola consulta."""
+        return self.indice.nodos_cercanos(puntos).tolist()
+
+    def ruta_mas_corta(self, origen: int, destino: int) -> Tuple[List[int], float]:
+        """
+        Camino mínimo en longitud entre dos nodos OSM y su longitud en metros.
+
+        Usa la jerarquía de contracción si existe y es vigente; si no, el A* del motor.
+        """
+        if self.jerarquia is None:
+            return self.motor.ruta_mas_corta(origen, destino)
+        motor = self.motor
+        camino, longitud = self.jerarquia.ruta_mas_corta(motor.indice(origen), motor.indice(destino))
+        return [motor.nodos[i].item() for i in camino], longitud
+
+    def caminos_desde(self, origen: int, destinos: Iterable[int]) -> Dict[int, Tuple[List[int], float]]:
+        """Caminos mínimos (nodos, metros) desde un nodo a varios destinos con un solo Dijkstra."""
+        return self.motor.caminos_desde(origen, destinos)
+
+    def _cargar_jerarquia(self) -> Optional[JerarquiaContraccion]:
+        """Carga la jerarquía del directorio de la entrada, descartándola si está obsoleta."""
+        try:
+            jerarquia = JerarquiaContraccion.cargar(self.directorio)
+        except Exception as e:
+            print(f"⚠️ Error al cargar la jerarquía de '{self.network_type}': {str(e)}")
+            return None
+        if jerarquia is not None and not jerarquia.vigente(self.compacto.huella()):
+            print(f"⚠️ Jerarquía de '{self.network_type}' obsoleta; se usará Dijkstra")
+            return None
+        return jerarquia
+
+
+class RegistroGrafos:
+    """
+    Mantiene un único grafo por tipo de red que cubre toda la zona de servicio.
+
+    Los grafos se cargan una sola vez (desde la caché en disco o, si no existen,
+    desde OpenStreetMap) y se reutilizan en todas las peticiones. Es seguro usarlo
+    desde varios hilos.
+
+    Parameters
+    ----------
+    cache : CacheGrafos, optional
+        Caché en disco de la que se cargan los grafos.
+    bbox : tuple, optional
+        Zona de servicio (sur, norte, oeste, este).
+    margen : float, optional
+        Metros añadidos a cada lado de la bbox.
+    """
+
+    def __init__(self, cache: Optional[CacheGrafos] = None,
+                 bbox: Tuple[float, float, float, float] = LIMITES_ALICANTE,
+                 margen: float = MARGEN_METROS) -> None:
+        self.cache = cache or obtener_cache()
+        sur, norte, oeste, este = bbox
+        margen_lat = margen / METROS_POR_GRADO
+        margen_lon = margen / (METROS_POR_GRADO * math.cos(math.radians((sur + norte) / 2)))
+        self.bbox = (sur - margen_lat, norte + margen_lat, oeste - margen_lon, este + margen_lon)
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas: Dict[str, EntradaRegistro] = {}
+        self._externas: "OrderedDict[Tuple[tuple, str], EntradaRegistro]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks_carga: Dict[str, threading.Lock] = {modo: threading.Lock() for modo in MODOS_TRANSPORTE}
+
+    def cubre(self, punto: Tuple[float, float]) -> bool:
+        """Indica si el punto (lat, lon) está dentro de la zona cubierta por el registro."""
+        sur, norte, oeste, este = self.bbox
+        lat, lon = punto
+        return sur <= lat <= norte and oeste <= lon <= este
+
+    def entrada(self, network_type: str) -> EntradaRegistro:
+        """
+        Devuelve la entrada del tipo de red, cargándola la primera vez que se pide.
+
+        Raises
+        ------
+        ValueError
+            Si el tipo de red no es válido.
+        """
+        if network_type not in self._locks_carga:
+            raise ValueError("Modo de transporte no válido. Usa 'walk', 'bike' o 'drive'.")
+
+        with self._lock:
+            entrada = self._entradas.get(network_type)
+            if entrada is not None:
+                self.aciertos += 1
+                return entrada
+
+        # Se carga fuera del lock global para no bloquear los demás tipos de red
+        with self._locks_carga[network_type]:
+            with self._lock:
+                entrada = self._entradas.get(network_type)
+                if entrada is not None:
+                    self.aciertos += 1
+                    return entrada
+                self.fallos += 1
+            entrada = EntradaRegistro(self.cache.obtener_compacto(self.bbox, network_type), network_type,
+                                      self.cache.ruta_entrada(self.bbox, network_type))
+            with self._lock:
+                self._entradas[network_type] = entrada
+            return entrada
+
+    def entrada_externa(self, bbox: Tuple[float, float, float, float], network_type: str) -> EntradaRegistro:
+        """
+        Entrada del grafo de la caché en disco para una bbox de fuera de la zona de servicio.
+
+        Las últimas `MAXIMO_ENTRADAS_EXTERNAS` se guardan por (bbox, tipo de red), de modo
+        que las rutas de una misma zona no vuelven a reconstruir el grafo.
+        """
+        clave = (bbox, network_type)
+        with self._lock:
+            entrada = self._externas.get(clave)
+            if entrada is not None:
+                self._externas.move_to_end(clave)
+                return entrada
+        entrada = EntradaRegistro(self.cache.obtener_compacto(bbox, network_type), network_type,
+                                  self.cache.ruta_entrada(bbox, network_type))
+        with self._lock:
+            # Si otro hilo la ha cargado a la vez, se usa la suya
+            entrada = self._externas.setdefault(clave, entrada)
+            self._externas.move_to_end(clave)
+            while len(self._externas) > MAXIMO_ENTRADAS_EXTERNAS:
+                self._externas.popitem(last=False)
+        return entrada
+
+    def obtener(self, network_type: str) -> nx.MultiDiGraph:
+        """Devuelve el grafo compartido del tipo de red indicado."""
+        return self.entrada(network_type).grafo
+
+    def precargar(self, tipos: Iterable[str] = MODOS_TRANSPORTE) -> None:
+        """Carga por adelantado los grafos de los tipos de red indicados."""
+        for network_type in tipos:
+            self.entrada(network_type)
+
+    def estadisticas(self) -> dict:
+        """
+        Devuelve aciertos, fallos y memoria ocupada por cada grafo cargado.
+
+        Returns
+        -------
+        dict
+        """
+        with self._lock:
+            grafos = {
+                modo: {
+                    "nodos": entrada.grafo.number_of_nodes(),
+                    "aristas": entrada.grafo.number_of_edges(),
+                    "bytes_arrays": entrada.compacto.nbytes,
+                    "bytes_grafo": entrada.bytes_grafo,
+                }
+                for modo, entrada in self._entradas.items()
+            }
+            return {"aciertos": self.aciertos, "fallos": self.fallos, "grafos": grafos}
+
+
+def _estimar_bytes(grafo: nx.MultiDiGraph) -> int:
+    """Estimación aproximada de la memoria de un grafo de networkx (diccionarios y atributos)."""
+    total = sys.getsizeof(grafo._node) + sys.getsizeof(grafo._adj) + sys.getsizeof(grafo._pred)
+    for nodo, datos in grafo._node.items():
+        total += sys.getsizeof(nodo) + sys.getsizeof(datos)
+    for vecinos in grafo._adj.values():
+        total += sys.getsizeof(vecinos)
+        for aristas in vecinos.values():
+            total += sys.getsizeof(aristas) + sum(sys.getsizeof(d) for d in aristas.values())
+    for vecinos in grafo._pred.values():
+        total += sys.getsizeof(vecinos)
+    return total
+
+
+_registro: Optional[RegistroGrafos] = None
+_registro_lock = threading.Lock()
+
+
+def obtener_registro() -> RegistroGrafos:
+    """Devuelve la instancia del registro compartida por todo el proceso."""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroGrafos()
+        return _registro
+
+
+def entrada_para_puntos(network_type: str, puntos: Iterable[Tuple[float, float]],
+                        dist: float = 5000) -> EntradaRegistro:
+    """
+    Devuelve la entrada compartida si todos los puntos están en la zona de servicio y,
+    si no, la entrada (guardada en el registro) con el grafo de la caché en disco que
+    cubre `dist` metros alrededor del primero.
+
+    Parameters
+    ----------
+    network_type : str
+        Tipo de red ("walk", "bike" o "drive").
+    puntos : Iterable[Tuple[float, float]]
+        Coordenadas (lat, lon) de la ruta; el primero es el origen.
+    dist : float, optional
+        Radio en metros usado fuera de la zona de servicio.
+
+    Returns
+    -------
+    EntradaRegistro
+    """
+    puntos = list(puntos)
+    registro = obtener_registro()
+    if all(registro.cubre(p) for p in puntos):
+        return registro.entrada(network_type)
+    return registro.entrada_externa(registro.cache.bbox_para_punto(puntos[0], dist), network_type)
+
+
+def grafo_para_puntos(network_type: str, puntos: Iterable[Tuple[float, float]],
+                      dist: float = 5000) -> nx.MultiDiGraph:
+    """Atajo para `entrada_para_puntos(...).grafo`."""
+    return entrada_para_puntos(network_type, puntos, dist).grafo
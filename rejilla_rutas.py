@@ -0,0 +1,186 @@
+"""Índice espacial de rutas en una rejilla de celdas (al estilo geohash) para buscar rutas cercanas."""
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Lado de cada celda en grados (unos 1,1 km de latitud)
+TAMANO_CELDA = 0.01
+
+# Separación máxima, en grados, entre los puntos muestreados a lo largo de una ruta
+PASO_MUESTREO = TAMANO_CELDA / 2
+
+# Radio medio de la Tierra en km
+RADIO_TIERRA_KM = 6371.009
+
+
+def puntos_ruta(ruta: Dict[str, Any]) -> np.ndarray:
+    """
+    Puntos (lat, lon) conocidos de una ruta, en orden: origen, puntos intermedios y destino,
+    más la "ubicacion" si no hay ninguno. Los tramos entre paradas se muestrean en línea
+    recta cada `PASO_MUESTREO` grados para que la ruta ocupe todas las celdas que cruza.
+
+    Las coordenadas (0, 0) se consideran "sin geocodificar" y se descartan.
+    """
+    paradas = []
+    for punto in [ruta.get("origen")] + list(ruta.get("puntos_intermedios") or []) + [ruta.get("destino")]:
+        if isinstance(punto, dict) and punto.get("lat") is not None and punto.get("lng") is not None:
+            paradas.append((float(punto["lat"]), float(punto["lng"])))
+    paradas = [p for p in paradas if p != (0.0, 0.0)]
+    ubicacion = ruta.get("ubicacion")
+    if not paradas and isinstance(ubicacion, (list, tuple)) and len(ubicacion) == 2:
+        paradas.append((float(ubicacion[0]), float(ubicacion[1])))
+    if len(paradas) < 2:
+        return np.asarray(paradas, dtype=np.float64).reshape(-1, 2)
+
+    tramos = [np.asarray(paradas[:1])]
+    for inicio, fin in zip(paradas[:-1], paradas[1:]):
+        pasos = max(1, int(math.ceil(max(abs(fin[0] - inicio[0]), abs(fin[1] - inicio[1])) / PASO_MUESTREO)))
+        t = np.arange(1, pasos + 1)[:, None] / pasos
+        tramos.append(np.asarray(inicio) + t * (np.asarray(fin) - np.asarray(inicio)))
+    return np.vstack(tramos)
+
+
+def distancias_km(lat: float, lon: float, puntos: np.ndarray) -> np.ndarray:
+    """Distancia haversine en km desde (lat, lon) a cada punto de un array n x 2."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(puntos[:, 0]), np.radians(puntos[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RejillaRutas:
+    """
+    Índice espacial de rutas: cada ruta se registra en las celdas de la rejilla que tocan
+    sus puntos muestreados, y una búsqueda solo examina las rutas de las celdas que cubren
+    la zona pedida, en lugar de todas las rutas.
+
+    Parameters
+    ----------
+    tamano_celda : float, optional
+        Lado de las celdas en grados.
+    """
+
+    def __init__(self, tamano_celda: float = TAMANO_CELDA) -> None:
+        self.tamano_celda = tamano_celda
+        self._celdas: Dict[Tuple[int, int], Set[str]] = {}
+        self._puntos: Dict[str, np.ndarray] = {}
+        self._celdas_ruta: Dict[str, Set[Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._puntos)
+
+    def _celda(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (int(math.floor(lat / self.tamano_celda)), int(math.floor(lon / self.tamano_celda)))
+
+    def _celdas_caja(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> Iterable[Tuple[int, int]]:
+        """Celdas que cubren una caja."""
+        i_min, j_min = self._celda(lat_min, lon_min)
+        i_max, j_max = self._celda(lat_max, lon_max)
+        for i in range(i_min, i_max + 1):
+            for j in range(j_min, j_max + 1):
+                yield (i, j)
+
+    def _quitar(self, nombre: str) -> None:
+        for celda in self._celdas_ruta.pop(nombre, ()):
+            nombres = self._celdas[celda]
+            nombres.discard(nombre)
+            if not nombres:
+                del self._celdas[celda]
+        self._puntos.pop(nombre, None)
+
+    def actualizar(self, rutas: Iterable[Dict[str, Any]], eliminadas: Iterable[str] = ()) -> None:
+        """
+        Añade o sustituye rutas y elimina otras por nombre. Las rutas sin coordenadas
+        conocidas no se indexan.
+
+        Parameters
+        ----------
+        rutas : Iterable[Dict[str, Any]]
+            Rutas nuevas o modificadas; deben tener "nombre".
+        eliminadas : Iterable[str], optional
+            Nombres de las rutas que ya no existen.
+        """
+        with self._lock:
+            for nombre in eliminadas:
+                self._quitar(nombre)
+            for ruta in rutas:
+                self._quitar(ruta["nombre"])
+                puntos = puntos_ruta(ruta)
+                if not len(puntos):
+                    continue
+                celdas = {self._celda(lat, lon) for lat, lon in puntos}
+                for celda in celdas:
+                    self._celdas.setdefault(celda, set()).add(ruta["nombre"])
+                self._puntos[ruta["nombre"]] = puntos
+                self._celdas_ruta[ruta["nombre"]] = celdas
+
+    def _candidatas(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> Set[str]:
+        """Rutas registradas en alguna celda de la caja."""
+        candidatas: Set[str] = set()
+        i_min, j_min = self._celda(lat_min, lon_min)
+        i_max, j_max = self._celda(lat_max, lon_max)
+        if (i_max - i_min + 1) * (j_max - j_min + 1) > len(self._celdas):
+            # Caja muy grande: es más barato recorrer solo las celdas ocupadas
+            for (i, j), nombres in self._celdas.items():
+                if i_min <= i <= i_max and j_min <= j <= j_max:
+                    candidatas.update(nombres)
+            return candidatas
+        for celda in self._celdas_caja(lat_min, lon_min, lat_max, lon_max):
+            candidatas.update(self._celdas.get(celda, ()))
+        return candidatas
+
+    def cerca(self, lat: float, lon: float, radio_km: float, limite: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Rutas que pasan a menos de `radio_km` de un punto.
+
+        Parameters
+        ----------
+        lat, lon : float
+            Punto de búsqueda.
+        radio_km : float
+            Distancia máxima en km.
+        limite : int, optional
+            Número máximo de rutas.
+
+        Returns
+        -------
+        List[Tuple[str, float]]
+            Nombre de cada ruta y distancia en km a su punto más cercano, de menor a mayor.
+        """
+        margen_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+        # Cerca de los polos la caja abarca todas las longitudes
+        coseno = math.cos(math.radians(min(abs(lat) + margen_lat, 89.9)))
+        margen_lon = min(180.0, margen_lat / coseno)
+        with self._lock:
+            candidatas = self._candidatas(lat - margen_lat, lon - margen_lon, lat + margen_lat, lon + margen_lon)
+            resultado = []
+            for nombre in candidatas:
+                distancia = float(distancias_km(lat, lon, self._puntos[nombre]).min())
+                if distancia <= radio_km:
+                    resultado.append((nombre, distancia))
+        resultado.sort(key=lambda par: (par[1], par[0]))
+        return resultado if limite is None else resultado[:limite]
+
+    def en_caja(self, lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> List[str]:
+        """
+        Rutas con algún punto dentro de una caja (por ejemplo, la vista actual de un mapa).
+
+        Returns
+        -------
+        List[str]
+            Nombres de las rutas, ordenados.
+        """
+        if lat_min > lat_max or lon_min > lon_max:
+            raise ValueError("La caja debe ser lat_min,lon_min,lat_max,lon_max")
+        with self._lock:
+            resultado = []
+            for nombre in self._candidatas(lat_min, lon_min, lat_max, lon_max):
+                puntos = self._puntos[nombre]
+                dentro = ((puntos[:, 0] >= lat_min) & (puntos[:, 0] <= lat_max)
+                          & (puntos[:, 1] >= lon_min) & (puntos[:, 1] <= lon_max))
+                if dentro.any():
+                    resultado.append(nombre)
+        return sorted(resultado)
@@ -1,10 +1,13 @@
 import json
 from datetime import datetime
 from typing import List, Optional
-import osmnx as ox
 import networkx as nx
 import time
 from geocodificador import Geocodificador
+from registro_grafos import entrada_para_puntos
+from motor_rutas import VELOCIDADES_KMH
+from catalogo_rutas import obtener_catalogo
+from esquema_rutas import crear_ruta, punto_geocodificado
 from utils import *
 import os
 
@@ -97,19 +100,22 @@ class Ruta:
         self.destino_nombre = destino
         self.puntos_intermedios_nombres = puntos_intermedios.copy() if puntos_intermedios else []
 
-        # Obtener coordenadas
+        # Obtener coordenadas de todas las direcciones en un solo lote
         try:
-            self.origen = self.geocodificador.obtener_coordenadas(origen)
+            coordenadas = self.geocodificador.obtener_coordenadas_lote(
+                [origen, destino] + self.puntos_intermedios_nombres
+            )
+            self.origen, self.destino = coordenadas[0], coordenadas[1]
             if not self.origen:
                 raise ValueError(f"No se pudo geocodificar el origen: {origen}")
             
-            self.destino = self.geocodificador.obtener_coordenadas(destino)
             if not self.destino:
                 raise ValueError(f"No se pudo geocodificar el destino: {destino}")
             
+            # Alineadas con puntos_intermedios_nombres (None si no se pudo geocodificar)
+            self.coordenadas_intermedios = list(coordenadas[2:])
             self.puntos_intermedios = []
-            for punto in self.puntos_intermedios_nombres:
-                coords = self.geocodificador.obtener_coordenadas(punto)
+            for punto, coords in zip(self.puntos_intermedios_nombres, coordenadas[2:]):
                 if coords:
                     self.puntos_intermedios.append(coords)
                 else:
@@ -121,25 +127,78 @@ class Ruta:
         except Exception as e:
             raise Exception(f"Error al inicializar la ruta: {str(e)}")
 
+    @classmethod
+    def desde_tramos(cls, nombre: str, ubicacion: tuple, direcciones: List[str], coordenadas: List[tuple],
+                     modo_transporte: str, grafo: nx.MultiDiGraph, rutas: List[List[int]],
+                     distancias: List[float]) -> "Ruta":
+        """
+        Crea una ruta a partir de tramos ya calculados, sin geocodificar ni buscar caminos.
+
+        Parameters
+        ----------
+        nombre : str
+            Nombre de la ruta.
+        ubicacion : tuple
+            Coordenadas aproximadas de la ruta.
+        direcciones : List[str]
+            Direcciones en orden de visita (origen, intermedios y destino).
+        coordenadas : List[tuple]
+            Coordenadas (lat, lon) de cada dirección, en el mismo orden.
+        modo_transporte : str
+            "walk", "bike" o "drive".
+        grafo : nx.MultiDiGraph
+            Grafo sobre el que se calcularon los tramos.
+        rutas : List[List[int]]
+            Nodos de cada tramo.
+        distancias : List[float]
+            Distancia de cada tramo en km.
+
+        Returns
+        -------
+        Ruta
+        """
+        ruta = cls.__new__(cls)
+        ruta.nombre = nombre
+        ruta.ubicacion = ubicacion
+        ruta.dificultad = "bajo"
+        ruta.alt_max = 0
+        ruta.alt_min = 0
+        ruta.fecha_registro = datetime.now()
+        ruta.modo_transporte = modo_transporte
+        ruta.timestamp = int(time.time())
+        ruta.origen_nombre = direcciones[0]
+        ruta.destino_nombre = direcciones[-1]
+        ruta.puntos_intermedios_nombres = list(direcciones[1:-1])
+        ruta.origen = coordenadas[0]
+        ruta.destino = coordenadas[-1]
+        ruta.puntos_intermedios = list(coordenadas[1:-1])
+        ruta.coordenadas_intermedios = list(coordenadas[1:-1])
+        ruta.grafo = grafo
+        ruta.rutas = rutas
+        ruta.distancias = distancias
+        ruta.tiempos_estimados = [d / VELOCIDADES_KMH[modo_transporte] for d in distancias]
+        ruta.calcular_metricas()
+        return ruta
+
     def calcular_rutas_y_grafo(self):
         """Calcula el grafo y las rutas óptimas entre los puntos."""
         try:
-            # Crear grafo centrado en el origen
-            self.grafo = ox.graph_from_point(self.origen, dist=5000, network_type=self.modo_transporte)
-            nodo_origen = ox.nearest_nodes(self.grafo, self.origen[1], self.origen[0])
-            nodo_destino = ox.nearest_nodes(self.grafo, self.destino[1], self.destino[0])
-            nodos_intermedios = [ox.nearest_nodes(self.grafo, p[1], p[0]) for p in self.puntos_intermedios]
-            ruta_nodos = [nodo_origen] + nodos_intermedios + [nodo_destino]
+            # Grafo compartido de Alicante o, fuera de la zona, el de la caché en disco
+            puntos = [self.origen] + self.puntos_intermedios + [self.destino]
+            entrada = entrada_para_puntos(self.modo_transporte, puntos, dist=5000)
+            self.grafo = entrada.grafo
+            # Todos los puntos se ajustan a su nodo más cercano en una sola consulta
+            ruta_nodos = entrada.nodos_cercanos(puntos)
             self.rutas = []
             self.distancias = []
             self.tiempos_estimados = []
             for i in range(len(ruta_nodos) - 1):
-                subruta = nx.shortest_path(self.grafo, ruta_nodos[i], ruta_nodos[i + 1], weight='length')
+                # Camino y longitud en una sola búsqueda (jerarquía de contracción o A* CSR)
+                subruta, longitud = entrada.ruta_mas_corta(ruta_nodos[i], ruta_nodos[i + 1])
                 self.rutas.append(subruta)
-                distancia_km = nx.shortest_path_length(self.grafo, ruta_nodos[i], ruta_nodos[i + 1], weight='length') / 1000
+                distancia_km = longitud / 1000
                 self.distancias.append(distancia_km)
-                velocidad = {'walk': 5, 'bike': 15, 'drive': 60}
-                tiempo_horas = distancia_km / velocidad[self.modo_transporte]
+                tiempo_horas = distancia_km / VELOCIDADES_KMH[self.modo_transporte]
                 self.tiempos_estimados.append(tiempo_horas)
         except Exception as e:
             print(f"⚠️ Error al calcular rutas y grafo: {str(e)}")
@@ -220,30 +279,43 @@ class Ruta:
             raise ValueError("Modo de transporte no válido. Usa 'walk', 'bike' o 'drive'.")
         return self.distancia / velocidad[self.modo_transporte]
 
-    def guardar_en_json(self) -> None:
+    def paradas_esquema(self) -> tuple:
+        """
+        Origen, puntos intermedios y destino en el formato del esquema de rutas: la
+        dirección escrita por el usuario junto a sus coordenadas geocodificadas.
+        """
+        coordenadas = getattr(self, 'coordenadas_intermedios', None) or [None] * len(self.puntos_intermedios_nombres)
+        return (
+            punto_geocodificado(self.origen_nombre, self.origen),
+            [punto_geocodificado(n, c) for n, c in zip(self.puntos_intermedios_nombres, coordenadas)],
+            punto_geocodificado(self.destino_nombre, self.destino)
+        )
+
+    def guardar_en_json(self, exportar: bool = True) -> None:
         """
         Calcula propiedades de la ruta y guarda los datos en un archivo JSON.
         Además, genera los archivos GPX, HTML, PDF y PNG correspondientes.
+
+        Parameters
+        ----------
+        exportar : bool, optional
+            Si es False, solo se guardan el JSON y el catálogo; lo usa quien exporta
+            los archivos por su cuenta (p. ej. RutaAuto, en la carpeta static).
         """
         try:
-            # Formatear distancia y duración
-            distancia_str = f"{self.distancia:.2f} km"
-            horas = int(self.duracion)
-            minutos = int((self.duracion - horas) * 60)
-            duracion_str = f"{horas} h {minutos} min" if horas > 0 else f"{minutos} min"
-
-            datos_ruta = {
-                "nombre": self.nombre,
-                "ubicacion": self.ubicacion,
-                "distancia": distancia_str,
-                "duracion": duracion_str,
-                "dificultad": self.dificultad,
-                "fecha_registro": self.fecha_registro.strftime("%Y-%m-%d %H:%M:%S"),
-                "origen": self.origen_nombre,
-                "puntos_intermedios": self.puntos_intermedios_nombres,
-                "destino": self.destino_nombre,
-                "modo_transporte": self.modo_transporte
-            }
+            origen, puntos_intermedios, destino = self.paradas_esquema()
+            datos_ruta = crear_ruta(
+                nombre=self.nombre,
+                origen=origen,
+                destino=destino,
+                puntos_intermedios=puntos_intermedios,
+                modo=self.modo_transporte,
+                distancia_km=self.distancia,
+                duracion_horas=self.duracion,
+                dificultad=self.dificultad,
+                ubicacion=self.ubicacion,
+                fecha_creacion=self.fecha_registro.strftime("%Y-%m-%d %H:%M:%S")
+            )
 
             # Asegurar que el directorio existe
             try:
@@ -260,8 +332,14 @@ class Ruta:
                 print(f"⚠️ Error al guardar el archivo JSON: {str(e)}")
                 raise
 
+            # Registrar la ruta en el catálogo
+            try:
+                obtener_catalogo().guardar(datos_ruta)
+            except Exception as e:
+                print(f"⚠️ Error al guardar la ruta en el catálogo: {str(e)}")
+
             # Exportar archivos adicionales SOLO si el grafo y rutas existen
-            if hasattr(self, 'grafo') and self.grafo and hasattr(self, 'rutas') and self.rutas:
+            if exportar and hasattr(self, 'grafo') and self.grafo and hasattr(self, 'rutas') and self.rutas:
                 try:
                     if 'exportar_gpx' in globals():
                         exportar_gpx(self.puntos_intermedios, self.nombre)
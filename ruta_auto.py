@@ -1,10 +1,19 @@
 from ruta import Ruta
+from geocodificador import Geocodificador
 import random
 import os
-from typing import List
+from typing import List, Optional
 import time
 import sqlite3
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from matriz_distancias import matriz_distancias
+from optimizador_recorridos import mejores_recorridos
+from particionado_rutas import TIEMPO_MAXIMO_PARTICION, particionar
+from registro_grafos import entrada_para_puntos, obtener_registro
 from utils import exportar_pdf, generar_mapa
 
 # Rutas en PythonAnywhere
@@ -12,6 +21,58 @@ PYTHONANYWHERE_BASE = "/home/RA55/gestor_de_rutas"
 RUTAS_DIR = os.path.join(PYTHONANYWHERE_BASE, "rutas")
 STATIC_DIR = os.path.join(PYTHONANYWHERE_BASE, "static")
 
+MODO_TRANSPORTE = "walk"
+
+# Procesos con los que se generan las rutas candidatas (0 o 1: en el propio proceso)
+PROCESOS_RUTAS = int(os.environ.get("RUTAS_AUTO_PROCESOS", "0"))
+
+_ejecutor: Optional[ProcessPoolExecutor] = None
+_ejecutor_lock = threading.Lock()
+
+
+def _inicializar_trabajador(network_type: str) -> None:
+    """Carga una sola vez por proceso el grafo de la zona de servicio del registro."""
+    obtener_registro().entrada(network_type)
+
+
+def _crear_ruta_en_trabajador(directorio: str, nombre_ruta: str, direcciones: List[str], coordenadas: List[tuple],
+                              puntos_grafo: List[tuple], tramos: List[List[int]], distancias: List[float],
+                              username: Optional[str]):
+    """
+    Monta, guarda y exporta una ruta candidata dentro de un proceso del pool.
+
+    El registro del proceso ya tiene cargada la zona de servicio y guarda las entradas
+    de fuera de ella, así que las tareas de una misma zona no reconstruyen el grafo.
+    """
+    entrada = entrada_para_puntos(MODO_TRANSPORTE, puntos_grafo, dist=5000)
+    return RutaAuto(directorio)._montar_ruta(nombre_ruta, direcciones, coordenadas,
+                                             entrada, tramos, distancias, username)
+
+
+def obtener_ejecutor(procesos: int) -> ProcessPoolExecutor:
+    """
+    Devuelve el pool de procesos compartido por todas las peticiones del proceso.
+
+    Se crea la primera vez que se pide, con `procesos` trabajadores que cargan el grafo
+    al arrancar, y se reutiliza hasta que termina el programa.
+    """
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_trabajador,
+                                            initargs=(MODO_TRANSPORTE,))
+            atexit.register(_ejecutor.shutdown)
+        return _ejecutor
+
+
+def _descartar_ejecutor(ejecutor: ProcessPoolExecutor) -> None:
+    """Olvida el pool compartido si algún proceso murió, para crear otro en la siguiente petición."""
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is ejecutor:
+            _ejecutor = None
+    ejecutor.shutdown(wait=False)
+
 class RutaAuto:
     def __init__(self, directorio: str = RUTAS_DIR) -> None:
         self.directorio = directorio
@@ -20,109 +81,264 @@ class RutaAuto:
         self.grafo = None
         self.timestamp = None
 
-    def generar_rutas_desde_direcciones(self, direcciones: List[str], cantidad: int = 5, username: str = None) -> List[str]:
+    def _preparar(self, direcciones: List[str]):
+        """
+        Geocodifica y ajusta al grafo una sola vez todas las direcciones y calcula su
+        matriz de distancias.
+
+        Returns
+        -------
+        tuple
+            (direcciones válidas, coordenadas, entrada del registro, matriz de distancias)
+        """
+        if len(direcciones) < 2:
+            raise ValueError("Se necesitan al menos 2 direcciones para generar una ruta")
+
+        coordenadas = Geocodificador().obtener_coordenadas_lote(direcciones)
+        validas = [(d, c) for d, c in zip(direcciones, coordenadas) if c]
+        if len(validas) < 2:
+            raise ValueError("Se necesitan al menos 2 direcciones geocodificables para generar una ruta")
+        direcciones = [d for d, _ in validas]
+        coordenadas = [c for _, c in validas]
+
+        entrada = entrada_para_puntos(MODO_TRANSPORTE, coordenadas, dist=5000)
+        self.grafo = entrada.grafo
+        matriz = matriz_distancias(coordenadas, MODO_TRANSPORTE, entrada=entrada)
+        return direcciones, coordenadas, entrada, matriz
+
+    def _crear_ruta(self, nombre_ruta: str, orden: List[int], direcciones: List[str], coordenadas: List[tuple],
+                    entrada, matriz, username: Optional[str]):
+        """Monta la ruta con los tramos de la matriz, la guarda y la exporta."""
+        tramos = self._tramos(nombre_ruta, orden, matriz)
+        if isinstance(tramos, str):
+            return tramos
+        return self._montar_ruta(nombre_ruta, [direcciones[k] for k in orden], [coordenadas[k] for k in orden],
+                                 entrada, *tramos, username)
+
+    @staticmethod
+    def _tramos(nombre_ruta: str, orden: List[int], matriz):
+        """Caminos y distancias de cada tramo del orden de visita, o un mensaje si falta alguno."""
+        pares = list(zip(orden, orden[1:]))
+        if not all(matriz.alcanzable(a, b) for a, b in pares):
+            return f"❌ No hay camino entre todas las direcciones de '{nombre_ruta}'"
+        return [matriz.camino(a, b) for a, b in pares], [float(matriz.km[a, b]) for a, b in pares]
+
+    def _montar_ruta(self, nombre_ruta: str, direcciones: List[str], coordenadas: List[tuple], entrada,
+                     tramos: List[List[int]], distancias: List[float], username: Optional[str]):
+        """Monta la ruta a partir de sus tramos (en orden de visita), la guarda y la exporta."""
+        ruta = Ruta.desde_tramos(
+            nombre=nombre_ruta,
+            ubicacion=coordenadas[0],
+            direcciones=direcciones,
+            coordenadas=coordenadas,
+            modo_transporte=MODO_TRANSPORTE,
+            grafo=entrada.grafo,
+            rutas=tramos,
+            distancias=distancias
+        )
+        self.rutas.append(ruta)
+
+        # Guardar el JSON; el PDF y el HTML se exportan una sola vez, abajo
+        ruta.guardar_en_json(exportar=False)
+
+        # Exportar PDF y HTML a la carpeta static de PythonAnywhere
         try:
-            if len(direcciones) < 2:
-                raise ValueError("Se necesitan al menos 2 direcciones para generar una ruta")
+            # Asegurar que los directorios existen
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            
+            # Exportar PDF
+            pdf_path = os.path.join(STATIC_DIR, f"{nombre_ruta}.pdf")
+            pdf = exportar_pdf(
+                ruta.distancias,
+                ruta.tiempos_estimados,
+                ruta.modo_transporte,
+                ruta.nombre,
+                ruta.origen,
+                ruta.puntos_intermedios,
+                ruta.destino
+            )
+            with open(pdf_path, "wb") as f:
+                f.write(pdf)
+            
+            # Exportar HTML
+            html_path = os.path.join(STATIC_DIR, f"rutas_{nombre_ruta}.html")
+            html = generar_mapa(
+                ruta.origen,
+                ruta.puntos_intermedios,
+                ruta.destino,
+                ruta.rutas,
+                ruta.grafo,
+                ruta.nombre
+            )
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(html)
 
-            rutas_generadas = []
-            for i in range(cantidad):
-                direcciones_mezcladas = direcciones.copy()
-                random.shuffle(direcciones_mezcladas)
-                nombre_ruta = f"Ruta_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i+1}"
-
-                # Crear objeto RutaManual
-                ruta = Ruta(
-                    nombre=nombre_ruta,
-                    ubicacion=(random.uniform(38.3, 38.4), random.uniform(-0.5, -0.3)),
-                    distancia=10.0,
-                    duracion=2.0,
-                    dificultad="medio",
-                    alt_max=0,
-                    alt_min=0,
-                    origen=direcciones_mezcladas[0],
-                    puntos_intermedios=[],
-                    destino=direcciones_mezcladas[-1],
-                    modo_transporte="walk"
-                )
-
-                # Simular datos mínimos para exportar PDF y HTML
-                ruta.rutas = [[0, 1]]
-                ruta.distancias = [ruta.distancia]
-                ruta.tiempos_estimados = [ruta.duracion]
-                ruta.grafo = None  # No se usa en el HTML de ejemplo
-
-                # Guardar el JSON y exportar archivos
-                ruta.guardar_en_json()
-
-                # Exportar PDF y HTML a la carpeta static de PythonAnywhere
-                try:
-                    # Asegurar que los directorios existen
-                    os.makedirs(STATIC_DIR, exist_ok=True)
+            # Asociar la ruta al usuario en la base de datos SQLite
+            if username:
+                conn = sqlite3.connect('usuarios.db')
+                cursor = conn.cursor()
+                
+                # Obtener el ID del usuario
+                cursor.execute('SELECT id FROM usuarios WHERE username = ?', (username,))
+                usuario = cursor.fetchone()
+                
+                if usuario:
+                    # Insertar la relación usuario-ruta
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO usuario_rutas (
+                            usuario_id, nombre_ruta, created_at
+                        ) VALUES (?, ?, ?)
+                    ''', (
+                        usuario[0],
+                        nombre_ruta,
+                        datetime.now().isoformat()
+                    ))
                     
-                    # Exportar PDF
-                    pdf_path = os.path.join(STATIC_DIR, f"{nombre_ruta}.pdf")
-                    pdf = exportar_pdf(
-                        ruta.distancias,
-                        ruta.tiempos_estimados,
-                        ruta.modo_transporte,
-                        ruta.nombre,
-                        ruta.origen,
-                        ruta.puntos_intermedios,
-                        ruta.destino
-                    )
-                    with open(pdf_path, "wb") as f:
-                        f.write(pdf)
-                    
-                    # Exportar HTML
-                    html_path = os.path.join(STATIC_DIR, f"rutas_{nombre_ruta}.html")
-                    html = generar_mapa(
-                        ruta.origen,
-                        ruta.puntos_intermedios,
-                        ruta.destino,
-                        ruta.rutas,
-                        ruta.grafo,
-                        ruta.nombre
-                    )
-                    with open(html_path, "w", encoding="utf-8") as f:
-                        f.write(html)
-
-                    # Asociar la ruta al usuario en la base de datos SQLite
-                    if username:
-                        conn = sqlite3.connect('usuarios.db')
-                        cursor = conn.cursor()
-                        
-                        # Obtener el ID del usuario
-                        cursor.execute('SELECT id FROM usuarios WHERE username = ?', (username,))
-                        usuario = cursor.fetchone()
-                        
-                        if usuario:
-                            # Insertar la relación usuario-ruta
-                            cursor.execute('''
-                                INSERT OR REPLACE INTO usuario_rutas (
-                                    usuario_id, nombre_ruta, created_at
-                                ) VALUES (?, ?, ?)
-                            ''', (
-                                usuario[0],
-                                nombre_ruta,
-                                datetime.now().isoformat()
-                            ))
-                            
-                            conn.commit()
-                        conn.close()
-
-                    rutas_generadas.append({
-                        "nombre": nombre_ruta,
-                        "archivos": {
-                            "pdf": f"https://ra55.pythonanywhere.com/static/{nombre_ruta}.pdf",
-                            "html": f"https://ra55.pythonanywhere.com/static/rutas_{nombre_ruta}.html"
-                        }
-                    })
-                except Exception as e:
-                    print(f"⚠️ Error al exportar archivos: {str(e)}")
-                    rutas_generadas.append(f"❌ Error al exportar archivos para '{nombre_ruta}': {str(e)}")
+                    conn.commit()
+                conn.close()
+
+            return {
+                "nombre": nombre_ruta,
+                "archivos": {
+                    "pdf": f"https://ra55.pythonanywhere.com/static/{nombre_ruta}.pdf",
+                    "html": f"https://ra55.pythonanywhere.com/static/rutas_{nombre_ruta}.html"
+                }
+            }
+        except Exception as e:
+            print(f"⚠️ Error al exportar archivos: {str(e)}")
+            return f"❌ Error al exportar archivos para '{nombre_ruta}': {str(e)}"
+
+    def _crear_rutas(self, ordenes: List[List[int]], direcciones: List[str], coordenadas: List[tuple],
+                     entrada, matriz, username: Optional[str], procesos: int) -> list:
+        """
+        Crea y exporta una ruta por cada orden de visita.
+
+        Con `procesos` > 1 las rutas se reparten entre el pool de procesos compartido,
+        cuyos trabajadores cargan el grafo una sola vez al arrancar. A cada tarea solo
+        se le envían las direcciones en orden y los tramos que necesita, no la matriz
+        completa. En ese caso los objetos Ruta no se añaden a `self.rutas`.
+        """
+        marca = datetime.now().strftime('%Y%m%d%H%M%S')
+        nombres = [f"Ruta_{marca}_{i+1}" for i in range(len(ordenes))]
+        if procesos <= 1 or len(ordenes) <= 1:
+            return [
+                self._crear_ruta(nombre, orden, direcciones, coordenadas, entrada, matriz, username)
+                for nombre, orden in zip(nombres, ordenes)
+            ]
+
+        ejecutor = obtener_ejecutor(procesos)
+        futuros = []
+        for nombre, orden in zip(nombres, ordenes):
+            tramos = self._tramos(nombre, orden, matriz)
+            if isinstance(tramos, str):
+                futuros.append(tramos)
+                continue
+            futuros.append(ejecutor.submit(_crear_ruta_en_trabajador, self.directorio, nombre,
+                                           [direcciones[k] for k in orden], [coordenadas[k] for k in orden],
+                                           coordenadas, *tramos, username))
+        resultados = []
+        for nombre, futuro in zip(nombres, futuros):
+            if isinstance(futuro, str):
+                resultados.append(futuro)
+                continue
+            try:
+                resultados.append(futuro.result())
+            except BrokenProcessPool as e:
+                _descartar_ejecutor(ejecutor)
+                resultados.append(f"❌ Error al crear la ruta '{nombre}': {str(e)}")
+            except Exception as e:
+                resultados.append(f"❌ Error al crear la ruta '{nombre}': {str(e)}")
+        return resultados
+
+    def generar_rutas_desde_direcciones(self, direcciones: List[str], cantidad: int = 5, username: str = None,
+                                        optimizar: bool = False, procesos: int = PROCESOS_RUTAS) -> List[str]:
+        """
+        Genera `cantidad` rutas que visitan todas las direcciones y las exporta.
+
+        Parameters
+        ----------
+        direcciones : List[str]
+            Direcciones a visitar.
+        cantidad : int, optional
+            Número de rutas a generar.
+        username : str, optional
+            Usuario al que se asocian las rutas.
+        optimizar : bool, optional
+            Si es True, las rutas son los `cantidad` mejores órdenes de visita distintos
+            (vecino más cercano + 2-opt/Or-opt); si no, órdenes aleatorios.
+        procesos : int, optional
+            Procesos con los que se generan y exportan las rutas en paralelo.
+
+        Returns
+        -------
+        List[str]
+            Resultado de cada ruta generada.
+        """
+        try:
+            direcciones, coordenadas, entrada, matriz = self._preparar(direcciones)
+
+            if optimizar:
+                ordenes = [orden for orden, _ in mejores_recorridos(matriz.km, k=cantidad)]
+            else:
+                ordenes = []
+                for _ in range(cantidad):
+                    orden = list(range(len(direcciones)))
+                    random.shuffle(orden)
+                    ordenes.append(orden)
+
+            return self._crear_rutas(ordenes, direcciones, coordenadas, entrada, matriz, username, procesos)
+
+        except Exception as e:
+            return [f"❌ Error general: {str(e)}"]
+
+    def generar_rutas_particionadas(self, direcciones: List[str], max_km: Optional[float] = None,
+                                    max_horas: Optional[float] = None, username: str = None,
+                                    tiempo_maximo: float = TIEMPO_MAXIMO_PARTICION,
+                                    procesos: int = PROCESOS_RUTAS) -> List[str]:
+        """
+        Reparte muchas direcciones en varias rutas equilibradas que no superan una
+        distancia o duración máxima y optimiza el orden de visita de cada una.
+
+        Parameters
+        ----------
+        direcciones : List[str]
+            Direcciones a visitar.
+        max_km : float, optional
+            Distancia máxima de cada ruta en km.
+        max_horas : float, optional
+            Duración máxima de cada ruta en horas.
+        username : str, optional
+            Usuario al que se asocian las rutas.
+        tiempo_maximo : float, optional
+            Segundos máximos de cálculo para el reparto y la optimización.
+        procesos : int, optional
+            Procesos con los que se generan y exportan las rutas en paralelo.
+
+        Returns
+        -------
+        List[str]
+            Resultado de cada ruta generada.
+        """
+        try:
+            direcciones, coordenadas, entrada, matriz = self._preparar(direcciones)
+            # Con procesos <= 1 los grupos se optimizan en este mismo proceso
+            ejecutor = obtener_ejecutor(procesos) if procesos > 1 else None
+            try:
+                grupos = particionar(matriz, coordenadas, max_km=max_km, max_horas=max_horas,
+                                     tiempo_maximo=tiempo_maximo, ejecutor=ejecutor)
+            except BrokenProcessPool:
+                _descartar_ejecutor(ejecutor)
+                raise
 
-            return rutas_generadas
+            ordenes = [grupo.orden for grupo in grupos]
+            resultados = self._crear_rutas(ordenes, direcciones, coordenadas, entrada, matriz, username, procesos)
+            for grupo, resultado in zip(grupos, resultados):
+                if grupo.excede_limite and isinstance(resultado, dict):
+                    # No dio tiempo a dividirla: se entrega, pero avisando de que supera el límite
+                    print(f"⚠️ La ruta '{resultado['nombre']}' supera el límite "
+                          f"({grupo.km:.2f} km, {grupo.horas:.2f} h)")
+                    resultado["excede_limite"] = True
+            return resultados
 
         except Exception as e:
             return [f"❌ Error general: {str(e)}"]
@@ -1,4 +1,3 @@
-import random
 from ruta import Ruta
 from utils import *
 import json 
@@ -7,6 +6,8 @@ import os
 from datetime import datetime
 from typing import List, Optional
 import sqlite3
+from catalogo_rutas import obtener_catalogo
+from esquema_rutas import crear_ruta
 
 # Rutas en PythonAnywhere
 PYTHONANYWHERE_BASE = "/home/RA55/gestor_de_rutas"
@@ -29,24 +30,19 @@ class RutaManual(Ruta):
         Guarda la ruta manual en formato JSON y exporta archivos adicionales directamente en PythonAnywhere.
         """
         try:
-            # Formatear distancia y duración
-            distancia_str = f"{self.distancia:.2f} km"
-            horas = int(self.duracion)
-            minutos = int((self.duracion - horas) * 60)
-            duracion_str = f"{horas} h {minutos} min" if horas > 0 else f"{minutos} min"
-            
-            # Datos de la ruta
-            datos_ruta = {
-                "nombre": self.nombre,
-                "origen": {"direccion": self.origen} if isinstance(self.origen, str) else self.origen,
-                "destino": {"direccion": self.destino} if isinstance(self.destino, str) else self.destino,
-                "puntos_intermedios": [{"direccion": p} if isinstance(p, str) else p for p in self.puntos_intermedios],
-                "modo": self.modo_transporte,
-                "distancia_km": self.distancia,
-                "duracion_horas": self.duracion,
-                "dificultad": self.dificultad,
-                "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
+            # Datos de la ruta: direcciones escritas por el usuario con sus coordenadas
+            origen, puntos_intermedios, destino = self.paradas_esquema()
+            datos_ruta = crear_ruta(
+                nombre=self.nombre,
+                origen=origen,
+                destino=destino,
+                puntos_intermedios=puntos_intermedios,
+                modo=self.modo_transporte,
+                distancia_km=self.distancia,
+                duracion_horas=self.duracion,
+                dificultad=self.dificultad,
+                ubicacion=self.ubicacion
+            )
             
             # Asegurar que los directorios existen
             os.makedirs(RUTAS_DIR, exist_ok=True)
@@ -56,13 +52,14 @@ class RutaManual(Ruta):
             json_path = os.path.join(RUTAS_DIR, f"{self.nombre}.json")
             with open(json_path, "w", encoding="utf-8") as archivo:
                 json.dump(datos_ruta, archivo, indent=4, ensure_ascii=False)
+            obtener_catalogo().guardar(datos_ruta)
 
             # Exportar PDF y HTML a la carpeta static
             try:
                 # Obtener las direcciones para el PDF
-                origen_direccion = self.origen if isinstance(self.origen, str) else self.origen.get('direccion', '')
-                destino_direccion = self.destino if isinstance(self.destino, str) else self.destino.get('direccion', '')
-                puntos_intermedios_direcciones = [p if isinstance(p, str) else p.get('direccion', '') for p in self.puntos_intermedios]
+                origen_direccion = origen['direccion']
+                destino_direccion = destino['direccion']
+                puntos_intermedios_direcciones = [p['direccion'] for p in puntos_intermedios]
 
                 # Exportar PDF
                 pdf_path = os.path.join(STATIC_DIR, f"{self.nombre}.pdf")
@@ -155,7 +152,7 @@ class RutaManual(Ruta):
             # Crear objeto RutaManual
             ruta = RutaManual(
                 nombre=nombre,
-                ubicacion=(random.uniform(38.3, 38.4), random.uniform(-0.5, -0.3)),
+                ubicacion=None,
                 distancia=10.0,  # Valor de ejemplo
                 duracion=0.5,    # Valor de ejemplo
                 dificultad="medio",
@@ -167,6 +164,9 @@ class RutaManual(Ruta):
                 modo_transporte=modo
             )
 
+            # La ubicación de la ruta es su origen ya geocodificado
+            ruta.ubicacion = ruta.origen
+
             # Guardar la ruta y exportar archivos
             ruta.guardar_en_json()
 
@@ -0,0 +1,270 @@
+"""Tabla columnar de rutas en arrays de NumPy para filtrar y agregar de forma vectorizada."""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from consulta_rutas import ConsultaRutas
+
+# Códigos iniciales de las columnas categóricas (los valores nuevos se añaden al final)
+DIFICULTADES = ("bajo", "medio", "alto")
+MODOS = ("walk", "bike", "drive")
+
+# Filas reservadas al crear la tabla; la capacidad se duplica al llenarse
+CAPACIDAD_INICIAL = 64
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+# Columnas numéricas: distancia, duración, fecha (segundos desde 1970) y caja (lat/lon mín/máx)
+COLUMNAS_NUMERICAS = ("distancia_km", "duracion_horas", "fecha", "lat_min", "lat_max", "lon_min", "lon_max")
+
+
+def _marca_tiempo(fecha: Optional[str]) -> float:
+    """Fecha "YYYY-MM-DD HH:MM:SS" en segundos, o NaN si no hay fecha válida."""
+    try:
+        return datetime.strptime(fecha, FORMATO_FECHA).timestamp()
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _caja(ruta: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """
+    Caja (lat_min, lat_max, lon_min, lon_max) de las coordenadas conocidas de la ruta.
+
+    Se usan la "ubicacion" y las coordenadas "lat"/"lng" de origen, destino y puntos
+    intermedios cuando existen; sin ninguna coordenada, la caja es NaN.
+    """
+    puntos = []
+    ubicacion = ruta.get("ubicacion")
+    if isinstance(ubicacion, (list, tuple)) and len(ubicacion) == 2:
+        puntos.append(ubicacion)
+    for punto in [ruta.get("origen"), ruta.get("destino")] + list(ruta.get("puntos_intermedios") or []):
+        if isinstance(punto, dict) and punto.get("lat") is not None and punto.get("lng") is not None:
+            puntos.append((punto["lat"], punto["lng"]))
+    try:
+        coordenadas = np.asarray(puntos, dtype=np.float64)
+    except (TypeError, ValueError):
+        coordenadas = np.empty((0, 2))
+    # Las coordenadas (0, 0) son marcadores de "sin geocodificar"
+    coordenadas = coordenadas[np.any(coordenadas != 0, axis=1)] if len(coordenadas) else coordenadas
+    if not len(coordenadas):
+        return (np.nan, np.nan, np.nan, np.nan)
+    minimo, maximo = coordenadas.min(axis=0), coordenadas.max(axis=0)
+    return (minimo[0], maximo[0], minimo[1], maximo[1])
+
+
+class TablaRutas:
+    """
+    Vista columnar de un conjunto de rutas: una fila por ruta y un array de NumPy por
+    columna, de modo que los filtros son máscaras booleanas y los agregados se calculan
+    sin recorrer las rutas en Python.
+
+    Las filas se actualizan de forma incremental con `actualizar`: las rutas nuevas se
+    añaden al final (duplicando la capacidad cuando hace falta), las modificadas se
+    sobrescriben en su fila y las eliminadas se sustituyen por la última fila.
+
+    Attributes
+    ----------
+    dificultades : List[str]
+        Valor de cada código de la columna "dificultad".
+    modos : List[str]
+        Valor de cada código de la columna "modo".
+    """
+
+    def __init__(self) -> None:
+        self.dificultades: List[str] = list(DIFICULTADES)
+        self.modos: List[str] = list(MODOS)
+        self._filas: Dict[str, int] = {}
+        self._n = 0
+        self._reservar(CAPACIDAD_INICIAL)
+
+    def _reservar(self, capacidad: int) -> None:
+        """Crea o amplía los arrays conservando las filas existentes."""
+        nuevas = {columna: np.full(capacidad, np.nan) for columna in COLUMNAS_NUMERICAS}
+        nuevas["dificultad"] = np.full(capacidad, -1, dtype=np.int16)
+        nuevas["modo"] = np.full(capacidad, -1, dtype=np.int16)
+        nuevas["nombre"] = np.empty(capacidad, dtype=object)
+        nuevas["creador"] = np.empty(capacidad, dtype=object)
+        nuevas["ruta"] = np.empty(capacidad, dtype=object)
+        if hasattr(self, "_columnas"):
+            for columna, valores in self._columnas.items():
+                nuevas[columna][:self._n] = valores[:self._n]
+        self._columnas = nuevas
+
+    @staticmethod
+    def _codigo(vocabulario: List[str], valor: Optional[str]) -> int:
+        """Código de un valor categórico, añadiéndolo al vocabulario si es nuevo."""
+        if not valor:
+            return -1
+        valor = valor.lower()
+        if valor not in vocabulario:
+            vocabulario.append(valor)
+        return vocabulario.index(valor)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def columna(self, nombre: str) -> np.ndarray:
+        """
+        Array de una columna con una posición por ruta (vista de solo lectura).
+
+        Columnas: distancia_km, duracion_horas, fecha, lat_min, lat_max, lon_min, lon_max,
+        dificultad y modo (códigos; -1 si falta), nombre, creador y ruta (el diccionario).
+        """
+        vista = self._columnas[nombre][:self._n]
+        vista.flags.writeable = False
+        return vista
+
+    def actualizar(self, rutas: Iterable[Dict[str, Any]], eliminadas: Iterable[str] = ()) -> None:
+        """
+        Añade o sustituye rutas (en el esquema de `esquema_rutas`) y elimina otras por nombre.
+
+        Parameters
+        ----------
+        rutas : Iterable[Dict[str, Any]]
+            Rutas nuevas o modificadas; deben tener "nombre".
+        eliminadas : Iterable[str], optional
+            Nombres de las rutas que ya no existen.
+        """
+        c = self._columnas
+        for nombre in eliminadas:
+            fila = self._filas.pop(nombre, None)
+            if fila is None:
+                continue
+            ultima = self._n - 1
+            if fila != ultima:
+                for valores in c.values():
+                    valores[fila] = valores[ultima]
+                self._filas[c["nombre"][fila]] = fila
+            for columna in COLUMNAS_NUMERICAS:
+                c[columna][ultima] = np.nan
+            c["dificultad"][ultima] = c["modo"][ultima] = -1
+            c["nombre"][ultima] = c["creador"][ultima] = c["ruta"][ultima] = None
+            self._n -= 1
+
+        for ruta in rutas:
+            fila = self._filas.get(ruta["nombre"])
+            if fila is None:
+                if self._n == len(c["nombre"]):
+                    self._reservar(2 * len(c["nombre"]))
+                    c = self._columnas
+                fila = self._n
+                self._filas[ruta["nombre"]] = fila
+                self._n += 1
+            c["nombre"][fila] = ruta["nombre"]
+            c["creador"][fila] = ruta.get("creador")
+            c["ruta"][fila] = ruta
+            for columna in ("distancia_km", "duracion_horas"):
+                c[columna][fila] = np.nan if ruta.get(columna) is None else ruta[columna]
+            c["fecha"][fila] = _marca_tiempo(ruta.get("fecha_creacion"))
+            c["lat_min"][fila], c["lat_max"][fila], c["lon_min"][fila], c["lon_max"][fila] = _caja(ruta)
+            c["dificultad"][fila] = self._codigo(self.dificultades, ruta.get("dificultad"))
+            c["modo"][fila] = self._codigo(self.modos, ruta.get("modo"))
+
+    def mascara(self, consulta: ConsultaRutas) -> np.ndarray:
+        """
+        Máscara booleana de las filas que cumplen los filtros de la consulta.
+
+        Las comparaciones con valores que faltan (NaN) son siempre falsas, igual que en SQL.
+        """
+        c = {columna: valores[:self._n] for columna, valores in self._columnas.items()}
+        mascara = np.ones(self._n, dtype=bool)
+        for columna, vocabulario, valor in (("dificultad", self.dificultades, consulta.dificultad),
+                                            ("modo", self.modos, consulta.modo)):
+            if valor is not None:
+                codigo = vocabulario.index(valor) if valor in vocabulario else -2
+                mascara &= c[columna] == codigo
+        rangos = (("distancia_km", consulta.min_km, consulta.max_km),
+                  ("duracion_horas", consulta.min_horas, consulta.max_horas),
+                  ("fecha", _marca_tiempo(consulta.desde) if consulta.desde else None,
+                   _marca_tiempo(consulta.hasta) if consulta.hasta else None))
+        for columna, minimo, maximo in rangos:
+            if minimo is not None:
+                mascara &= c[columna] >= minimo
+            if maximo is not None:
+                mascara &= c[columna] <= maximo
+        if consulta.creador is not None:
+            mascara &= c["creador"] == consulta.creador
+        if consulta.despues_de is not None:
+            mascara &= self._mascara_cursor(consulta, c)
+        return mascara
+
+    @staticmethod
+    def _mascara_cursor(consulta: ConsultaRutas, c: Dict[str, np.ndarray]) -> np.ndarray:
+        """Filas que van detrás del cursor de la consulta (como `ConsultaRutas.va_despues`)."""
+        valor, nombre = consulta.despues_de
+        nombres = c["nombre"].astype(str)
+        if consulta.orden == "nombre":
+            return nombres < valor if consulta.descendente else nombres > valor
+        valores = c[consulta.orden]
+        if valor is None:
+            return np.isnan(valores) & (nombres > nombre)
+        if consulta.orden == "fecha":
+            valor = _marca_tiempo(valor)
+        posteriores = valores < valor if consulta.descendente else valores > valor
+        return np.isnan(valores) | posteriores | ((valores == valor) & (nombres > nombre))
+
+    def filtrar(self, consulta: ConsultaRutas) -> List[Dict[str, Any]]:
+        """
+        Rutas que cumplen la consulta, en su orden y con su límite (mismo resultado que
+        `ConsultaRutas.filtrar`).
+        """
+        filas = np.flatnonzero(self.mascara(consulta))
+        nombres = self._columnas["nombre"][filas]
+        filas = filas[np.argsort(nombres, kind="stable")]
+        if consulta.orden != "nombre":
+            clave = self._columnas[consulta.orden][filas]
+            clave = -clave if consulta.descendente else clave
+            # argsort deja los NaN al final y respeta el orden por nombre en los empates
+            filas = filas[np.argsort(clave, kind="stable")]
+        elif consulta.descendente:
+            filas = filas[::-1]
+        if consulta.limite is not None:
+            filas = filas[:consulta.limite]
+        return list(self._columnas["ruta"][filas])
+
+    def conteo(self, columna: str, consulta: Optional[ConsultaRutas] = None) -> Dict[str, int]:
+        """
+        Número de rutas por valor de una columna categórica ("modo" o "dificultad").
+
+        Parameters
+        ----------
+        columna : str
+            "modo" o "dificultad".
+        consulta : ConsultaRutas, optional
+            Solo se cuentan las rutas que la cumplen.
+
+        Returns
+        -------
+        Dict[str, int]
+        """
+        vocabulario = {"modo": self.modos, "dificultad": self.dificultades}[columna]
+        codigos = self._columnas[columna][:self._n]
+        if consulta is not None:
+            codigos = codigos[self.mascara(consulta)]
+        totales = np.bincount(codigos[codigos >= 0], minlength=len(vocabulario))
+        return {valor: int(total) for valor, total in zip(vocabulario, totales) if total}
+
+    def histograma(self, columna: str = "distancia_km", intervalos: int = 10,
+                   consulta: Optional[ConsultaRutas] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histograma de una columna numérica.
+
+        Parameters
+        ----------
+        columna : str, optional
+            "distancia_km", "duracion_horas" o "fecha".
+        intervalos : int or sequence, optional
+            Número de intervalos o sus bordes, como en `np.histogram`.
+        consulta : ConsultaRutas, optional
+            Solo se cuentan las rutas que la cumplen.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Rutas en cada intervalo y bordes de los intervalos.
+        """
+        valores = self._columnas[columna][:self._n]
+        if consulta is not None:
+            valores = valores[self.mascara(consulta)]
+        return np.histogram(valores[~np.isnan(valores)], bins=intervalos)
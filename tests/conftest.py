@@ -0,0 +1,7 @@
+"""Configuración común: las pruebas usan bases de datos temporales en lugar de las del proyecto."""
+import os
+import tempfile
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="gestor_rutas_tests_")
+os.environ.setdefault("USUARIOS_DB_PATH", os.path.join(_DIRECTORIO, "usuarios.db"))
+os.environ.setdefault("CATALOGO_RUTAS_DB_PATH", os.path.join(_DIRECTORIO, "catalogo_rutas.db"))
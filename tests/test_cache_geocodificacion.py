@@ -0,0 +1,76 @@
+"""Normalización de direcciones y caché persistente de geocodificación."""
+import sqlite3
+
+import pytest
+
+from cache_geocodificacion import VERSION_CLAVES, CacheGeocodificacion, normalizar_direccion
+
+
+@pytest.mark.parametrize("direccion, esperada", [
+    ("C/ Mayor, 5", "calle mayor 5"),
+    ("Avda. de Maisonnave 12", "avenida de maisonnave 12"),
+    ("Plaza de los Luceros, Alicante, España", "plaza de los luceros"),
+    ("Calle San Vicente nº 3, Alacant", "calle san vicente numero 3"),
+    ("Avenida de España", "avenida de espana"),
+    ("Calle España, Alicante", "calle espana"),
+    ("Alicante", "alicante"),
+    ("Calle del No 4", "calle del no 4"),
+])
+def test_normalizar_direccion(direccion, esperada):
+    assert normalizar_direccion(direccion) == esperada
+
+
+def test_direcciones_distintas_no_comparten_clave():
+    direcciones = ["Avenida de España", "Avenida de Alicante", "Avenida de", "Plaza de España",
+                   "Plaza de", "Calle España", "Calle", "Alicante", "España", "P. de Gomiz",
+                   "Calle Mayor no 5", "Calle Mayor nº 5"]
+    claves = [normalizar_direccion(d) for d in direcciones]
+    # "no" no se lee como número; solo "nº"
+    assert len(set(claves)) == len(claves)
+    assert all(claves)
+
+
+def test_la_ciudad_tras_una_coma_no_distingue_entradas():
+    assert (normalizar_direccion("Calle Mayor 5, Alicante, Spain")
+            == normalizar_direccion("calle mayor 5")
+            == normalizar_direccion("C/ Mayor 5, España"))
+
+
+def test_cache_separa_calles_con_nombres_de_ciudad(tmp_path):
+    cache = CacheGeocodificacion(str(tmp_path / "geo.db"))
+    cache.guardar("Avenida de España", (38.34, -0.48))
+    cache.guardar("Avenida de Alicante", (38.35, -0.49))
+    assert cache.consultar("Avenida de España") == (True, (38.34, -0.48))
+    assert cache.consultar("avenida de alicante, Alicante") == (True, (38.35, -0.49))
+    assert cache.consultar("Avenida de") == (False, None)
+
+
+def test_cache_no_guarda_claves_vacias(tmp_path):
+    cache = CacheGeocodificacion(str(tmp_path / "geo.db"))
+    cache.guardar("¿?", (38.34, -0.48))
+    assert cache.consultar("¿?") == (False, None)
+    assert cache.consultar("") == (False, None)
+
+
+def test_cache_no_encontradas_y_caducidad(tmp_path):
+    cache = CacheGeocodificacion(str(tmp_path / "geo.db"), ttl=0, ttl_negativo=60)
+    cache.guardar("Calle Inexistente", None)
+    assert cache.consultar("Calle Inexistente") == (True, None)
+    cache.guardar("Calle Mayor", (38.34, -0.48))
+    assert cache.eliminar_caducadas() == 1
+
+
+def test_descarta_claves_de_versiones_anteriores(tmp_path):
+    ruta_db = str(tmp_path / "geo.db")
+    conn = sqlite3.connect(ruta_db)
+    conn.execute("CREATE TABLE geocodificaciones (clave TEXT PRIMARY KEY, direccion TEXT NOT NULL, "
+                 "lat REAL, lon REAL, actualizado REAL NOT NULL)")
+    conn.execute("INSERT INTO geocodificaciones VALUES ('avenida de', 'Avenida de España', 1, 1, 1e12)")
+    conn.commit()
+    conn.close()
+
+    cache = CacheGeocodificacion(ruta_db)
+    assert cache.consultar("Avenida de") == (False, None)
+    conn = sqlite3.connect(ruta_db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == VERSION_CLAVES
+    conn.close()
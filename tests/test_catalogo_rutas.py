@@ -0,0 +1,44 @@
+"""Registro de cambios del catálogo para los índices que se ponen al día de forma incremental."""
+from catalogo_rutas import CatalogoRutas
+from esquema_rutas import crear_ruta
+
+
+def ruta(nombre: str, km: float = 2.0):
+    return crear_ruta(nombre=nombre, origen="Plaza de los Luceros", destino="Playa del Postiguet",
+                      puntos_intermedios=[], modo="walk", distancia_km=km, duracion_horas=km / 5,
+                      dificultad="bajo")
+
+
+def nombres(rutas):
+    return sorted(r["nombre"] for r in rutas)
+
+
+def test_cambios_desde_devuelve_solo_lo_posterior(tmp_path):
+    catalogo = CatalogoRutas(str(tmp_path / "catalogo.db"))
+    catalogo.guardar_varias([ruta("A"), ruta("B")])
+    rutas, eliminadas, version = catalogo.cambios_desde()
+    assert nombres(rutas) == ["A", "B"] and eliminadas == [] and version == catalogo.version()
+
+    assert catalogo.cambios_desde(version) == ([], [], version)
+
+    catalogo.guardar(ruta("B", km=3.0))
+    catalogo.guardar(ruta("C"))
+    assert catalogo.eliminar("A")
+    rutas, eliminadas, siguiente = catalogo.cambios_desde(version)
+    assert nombres(rutas) == ["B", "C"] and eliminadas == ["A"]
+    assert [r["distancia_km"] for r in rutas if r["nombre"] == "B"] == [3.0]
+
+    # Una ruta eliminada que vuelve a guardarse deja de constar como eliminada
+    catalogo.guardar(ruta("A"))
+    rutas, eliminadas, _ = catalogo.cambios_desde(siguiente)
+    assert nombres(rutas) == ["A"] and eliminadas == []
+    assert nombres(catalogo.cambios_desde(version)[0]) == ["A", "B", "C"]
+    assert catalogo.cambios_desde(version)[1] == []
+
+
+def test_incrementar_version_no_produce_cambios(tmp_path):
+    catalogo = CatalogoRutas(str(tmp_path / "catalogo.db"))
+    catalogo.guardar(ruta("A"))
+    version = catalogo.version()
+    assert catalogo.incrementar_version() == version + 1
+    assert catalogo.cambios_desde(version) == ([], [], version + 1)
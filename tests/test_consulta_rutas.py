@@ -0,0 +1,123 @@
+"""Consultas y paginación por cursor: catálogo SQLite, filtro en memoria y tabla de NumPy."""
+import dataclasses
+import random
+
+import pytest
+
+from catalogo_rutas import CatalogoRutas
+from consulta_rutas import ORDENES, ConsultaRutas
+from esquema_rutas import crear_ruta
+from tabla_rutas import TablaRutas
+
+
+def rutas_aleatorias(n: int = 120, semilla: int = 3):
+    """Rutas con muchos valores repetidos para que los empates se resuelvan por nombre."""
+    rng = random.Random(semilla)
+    return [
+        crear_ruta(
+            nombre=f"Ruta_{i:03d}",
+            origen="Plaza de los Luceros",
+            destino="Playa del Postiguet",
+            puntos_intermedios=[],
+            modo=rng.choice(["walk", "bike", "drive"]),
+            distancia_km=rng.choice([1.5, 3.0, 4.25, 8.0, 12.0]),
+            duracion_horas=rng.choice([0.25, 0.5, 1.0, 2.0]),
+            dificultad=rng.choice(["bajo", "medio", "alto"]),
+            creador=rng.choice(["ana", "luis", None]),
+            fecha_creacion=f"2025-0{rng.randint(1, 3)}-1{rng.randint(0, 2)} 10:00:00"
+        )
+        for i in rng.sample(range(n), n)
+    ]
+
+
+@pytest.fixture(scope="module")
+def rutas():
+    return rutas_aleatorias()
+
+
+@pytest.fixture(scope="module")
+def catalogo(tmp_path_factory, rutas):
+    catalogo = CatalogoRutas(str(tmp_path_factory.mktemp("catalogo") / "catalogo.db"))
+    catalogo.guardar_varias(rutas)
+    return catalogo
+
+
+@pytest.fixture(scope="module")
+def tabla(rutas):
+    tabla = TablaRutas()
+    tabla.actualizar(rutas)
+    return tabla
+
+
+def nombres(rutas):
+    return [r["nombre"] for r in rutas]
+
+
+def paginar(consulta: ConsultaRutas, ejecutar, tamano: int):
+    """Recorre todas las páginas siguiendo el cursor de la última ruta de cada una."""
+    resultado, pagina = [], dataclasses.replace(consulta, limite=tamano)
+    while True:
+        rutas = ejecutar(pagina)
+        resultado.extend(rutas)
+        if len(rutas) < tamano:
+            return resultado
+        cursor = pagina.cursor(rutas[-1])
+        pagina = dataclasses.replace(pagina, despues_de=ConsultaRutas.leer_cursor(cursor))
+
+
+CONSULTAS = [
+    ConsultaRutas(),
+    ConsultaRutas(dificultad="medio"),
+    ConsultaRutas(modo="bike", max_km=8.0),
+    ConsultaRutas(min_horas=0.5, max_horas=1.0, creador="ana"),
+    ConsultaRutas(desde="2025-02-10 00:00:00", hasta="2025-03-11 23:59:59"),
+]
+
+
+@pytest.mark.parametrize("orden", ORDENES)
+@pytest.mark.parametrize("descendente", [True, False])
+@pytest.mark.parametrize("base", CONSULTAS)
+def test_sql_memoria_y_tabla_coinciden(catalogo, tabla, rutas, orden, descendente, base):
+    consulta = dataclasses.replace(base, orden=orden, descendente=descendente)
+    esperado = nombres(consulta.filtrar(rutas))
+    assert nombres(catalogo.consultar(consulta)) == esperado
+    assert nombres(tabla.filtrar(consulta)) == esperado
+
+
+@pytest.mark.parametrize("orden", ORDENES)
+@pytest.mark.parametrize("descendente", [True, False])
+@pytest.mark.parametrize("tamano", [1, 7, 50])
+def test_paginacion_por_cursor_recorre_todo_sin_repetir(catalogo, tabla, rutas, orden, descendente, tamano):
+    consulta = ConsultaRutas(orden=orden, descendente=descendente)
+    completo = nombres(consulta.filtrar(rutas))
+    assert nombres(paginar(consulta, catalogo.consultar, tamano)) == completo
+    assert nombres(paginar(consulta, lambda pagina: pagina.filtrar(rutas), tamano)) == completo
+    assert nombres(paginar(consulta, tabla.filtrar, tamano)) == completo
+
+
+def test_cursor_no_valido():
+    with pytest.raises(ValueError):
+        ConsultaRutas.leer_cursor("no es un cursor")
+    with pytest.raises(ValueError):
+        ConsultaRutas.desde_parametros({"cursor": "eyJhIjogMX0"})
+
+
+def test_desde_parametros():
+    consulta = ConsultaRutas.desde_parametros({"orden": "-distancia_km", "modo_transporte": "Walk",
+                                               "hasta": "2025-03-01", "limit": "10"})
+    assert consulta.orden == "distancia_km" and consulta.descendente
+    assert consulta.modo == "walk"
+    assert consulta.hasta == "2025-03-01 23:59:59"
+    assert consulta.limite == 10
+    with pytest.raises(ValueError):
+        ConsultaRutas.desde_parametros({"min_km": "mucho"})
+    with pytest.raises(ValueError):
+        ConsultaRutas.desde_parametros({"orden": "altitud"})
+
+
+@pytest.mark.parametrize("valor", ["2.9", "1e3", "diez"])
+def test_limite_no_entero(valor):
+    with pytest.raises(ValueError, match="entero"):
+        ConsultaRutas.desde_parametros({"limite": valor})
+    with pytest.raises(ValueError, match="entero"):
+        ConsultaRutas.desde_parametros({"limit": valor})
@@ -0,0 +1,64 @@
+"""Geocodificación por lotes: agrupación de direcciones equivalentes sin mezclar calles distintas."""
+import threading
+
+import pytest
+
+from cache_geocodificacion import CacheGeocodificacion
+from geocodificador import Geocodificador
+from limitador import LimitadorTokens
+
+
+class GeocodificadorFalso(Geocodificador):
+    """Geocodificador que responde desde un diccionario en lugar de consultar Nominatim."""
+
+    def __init__(self, coordenadas, **kwargs):
+        super().__init__(**kwargs)
+        self.coordenadas = coordenadas
+        self.consultas = []
+        self._lock = threading.Lock()
+
+    def _geocodificar(self, direccion):
+        with self._lock:
+            self.consultas.append(direccion)
+        coordenadas = self.coordenadas.get(direccion)
+        if self.cache:
+            self.cache.guardar(direccion, coordenadas)
+        return coordenadas
+
+
+@pytest.fixture
+def limitador(tmp_path):
+    return LimitadorTokens("pruebas", ruta_db=str(tmp_path / "limitador.db"))
+
+
+COORDENADAS = {
+    "Avenida de España": (38.340, -0.480),
+    "Avenida de Alicante": (38.350, -0.490),
+    "Plaza de España": (38.345, -0.485),
+    "Calle España": (38.355, -0.495),
+}
+
+
+def test_calles_distintas_reciben_resultados_distintos(limitador):
+    geo = GeocodificadorFalso(COORDENADAS, usar_cache=False, limitador=limitador)
+    direcciones = list(COORDENADAS)
+    assert geo.obtener_coordenadas_lote(direcciones) == [COORDENADAS[d] for d in direcciones]
+    assert sorted(geo.consultas) == sorted(direcciones)
+
+
+def test_direcciones_equivalentes_se_consultan_una_vez(limitador):
+    geo = GeocodificadorFalso({"Calle Mayor 5": (38.34, -0.48)}, usar_cache=False, limitador=limitador)
+    resultado = geo.obtener_coordenadas_lote(["Calle Mayor 5", "C/ Mayor 5, Alicante", "calle mayor 5",
+                                              "Calle Menor 5"])
+    assert resultado == [(38.34, -0.48), (38.34, -0.48), (38.34, -0.48), None]
+    assert len(geo.consultas) == 2
+
+
+def test_lote_usa_la_cache(tmp_path, limitador):
+    cache = CacheGeocodificacion(str(tmp_path / "geo.db"))
+    cache.guardar("Avenida de España", (1.0, 2.0))
+    geo = GeocodificadorFalso(COORDENADAS, cache=cache, limitador=limitador)
+    resultado = geo.obtener_coordenadas_lote(["Avenida de España", "Avenida de Alicante"])
+    assert resultado == [(1.0, 2.0), COORDENADAS["Avenida de Alicante"]]
+    assert geo.consultas == ["Avenida de Alicante"]
+    assert cache.consultar("Avenida de Alicante") == (True, COORDENADAS["Avenida de Alicante"])
@@ -0,0 +1,52 @@
+"""Búsquedas en el callejero local: exactas, por prefijo y aproximadas."""
+import pytest
+
+from geocodificador_local import GeocodificadorLocal
+
+ENTRADAS = [
+    ("Avenida de España", 38.3401, -0.4801),
+    ("Avenida de Alicante", 38.3402, -0.4802),
+    ("Avenida de Alcoy Larguísima del Ensanche", 38.3403, -0.4803),
+    ("Plaza de España", 38.3404, -0.4804),
+    ("Plaza de los Luceros", 38.3405, -0.4805),
+    ("Calle España", 38.3406, -0.4806),
+    ("Calle Mayor", 38.3407, -0.4807),
+    ("Calle Mayorazgo", 38.3408, -0.4808),
+]
+
+
+@pytest.fixture(scope="module")
+def callejero(tmp_path_factory):
+    ruta_csv = tmp_path_factory.mktemp("callejero") / "callejero.csv"
+    with open(ruta_csv, "w", encoding="utf-8") as f:
+        f.write("nombre,lat,lon,tipo\n")
+        for nombre, lat, lon in ENTRADAS:
+            f.write(f"{nombre},{lat},{lon},calle\n")
+    return GeocodificadorLocal(str(ruta_csv))
+
+
+def test_todas_las_entradas_se_cargan_por_separado(callejero):
+    assert len(callejero) == len(ENTRADAS)
+
+
+@pytest.mark.parametrize("nombre, lat, lon", ENTRADAS)
+def test_busqueda_exacta(callejero, nombre, lat, lon):
+    assert callejero.buscar(nombre) == (lat, lon)
+    assert callejero.buscar(f"{nombre.upper()}, Alicante") == (lat, lon)
+
+
+def test_prefijo_elige_la_entrada_mas_parecida(callejero):
+    assert callejero.buscar("Plaza de los Luc") == (38.3405, -0.4805)
+    # "avenida de alcoy..." va antes en orden alfabético, pero "avenida de alicante" se parece más
+    assert callejero.buscar("Avenida de Al") == (38.3402, -0.4802)
+
+
+def test_prefijos_cortos_no_devuelven_una_calle_cualquiera(callejero):
+    assert callejero.buscar("Cal") is None
+    assert callejero.buscar("Plaza") is None
+
+
+def test_numero_de_portal_y_erratas(callejero):
+    assert callejero.buscar("C/ Mayor nº 12") == (38.3407, -0.4807)
+    assert callejero.buscar("Plaza de los Lucero") == (38.3405, -0.4805)
+    assert callejero.buscar("Calle Inventada 3") is None
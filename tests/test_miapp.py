@@ -0,0 +1,235 @@
+"""API de miapp sobre bases de datos temporales: ETags de los listados y tabla de amistades."""
+import json
+import random
+import sqlite3
+import uuid
+
+import networkx as nx
+import pytest
+
+miapp = pytest.importorskip("miapp")
+from miapp import Amistad, Usuario, UsuarioRuta, app, db, reconstruir_amistades  # noqa: E402
+from cola_trabajos import PENDIENTE, ColaTrabajos  # noqa: E402
+from esquema_rutas import crear_ruta  # noqa: E402
+import ruta_manual  # noqa: E402
+
+
+@pytest.fixture
+def cliente():
+    return app.test_client()
+
+
+def nuevo_usuario(prefijo: str = "u") -> Usuario:
+    username = f"{prefijo}_{uuid.uuid4().hex[:8]}"
+    usuario = Usuario(nombre="Nombre", apellido="Apellido", email=f"{username}@ejemplo.com",
+                      username=username, password_hash="x")
+    db.session.add(usuario)
+    db.session.commit()
+    return usuario
+
+
+def ruta_de_prueba(nombre: str):
+    return crear_ruta(nombre=nombre, origen="Plaza de los Luceros", destino="Playa del Postiguet",
+                      puntos_intermedios=[], modo="walk", distancia_km=3.2, duracion_horas=0.6,
+                      dificultad="medio")
+
+
+def test_listado_con_etag_responde_304_hasta_que_cambia_el_catalogo(cliente):
+    respuesta = cliente.get("/api/rutas?limit=5")
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["ETag"]
+    assert respuesta.headers["Cache-Control"] == "no-cache"
+
+    repetida = cliente.get("/api/rutas?limit=5", headers={"If-None-Match": etag})
+    assert repetida.status_code == 304
+    assert repetida.headers["ETag"] == etag
+
+    # Otra URL no comparte ETag
+    assert cliente.get("/api/rutas?limit=6").headers["ETag"] != etag
+
+    miapp.obtener_catalogo().guardar(ruta_de_prueba(f"Ruta_etag_{uuid.uuid4().hex[:8]}"))
+    cambiada = cliente.get("/api/rutas?limit=5", headers={"If-None-Match": etag})
+    assert cambiada.status_code == 200
+    assert cambiada.headers["ETag"] != etag
+
+
+def test_rutas_de_usuario_se_invalidan_al_asociar_y_eliminar(cliente):
+    nombre = f"Ruta_usuario_{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        username = nuevo_usuario().username
+    url = f"/api/usuarios/{username}/rutas"
+    etag = cliente.get(url).headers["ETag"]
+
+    with app.app_context():
+        miapp.obtener_catalogo().guardar(ruta_de_prueba(nombre))
+        assert Usuario.agregar_ruta(username, nombre)
+    respuesta = cliente.get(url, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["ETag"]
+    assert cliente.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert cliente.delete(f"{url}/{nombre}").status_code == 200
+    assert cliente.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_vinculos_escritos_con_sqlite3_invalidan_el_etag(cliente):
+    """ruta_auto y ruta_manual vinculan rutas con sqlite3, sin pasar por el catálogo."""
+    nombre = f"Ruta_directa_{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        usuario = nuevo_usuario()
+        usuario_id, url = usuario.id, f"/api/usuarios/{usuario.username}/rutas"
+        miapp.obtener_catalogo().guardar(ruta_de_prueba(nombre))
+    etag = cliente.get(url).headers["ETag"]
+
+    conn = sqlite3.connect(miapp.DB_PATH)
+    conn.execute("INSERT OR REPLACE INTO usuario_rutas (usuario_id, nombre_ruta, created_at) VALUES (?, ?, ?)",
+                 (usuario_id, nombre, "2025-01-01T00:00:00"))
+    conn.commit()
+    respuesta = cliente.get(url, headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    etag = respuesta.headers["ETag"]
+
+    conn.execute("DELETE FROM usuario_rutas WHERE usuario_id = ?", (usuario_id,))
+    conn.commit()
+    conn.close()
+    assert cliente.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def amistades():
+    """Contenido de la tabla amistades con las rutas comunes como conjuntos."""
+    return {(a.user_a, a.user_b): frozenset(json.loads(a.rutas_comunes)) for a in Amistad.query.all()}
+
+
+def amistades_esperadas():
+    """Pares con rutas comunes calculados directamente desde usuario_rutas."""
+    por_ruta = {}
+    for relacion in UsuarioRuta.query.all():
+        por_ruta.setdefault(relacion.nombre_ruta, set()).add(relacion.usuario_id)
+    esperadas = {}
+    for nombre_ruta, usuarios in por_ruta.items():
+        for a in usuarios:
+            for b in usuarios - {a}:
+                esperadas.setdefault((a, b), set()).add(nombre_ruta)
+    return {par: frozenset(rutas) for par, rutas in esperadas.items()}
+
+
+def test_amistades_se_mantienen_al_vincular_y_desvincular():
+    rng = random.Random(5)
+    with app.app_context():
+        ids = [nuevo_usuario("amigo").id for _ in range(12)]
+        rutas = [f"Ruta_amistad_{uuid.uuid4().hex[:6]}_{i}" for i in range(6)]
+        for _ in range(10):
+            for _ in range(15):
+                usuario_id, nombre_ruta = rng.choice(ids), rng.choice(rutas)
+                if not UsuarioRuta.query.filter_by(usuario_id=usuario_id, nombre_ruta=nombre_ruta).first():
+                    db.session.add(UsuarioRuta(usuario_id=usuario_id, nombre_ruta=nombre_ruta,
+                                               created_at="2025-01-01 00:00:00"))
+                    db.session.commit()
+            relaciones = UsuarioRuta.query.filter(UsuarioRuta.usuario_id.in_(ids)).all()
+            for relacion in rng.sample(relaciones, min(5, len(relaciones))):
+                db.session.delete(relacion)
+                db.session.commit()
+            assert amistades() == amistades_esperadas()
+
+        incremental = amistades()
+        with db.engine.begin() as conexion:
+            reconstruir_amistades(conexion)
+        db.session.expire_all()
+        assert amistades() == incremental
+
+
+def test_obtener_amigos_lee_la_tabla_materializada():
+    with app.app_context():
+        ana, luis, eva = nuevo_usuario("ana"), nuevo_usuario("luis"), nuevo_usuario("eva")
+        compartida, sola = f"Ruta_c_{uuid.uuid4().hex[:6]}", f"Ruta_s_{uuid.uuid4().hex[:6]}"
+        for usuario, nombre_ruta in ((ana, compartida), (luis, compartida), (ana, sola), (eva, sola)):
+            assert Usuario.agregar_ruta(usuario.username, nombre_ruta)
+
+        amigos = Usuario.obtener_amigos(ana.username)
+        assert set(amigos) == {luis.username, eva.username}
+        assert amigos[luis.username]["rutas_comunes"] == [compartida]
+        assert amigos[eva.username]["rutas_comunes"] == [sola]
+        assert Usuario.obtener_amigos(luis.username).keys() == {ana.username}
+
+
+def test_encolar_no_arranca_trabajadores_desde_la_peticion(cliente, tmp_path, monkeypatch):
+    monkeypatch.setattr(miapp, "cola_trabajos", ColaTrabajos(str(tmp_path / "trabajos.db")))
+    respuesta = cliente.post("/api/rutas", json={"origen": "A", "destino": "B", "asincrono": True})
+    assert respuesta.status_code == 202
+    assert miapp.grupo_trabajadores is None
+
+    estado = cliente.get(respuesta.get_json()["data"]["url"]).get_json()["data"]
+    assert estado["estado"] == PENDIENTE
+
+
+def test_limite_no_entero_responde_400(cliente):
+    assert cliente.get("/api/rutas?limit=2.5").status_code == 400
+
+
+def test_busqueda_espacial_sigue_al_catalogo(cliente):
+    nombre = f"Ruta_espacial_{uuid.uuid4().hex[:8]}"
+    datos = crear_ruta(nombre=nombre, origen={"lat": 38.3452, "lng": -0.4810, "direccion": "Luceros"},
+                       destino={"lat": 38.3470, "lng": -0.4760, "direccion": "Postiguet"},
+                       puntos_intermedios=[], modo="walk", distancia_km=0.6, duracion_horas=0.12,
+                       dificultad="bajo")
+    url = "/api/rutas/cerca?lat=38.3460&lon=-0.4785&radio=0.5"
+    assert nombre not in {r["nombre"] for r in cliente.get(url).get_json()["data"]}
+
+    # Guardada solo en el catálogo, sin fichero en la carpeta de rutas
+    miapp.obtener_catalogo().guardar(datos)
+    assert nombre in {r["nombre"] for r in cliente.get(url).get_json()["data"]}
+
+    miapp.obtener_catalogo().eliminar(nombre)
+    assert nombre not in {r["nombre"] for r in cliente.get(url).get_json()["data"]}
+
+
+def test_ruta_manual_se_encuentra_cerca_de_su_origen(cliente, tmp_path, monkeypatch):
+    monkeypatch.setattr(ruta_manual, "RUTAS_DIR", str(tmp_path / "rutas"))
+    monkeypatch.setattr(ruta_manual, "STATIC_DIR", str(tmp_path / "static"))
+    monkeypatch.setattr(ruta_manual, "exportar_pdf", lambda *args: b"%PDF")
+    monkeypatch.setattr(ruta_manual, "generar_mapa", lambda *args: "<html></html>")
+    nombre = f"Ruta_manual_{uuid.uuid4().hex[:8]}"
+    # Ubicación lejos de las paradas: la búsqueda tiene que usar las coordenadas de estas
+    ruta = ruta_manual.RutaManual.desde_tramos(
+        nombre, (38.3990, -0.3010), ["Plaza de los Luceros", "Playa del Postiguet"],
+        [(38.3452, -0.4810), (38.3470, -0.4760)], "walk", nx.MultiDiGraph(), [[0, 1]], [0.6])
+    ruta.guardar_en_json()
+
+    documento = miapp.obtener_catalogo().obtener(nombre)
+    assert documento["origen"] == {"direccion": "Plaza de los Luceros", "lat": 38.3452, "lng": -0.4810}
+    datos = cliente.get("/api/rutas/cerca?lat=38.3453&lon=-0.4809&radio=0.2").get_json()["data"]
+    assert nombre in {r["nombre"] for r in datos}
+    miapp.obtener_catalogo().eliminar(nombre)
+
+
+def test_estadisticas_siguen_al_catalogo(cliente):
+    def estadisticas():
+        respuesta = cliente.get("/api/rutas/estadisticas?modo=bike&intervalos=4")
+        assert respuesta.status_code == 200
+        return respuesta.get_json()["data"]
+
+    antes = estadisticas()
+    nombre = f"Ruta_estadisticas_{uuid.uuid4().hex[:8]}"
+    datos = crear_ruta(nombre=nombre, origen="Luceros", destino="Postiguet", puntos_intermedios=[],
+                       modo="bike", distancia_km=4.0, duracion_horas=0.3, dificultad="alto")
+    miapp.obtener_catalogo().guardar(datos)
+    despues = estadisticas()
+    assert despues["modo"].get("bike", 0) == antes["modo"].get("bike", 0) + 1
+    assert set(despues["modo"]) == {"bike"}
+    assert despues["dificultad"].get("alto", 0) == antes["dificultad"].get("alto", 0) + 1
+    assert sum(despues["distancia_km"]["totales"]) == sum(antes["distancia_km"]["totales"]) + 1
+    assert len(despues["distancia_km"]["bordes"]) == 5
+
+    miapp.obtener_catalogo().eliminar(nombre)
+    assert estadisticas()["modo"].get("bike", 0) == antes["modo"].get("bike", 0)
+    assert cliente.get("/api/rutas/estadisticas?intervalos=0").status_code == 400
+
+
+@pytest.mark.parametrize("url", ["/api/rutas?limit=5", "/api/rutas/filtrar?modo=walk",
+                                 "/api/rutas/estadisticas", "/api/rutas/cerca?lat=38.34&lon=-0.48"])
+def test_cada_peticion_sincroniza_el_catalogo_una_vez(cliente, monkeypatch, url):
+    llamadas = []
+    refrescar = miapp.gestor.indice.refrescar
+    monkeypatch.setattr(miapp.gestor.indice, "refrescar", lambda: llamadas.append(1) or refrescar())
+    assert cliente.get(url).status_code == 200
+    assert len(llamadas) == 1
@@ -0,0 +1,116 @@
+"""Caminos mínimos del motor CSR y de la jerarquía de contracción frente a Dijkstra de networkx."""
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from cache_grafos import GrafoCompacto
+from jerarquia_contraccion import JerarquiaContraccion
+from motor_rutas import MotorRutas
+
+
+def grafo_aleatorio(lado: int = 12, semilla: int = 7) -> nx.MultiDiGraph:
+    """Rejilla con longitudes aleatorias, algunas calles de sentido único y aristas paralelas."""
+    rng = random.Random(semilla)
+    grafo = nx.MultiDiGraph(crs="epsg:4326")
+    paso = 0.001
+    for i in range(lado):
+        for j in range(lado):
+            grafo.add_node(1000 + i * lado + j, y=38.30 + i * paso, x=-0.50 + j * paso)
+    for i in range(lado):
+        for j in range(lado):
+            u = 1000 + i * lado + j
+            for v in ([u + 1] if j + 1 < lado else []) + ([u + lado] if i + 1 < lado else []):
+                longitud = 111.0 * rng.uniform(1.0, 2.5)
+                grafo.add_edge(u, v, length=longitud)
+                if rng.random() > 0.2:
+                    grafo.add_edge(v, u, length=longitud * rng.uniform(1.0, 1.3))
+                if rng.random() < 0.05:
+                    grafo.add_edge(u, v, length=longitud * 0.8)
+    return grafo
+
+
+def longitud_camino(grafo: nx.MultiDiGraph, camino) -> float:
+    """Longitud de un camino tomando la arista más corta entre cada par de nodos."""
+    return sum(min(d["length"] for d in grafo[u][v].values()) for u, v in zip(camino, camino[1:]))
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    return grafo_aleatorio()
+
+
+@pytest.fixture(scope="module")
+def motor(grafo):
+    return MotorRutas(GrafoCompacto.desde_networkx(grafo), velocidad_kmh=5)
+
+
+@pytest.fixture(scope="module")
+def pares(grafo):
+    rng = random.Random(0)
+    nodos = list(grafo.nodes)
+    return [tuple(rng.sample(nodos, 2)) for _ in range(150)]
+
+
+def dijkstra(grafo, origen, destino):
+    try:
+        return nx.dijkstra_path_length(grafo, origen, destino, weight="length")
+    except nx.NetworkXNoPath:
+        return None
+
+
+def test_motor_coincide_con_dijkstra(grafo, motor, pares):
+    for origen, destino in pares:
+        esperado = dijkstra(grafo, origen, destino)
+        if esperado is None:
+            with pytest.raises(nx.NetworkXNoPath):
+                motor.ruta_mas_corta(origen, destino)
+            continue
+        camino, longitud = motor.ruta_mas_corta(origen, destino)
+        assert longitud == pytest.approx(esperado)
+        assert camino[0] == origen and camino[-1] == destino
+        assert longitud_camino(grafo, camino) == pytest.approx(esperado)
+
+
+def test_caminos_desde_coincide_con_dijkstra(grafo, motor):
+    origen = 1000
+    destinos = list(grafo.nodes)[::7]
+    resultado = motor.caminos_desde(origen, destinos)
+    for destino in destinos:
+        esperado = dijkstra(grafo, origen, destino)
+        if esperado is None:
+            assert destino not in resultado
+        else:
+            assert resultado[destino][1] == pytest.approx(esperado)
+
+
+def test_jerarquia_coincide_con_dijkstra(grafo, motor, pares):
+    jerarquia = JerarquiaContraccion.construir(motor, "prueba")
+    for origen, destino in pares:
+        esperado = dijkstra(grafo, origen, destino)
+        s, t = motor.indice(origen), motor.indice(destino)
+        if esperado is None:
+            with pytest.raises(ValueError):
+                jerarquia.ruta_mas_corta(s, t)
+            continue
+        camino, longitud = jerarquia.ruta_mas_corta(s, t)
+        assert longitud == pytest.approx(esperado)
+        nodos = [motor.nodos[i].item() for i in camino]
+        assert nodos[0] == origen and nodos[-1] == destino
+        assert longitud_camino(grafo, nodos) == pytest.approx(esperado)
+
+
+def test_jerarquia_guardada_se_carga_igual(tmp_path, motor, pares):
+    jerarquia = JerarquiaContraccion.construir(motor, "prueba")
+    jerarquia.guardar(str(tmp_path))
+    cargada = JerarquiaContraccion.cargar(str(tmp_path))
+    assert cargada.vigente("prueba") and not cargada.vigente("otra")
+    for origen, destino in pares[:30]:
+        s, t = motor.indice(origen), motor.indice(destino)
+        try:
+            esperado = jerarquia.ruta_mas_corta(s, t)[1]
+        except ValueError:
+            continue
+        assert cargada.ruta_mas_corta(s, t)[1] == pytest.approx(esperado)
+        assert not math.isinf(esperado)
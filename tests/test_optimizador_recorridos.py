@@ -0,0 +1,54 @@
+"""Recorridos alternativos del optimizador: distintos entre sí y sin duplicar recorridos invertidos."""
+import itertools
+
+import numpy as np
+import pytest
+
+from optimizador_recorridos import coste_recorrido, mejores_recorridos
+
+
+def matriz_aleatoria(n: int, semilla: int, simetrica: bool = True) -> np.ndarray:
+    rng = np.random.default_rng(semilla)
+    puntos = rng.uniform(0, 10, size=(n, 2))
+    costes = np.linalg.norm(puntos[:, None] - puntos[None, :], axis=-1)
+    if not simetrica:
+        costes = costes * rng.uniform(1.0, 1.5, size=(n, n))
+        np.fill_diagonal(costes, 0.0)
+    return costes
+
+
+def sin_sentido(orden):
+    return min(tuple(orden), tuple(reversed(orden)))
+
+
+@pytest.mark.parametrize("n", [6, 10])
+def test_simetrica_no_devuelve_recorridos_invertidos(n):
+    costes = matriz_aleatoria(n, semilla=n)
+    recorridos = mejores_recorridos(costes, k=5, tiempo_maximo=1.0, semilla=1)
+    assert 1 <= len(recorridos) <= 5
+    assert len({sin_sentido(orden) for orden, _ in recorridos}) == len(recorridos)
+    for orden, coste in recorridos:
+        assert sorted(orden) == list(range(n))
+        assert coste == pytest.approx(coste_recorrido(costes, orden))
+
+
+def test_exacto_devuelve_los_mejores_recorridos_sin_sentido():
+    costes = matriz_aleatoria(6, semilla=2)
+    todos = sorted({sin_sentido(p): coste_recorrido(costes, list(p))
+                    for p in itertools.permutations(range(6))}.values())
+    recorridos = mejores_recorridos(costes, k=4)
+    assert [coste for _, coste in recorridos] == pytest.approx(todos[:4])
+
+
+def test_asimetrica_conserva_ambos_sentidos():
+    costes = matriz_aleatoria(5, semilla=3, simetrica=False)
+    recorridos = mejores_recorridos(costes, k=240)
+    assert len(recorridos) == 120
+    assert len({sin_sentido(orden) for orden, _ in recorridos}) == 60
+
+
+def test_inicio_fijo():
+    costes = matriz_aleatoria(7, semilla=4)
+    recorridos = mejores_recorridos(costes, k=3, inicio=2)
+    assert all(orden[0] == 2 for orden, _ in recorridos)
+    assert len({tuple(orden) for orden, _ in recorridos}) == 3
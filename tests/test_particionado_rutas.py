@@ -0,0 +1,45 @@
+"""Reparto de direcciones en rutas con límite de distancia."""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from matriz_distancias import MatrizDistancias
+from particionado_rutas import particionar
+
+
+def matriz_en_linea(n: int):
+    """Puntos alineados cada 0,01 grados de longitud (unos 0,87 km a esa latitud)."""
+    coordenadas = [(38.35, -0.50 + 0.01 * i) for i in range(n)]
+    posiciones = np.arange(n, dtype=np.float64) * 0.87
+    km = np.abs(posiciones[:, None] - posiciones[None, :])
+    return MatrizDistancias(list(range(n)), km, km / 5.0, {}), coordenadas
+
+
+def test_grupos_respetan_el_limite_y_cubren_todos_los_puntos():
+    matriz, coordenadas = matriz_en_linea(16)
+    grupos = particionar(matriz, coordenadas, max_km=3.0, tiempo_maximo=10.0)
+    assert sorted(i for grupo in grupos for i in grupo.orden) == list(range(16))
+    assert all(grupo.km <= 3.0 and not grupo.excede_limite for grupo in grupos)
+    assert all(grupo.horas == pytest.approx(grupo.km / 5.0) for grupo in grupos)
+
+
+def test_sin_tiempo_se_marcan_los_grupos_que_exceden():
+    matriz, coordenadas = matriz_en_linea(16)
+    grupos = particionar(matriz, coordenadas, max_horas=0.5, tiempo_maximo=0.0)
+    assert len(grupos) == 1
+    assert grupos[0].excede_limite and grupos[0].horas > 0.5
+
+
+def test_con_pool_de_procesos_el_reparto_es_el_mismo():
+    matriz, coordenadas = matriz_en_linea(12)
+    en_proceso = particionar(matriz, coordenadas, max_km=2.0)
+    with ProcessPoolExecutor(max_workers=2) as ejecutor:
+        en_pool = particionar(matriz, coordenadas, max_km=2.0, ejecutor=ejecutor)
+    assert sorted(sorted(g.orden) for g in en_pool) == sorted(sorted(g.orden) for g in en_proceso)
+
+
+def test_sin_limite():
+    matriz, coordenadas = matriz_en_linea(4)
+    with pytest.raises(ValueError):
+        particionar(matriz, coordenadas)
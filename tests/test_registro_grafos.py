@@ -0,0 +1,39 @@
+"""Registro de grafos: entradas de fuera de la zona de servicio guardadas por bbox y tipo de red."""
+import registro_grafos
+from registro_grafos import MAXIMO_ENTRADAS_EXTERNAS, RegistroGrafos
+
+
+class CacheFalsa:
+    """Caché en disco mínima: cada bbox es una tesela de 0.1 grados alrededor del punto."""
+
+    def bbox_para_punto(self, punto, dist):
+        lat, lon = round(punto[0], 1), round(punto[1], 1)
+        return (lat - 0.1, lat + 0.1, lon - 0.1, lon + 0.1)
+
+    def obtener_compacto(self, bbox, network_type):
+        return bbox
+
+    def ruta_entrada(self, bbox, network_type):
+        return f"{bbox}-{network_type}"
+
+
+def test_las_entradas_externas_se_reutilizan_y_se_descartan_las_menos_usadas(monkeypatch):
+    construidas = []
+    monkeypatch.setattr(registro_grafos, "EntradaRegistro",
+                        lambda compacto, network_type, directorio: construidas.append(directorio) or object())
+    registro = RegistroGrafos(cache=CacheFalsa())
+    monkeypatch.setattr(registro_grafos, "_registro", registro)
+    madrid = [(40.4168, -3.7038), (40.4200, -3.7000)]
+
+    entrada = registro_grafos.entrada_para_puntos("walk", madrid)
+    assert registro_grafos.entrada_para_puntos("walk", madrid) is entrada
+    assert registro_grafos.entrada_para_puntos("drive", madrid) is not entrada
+    assert len(construidas) == 2
+
+    # Al llenarse, se descarta la entrada usada hace más tiempo ("drive" en Madrid)
+    registro_grafos.entrada_para_puntos("walk", madrid)
+    for i in range(MAXIMO_ENTRADAS_EXTERNAS - 1):
+        registro_grafos.entrada_para_puntos("walk", [(41.0 + i, -3.0)])
+    assert registro_grafos.entrada_para_puntos("walk", madrid) is entrada
+    registro_grafos.entrada_para_puntos("drive", madrid)
+    assert len(construidas) == 2 + (MAXIMO_ENTRADAS_EXTERNAS - 1) + 1
@@ -0,0 +1,95 @@
+"""Rutas automáticas: reparto entre los procesos del pool compartido y exportación de cada candidata."""
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import networkx as nx
+import numpy as np
+
+import ruta
+import ruta_auto
+from matriz_distancias import MatrizDistancias
+
+
+class EjecutorAnotado:
+    """Ejecutor que apunta lo que se le envía y devuelve futuros ya resueltos."""
+
+    def __init__(self):
+        self.tareas = []
+
+    def submit(self, funcion, *args):
+        self.tareas.append((funcion, args))
+        futuro = Future()
+        futuro.set_result({"nombre": args[1]})
+        return futuro
+
+
+def test_cada_tarea_recibe_solo_sus_tramos(tmp_path, monkeypatch):
+    ejecutor = EjecutorAnotado()
+    monkeypatch.setattr(ruta_auto, "obtener_ejecutor", lambda procesos: ejecutor)
+    km = np.array([[0.0, 1.0, np.inf], [1.0, 0.0, 2.0], [np.inf, 2.0, 0.0]])
+    caminos = {(0, 1): [10, 11], (1, 0): [11, 10], (1, 2): [11, 12], (2, 1): [12, 11]}
+    matriz = MatrizDistancias([10, 11, 12], km, km / 5, caminos)
+    direcciones = ["A", "B", "C"]
+    coordenadas = [(38.34, -0.48), (38.35, -0.48), (38.36, -0.48)]
+
+    resultados = ruta_auto.RutaAuto(str(tmp_path))._crear_rutas(
+        [[0, 1, 2], [2, 0, 1]], direcciones, coordenadas, None, matriz, None, procesos=2)
+
+    assert len(ejecutor.tareas) == 1
+    funcion, args = ejecutor.tareas[0]
+    assert funcion is ruta_auto._crear_ruta_en_trabajador
+    assert not any(isinstance(a, MatrizDistancias) for a in args)
+    _, _, orden_direcciones, orden_coordenadas, puntos_grafo, tramos, distancias, _ = args
+    assert orden_direcciones == ["A", "B", "C"]
+    assert puntos_grafo == coordenadas
+    assert tramos == [[10, 11], [11, 12]] and distancias == [1.0, 2.0]
+    assert isinstance(resultados[0], dict)
+    assert resultados[1].startswith("❌ No hay camino")
+
+
+class EjecutorRoto:
+    """Pool cuyos procesos han muerto: cualquier tarea falla con BrokenProcessPool."""
+
+    def __init__(self):
+        self.cerrado = False
+
+    def submit(self, funcion, *args):
+        raise BrokenProcessPool("un proceso del pool terminó de forma abrupta")
+
+    def shutdown(self, wait=True):
+        self.cerrado = True
+
+
+def test_particionado_descarta_el_pool_roto(tmp_path, monkeypatch):
+    ejecutor = EjecutorRoto()
+    monkeypatch.setattr(ruta_auto, "_ejecutor", ejecutor)
+    km = np.array([[0.0, 1.0], [1.0, 0.0]])
+    matriz = MatrizDistancias([10, 11], km, km / 5, {(0, 1): [10, 11], (1, 0): [11, 10]})
+    generador = ruta_auto.RutaAuto(str(tmp_path))
+    monkeypatch.setattr(generador, "_preparar",
+                        lambda direcciones: (direcciones, [(38.34, -0.48), (38.35, -0.48)], None, matriz))
+
+    resultado = generador.generar_rutas_particionadas(["A", "B"], max_km=0.5, procesos=2)
+
+    assert resultado[0].startswith("❌ Error general")
+    assert ejecutor.cerrado and ruta_auto._ejecutor is None
+
+
+def test_cada_candidata_se_exporta_una_sola_vez(tmp_path, monkeypatch):
+    llamadas = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ruta_auto, "STATIC_DIR", str(tmp_path / "static"))
+    for modulo in (ruta, ruta_auto):
+        monkeypatch.setattr(modulo, "exportar_pdf", lambda *a: llamadas.append("pdf") or b"%PDF", raising=False)
+        monkeypatch.setattr(modulo, "generar_mapa", lambda *a: llamadas.append("html") or "<html/>", raising=False)
+    monkeypatch.setattr(ruta, "exportar_gpx", lambda *a: llamadas.append("gpx"), raising=False)
+
+    grafo = nx.MultiDiGraph()
+    grafo.add_edge(10, 11, length=1000.0)
+    entrada = SimpleNamespace(grafo=grafo)
+    resultado = ruta_auto.RutaAuto(str(tmp_path / "rutas"))._montar_ruta(
+        "Ruta_unica", ["A", "B"], [(38.34, -0.48), (38.35, -0.48)], entrada, [[10, 11]], [1.0], None)
+
+    assert resultado["nombre"] == "Ruta_unica"
+    assert sorted(llamadas) == ["html", "pdf"]
@@ -120,13 +120,22 @@ class Usuario:
         usuarios = Usuario.cargar_usuarios()
         amigos_dict = {usuario['username']: [] for usuario in usuarios}
 
-        for i in range(len(usuarios)):
-            for j in range(i + 1, len(usuarios)):
-                usuario1, usuario2 = usuarios[i], usuarios[j]
-                if set(usuario1['rutas']) & set(usuario2['rutas']):  # Verifica intersección de rutas
-                    amigos_dict[usuario1['username']].append(usuario2['username'])
-                    amigos_dict[usuario2['username']].append(usuario1['username'])
-        
+        # Índice invertido ruta -> usuarios: solo se comparan usuarios que comparten alguna ruta
+        usuarios_por_ruta: Dict[str, List[int]] = {}
+        for i, usuario in enumerate(usuarios):
+            for ruta in set(usuario['rutas']):
+                usuarios_por_ruta.setdefault(ruta, []).append(i)
+
+        relacionados: List[set] = [set() for _ in usuarios]
+        for indices in usuarios_por_ruta.values():
+            for i in indices:
+                relacionados[i].update(indices)
+
+        # Mismo orden que en la lista de usuarios
+        for i, usuario in enumerate(usuarios):
+            relacionados[i].discard(i)
+            amigos_dict[usuario['username']].extend(usuarios[j]['username'] for j in sorted(relacionados[i]))
+
         return amigos_dict
     
     @staticmethod